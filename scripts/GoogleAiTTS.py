@@ -1,8 +1,6 @@
 import os
-import json
-import base64
-import subprocess
-import requests
+import tts_cache
+import tts_stream
 
 def generate_tts(
     text="Say cheerfully: Have a wonderful day!",
@@ -10,77 +8,46 @@ def generate_tts(
     model="gemini-2.5-flash-preview-tts",
     voice_name="Orus",
     output_audio_path="/generated_audio/temp_g_ai_tts",
-    # output_pcm="g_ai_out",
-    # output_wav="g_ai_out",
-    convert_to_wav=True
+    filename=None,
+    convert_to_wav=True,
+    cache_only=False
 ):
+    """
+    Synthesize `text` to output_audio_path/<filename>.wav (or .pcm with convert_to_wav=False)
+    and return the path. Without a filename the name is derived from the text/voice/model,
+    so concurrent segments written to the same folder never collide.
+    With cache_only, only a cached result is written; returns None on a miss.
+    """
     # ✅ Ensure directory exists
     os.makedirs(output_audio_path, exist_ok=True)
 
-    # ✅ Use Windows-safe paths
-    pcm_path = os.path.join(output_audio_path, ".pcm")
-    wav_path = os.path.join(output_audio_path, ".wav")
+    # ✅ Per-segment output path; the 24 kHz s16le PCM is wrapped as WAV in-process (no ffmpeg)
+    fmt = "wav" if convert_to_wav else "pcm"
+    if filename is None:
+        filename = "g_ai_" + tts_cache.make_key("gemini", voice_name, model, text)[:16]
+    output_path = os.path.join(output_audio_path, f"{filename}.{fmt}")
 
     # ✅ Load API key
     if api_key is None:
         api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
+    if not api_key and not cache_only:
         raise ValueError("API key must be provided either as argument or via GEMINI_API_KEY environment variable.")
 
-    # ✅ Build request
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
-    headers = {
-        "x-goog-api-key": api_key,
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "contents": [{
-            "parts": [{
-                "text": text
-            }]
-        }],
-        "generationConfig": {
-            "responseModalities": ["AUDIO"],
-            "speechConfig": {
-                "voiceConfig": {
-                    "prebuiltVoiceConfig": {
-                        "voiceName": voice_name
-                    }
-                }
-            }
-        },
-        "model": model
-    }
-
-    # ✅ Send request
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
-    if response.status_code != 200:
-        raise Exception(f"Request failed ({response.status_code}): {response.text}")
-
-    # ✅ Decode response
-    data = response.json()
-    try:
-        audio_base64 = data["candidates"][0]["content"]["parts"][0]["inlineData"]["data"]
-    except KeyError:
-        raise KeyError("Unexpected response format: couldn't locate base64 audio data in response.")
-
-    # ✅ Write PCM audio
-    with open(pcm_path, "wb") as f:
-        f.write(base64.b64decode(audio_base64))
-    print(f"PCM audio saved to {pcm_path}")
-
-    # ✅ Convert PCM → WAV (optional)
-    if convert_to_wav:
-        if not os.path.exists(pcm_path) or os.path.getsize(pcm_path) == 0:
-            raise RuntimeError(f"PCM file missing or empty: {pcm_path}")
-        try:
-            subprocess.run([
-                "ffmpeg", "-y", "-f", "s16le", "-ar", "24000", "-ac", "1", "-i", pcm_path, wav_path
-            ], check=True, text=True)
-            print(f"WAV file saved to {wav_path}")
-        except subprocess.CalledProcessError as e:
-            print("FFmpeg error output:\n", e.stderr)
-            raise RuntimeError("FFmpeg conversion failed. Make sure ffmpeg is installed and in PATH.")
+    def synthesize(path):
+        # ✅ Stream audio chunks straight to disk (logs time-to-first-byte)
+        info = tts_stream.gemini_stream(text, path, api_key, model, voice_name, wav=convert_to_wav)
+        print(f"{fmt.upper()} audio saved to {path}")
+        pcm = tts_stream.GEMINI_PCM
+        return info["bytes"] / (pcm["rate"] * pcm["sampwidth"] * pcm["channels"])
+
+    # ✅ Reuse audio already synthesized for this text/voice/model
+    result = tts_cache.cached_synthesis("gemini", voice_name, model, text, None, output_path, synthesize, fmt=fmt,
+                                        cache_only=cache_only)
+    if result is None:
+        return None
+    if result["cached"]:
+        print(f"TTS cache hit, audio saved to {output_path}")
+    return output_path
 
 # Example usage
 # generate_tts(text="Good morning, have a great day!", voice_name="Kore")
@@ -3,6 +3,12 @@
 import os
 from pathlib import Path
 import requests
+import http_client
+import clip_library
+import mezzanine_worker
+import search_cache
+import tts_cache
+import tts_stream
 import json
 import uuid
 import time
@@ -12,7 +18,7 @@ import numpy as np
 import cv2
 import psutil
 # from faster_whisper import WhisperModel
-import whisper
+import transcribe_server
 
 from utils import measure_execution_time, logging
 
@@ -163,7 +169,7 @@ def generate_script_and_descriptions(topic, goal, model="llama3.1:8b"):
         "format": format_schema,
         "options": options
     }
-    response = requests.post(OLLAMA_URL, json=payload)
+    response = http_client.post(OLLAMA_URL, json=payload, timeout=http_client.LONG_TIMEOUT)
     # logging.info("Ollama response :")
     # logging.info(response)
 
@@ -205,18 +211,23 @@ def fetch_image_pexels(query, save_path):
     headers = {"Authorization": PEXELS_API_KEY}
     params = {"query": query, "per_page": 1, "orientation": "portrait", "size": "medium"}
     
-    response = requests.get(url, headers=headers, params=params)
-    logging.info("Pexels response status:")
-    logging.info(response)
-    if response.status_code != 200:
-        raise Exception(f"Pexels API error: {response.status_code} {response.text}")
+    data = search_cache.get(url, params)
+    if data is None:
+        response = http_client.get(url, headers=headers, params=params)
+        logging.info("Pexels response status:")
+        logging.info(response)
+        if response.status_code != 200:
+            raise Exception(f"Pexels API error: {response.status_code} {response.text}")
+        data = response.json()
+        search_cache.put(url, params, data)
+    else:
+        logging.info(f"Pexels image search cache hit for '{query}' ({search_cache.stats()})")
     
-    data = response.json()
     if data["total_results"] == 0:
         raise Exception(f"No images found for query: {query}")
     
     image_url = data["photos"][0]["src"]["original"]
-    img_data = requests.get(image_url).content
+    img_data = http_client.get(image_url).content
     with open(save_path, "wb") as f:
         f.write(img_data)
 
@@ -224,7 +235,6 @@ def fetch_image_pexels(query, save_path):
 def generate_audio_elevenlabs(text, filename):
     filename = os.path.join(filename, f"{i}.mp3")
     os.makedirs(os.path.dirname(filename), exist_ok=True)
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
     headers = {
         "Accept": "audio/mpeg",
         "Content-Type": "application/json",
@@ -235,13 +245,16 @@ def generate_audio_elevenlabs(text, filename):
         "model_id": "eleven_multilingual_v2",
         "voice_settings": {"stability": 0.4, "similarity_boost": 0.8}
     }
-    
-    response = requests.post(url, headers=headers, json=payload)
-    if response.status_code == 200:
-        with open(filename, "wb") as f:
-            f.write(response.content)
-    else:
-        raise Exception(f"ElevenLabs TTS error {response.status_code}: {response.text}")
+
+    def synthesize(path):
+        # streamed straight to disk; logs time-to-first-byte
+        tts_stream.elevenlabs_stream(text, path, ELEVENLABS_VOICE_ID, ELEVENLABS_API_KEY, payload["model_id"],
+                                     payload["voice_settings"], accept=headers["Accept"])
+
+    result = tts_cache.cached_synthesis("elevenlabs", ELEVENLABS_VOICE_ID, payload["model_id"], text,
+                                        payload["voice_settings"], filename, synthesize)
+    if result["cached"]:
+        logging.info(f"TTS cache hit for {filename}")
 
 @measure_execution_time
 def create_video(image_folder, audio_folder, output_file, fps=24, out_res=(1080, 1920)):
@@ -294,20 +307,18 @@ def create_video_from_videos(video_folder, audio_folder, output_file, fps=24, ou
         audio_clip = AudioFileClip(audio_path)
         audio_clips.append(audio_clip)
         
-        # Load video clip
-        vid_clip = VideoFileClip(video_path)
-        
-        # Resize video keeping aspect ratio, then crop or pad to output resolution
-        vid_resized = vid_clip.resize(height=out_res[1])
-        
-        # If the width after resizing differs, add black bars (letterboxing/pillarboxing)
-        if vid_resized.w != out_res[0]:
-            # Center video on black background with output resolution
-            vid_resized = vid_resized.on_color(
-                size=out_res,
-                color=(0, 0, 0),
-                pos=('center', 'center')
-            )
+        # Pre-transcoded mezzanine (already out_res, fixed fps) skips all scale/crop work
+        mezzanine = clip_library.mezzanine_for(video_path, size=out_res)
+        if mezzanine:
+            vid_resized = VideoFileClip(mezzanine)
+        else:
+            # Load video clip
+            vid_clip = VideoFileClip(video_path)
+            
+            # Scale to cover and center crop, the same geometry as the mezzanine, so shots match either way
+            scaled_w, scaled_h, x1, y1 = mezzanine_worker.cover_crop(vid_clip.w, vid_clip.h, *out_res)
+            vid_resized = vid_clip.resize((scaled_w, scaled_h)).crop(
+                x1=x1, y1=y1, width=out_res[0], height=out_res[1])
         
         # Set video clip duration exactly to audio clip duration for sync
         clip = vid_resized.set_duration(audio_clip.duration).set_fps(fps)
@@ -334,7 +345,7 @@ def upload_audio_for_transcription(audio_filepath):
         files = {
             "file": (os.path.basename(audio_filepath), audio_file, "audio/mpeg")
         }
-        response = requests.post(url, headers=headers, files=files)
+        response = http_client.post(url, headers=headers, files=files, max_retries=1)
         logging.info(f"upload_audio_for_transcription response: {response.json()}")
     # response.raise_for_status()
     resp_json = response.json()
@@ -347,7 +358,7 @@ def poll_transcription(transcription_id, max_retries=15, wait_seconds=5):
         "xi-api-key": ELEVENLABS_API_KEY,
     }
     for i in range(max_retries):
-        response = requests.get(url, headers=headers)
+        response = http_client.get(url, headers=headers)
         logging.info(f"poll_transcription response: {response.json()}")
         if response.status_code != 200:
             raise Exception(f"Transcription status error {response.status_code}: {response.text}")
@@ -377,16 +388,8 @@ def add_captions_elevenlabs(video_file, transcript_json, output_file):
 @measure_execution_time
 def extract_word_timestamps(audiofilepath):
 
-    model_size = "medium"
-    model = WhisperModel(model_size)
-
-    segments, info = model.transcribe(audiofilepath, word_timestamps=True)
-
-    wordlevel_info = []
-    for segment in segments:
-        for word in segment.words:
-            wordlevel_info.append({'word': word.word, 'start': word.start, 'end': word.end})
-    return wordlevel_info
+    # the model stays loaded in transcribe_server instead of being rebuilt per call
+    return transcribe_server.word_timestamps(audiofilepath)
 
 # Function to generate text clips
 @measure_execution_time
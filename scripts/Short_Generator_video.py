@@ -3,9 +3,25 @@
 import os
 from pathlib import Path
 import requests
+import http_client
+import clip_library
+import mezzanine_worker
+import clip_search
+import script_writer
+from script_writer import generate_script_and_descriptions, generate_script_streaming
+import search_cache
+import tts_cache
+import tts_hedge
+import tts_script
+import tts_stream
+import tts_stage
+import word_timings
+import downloader
+import renditions
 import json
 import uuid
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
 from PIL import Image
 import numpy as np
@@ -71,8 +87,15 @@ ELEVENLABS_VOICE_ID = "pNInz6obpgDQGcFmaJgB"  # Example: "Adam" US English voice
 # VIDEO_TOPIC = "Random topic, I'll let you choose"
 # VIDEO_GOAL = "Random topic, I'll let you Decide"
 NUM_SEGMENTS = 8
-VIDEO_LENGTH_SECONDS = 200  # approx
-OLLAMA_URL = "http://host.docker.internal:11434/api/generate"
+VIDEO_LENGTH_SECONDS = script_writer.VIDEO_LENGTH_SECONDS  # approx
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "6"))  # parallel Pexels search+download jobs
+STREAM_SCRIPT = os.getenv("STREAM_SCRIPT", "1") == "1"  # start fetch/TTS per segment while Ollama is still generating
+TTS_WHOLE_SCRIPT = os.getenv("TTS_WHOLE_SCRIPT", "0") == "1"  # one TTS request for the full script, split into {i}.mp3
+TTS_HEDGE = os.getenv("TTS_HEDGE", "0") == "1"  # hedge slow ElevenLabs requests with TTS_HEDGE_SECONDARY
+TTS_HEDGE_SECONDARY = os.getenv("TTS_HEDGE_SECONDARY", "gemini")  # gemini | gtts
+TTS_TIMESTAMPS = os.getenv("TTS_TIMESTAMPS", "1") == "1"  # ElevenLabs /stream/with-timestamps: keep the alignment for captions
+ADD_CAPTIONS = os.getenv("ADD_CAPTIONS", "0") == "1"  # burn word captions into final.mp4
+OLLAMA_URL = script_writer.OLLAMA_URL
 
 IMAGE_SAVE_FOLDER = Path("/final_videos") 
 AUDIO_SAVE_FOLDER = Path("/generated_audio") 
@@ -84,121 +107,6 @@ VIDEO_GOAL = "Inspire viewers to explore new destinations and embrace the thrill
 
 
 # === Helpers ===
-@measure_execution_time
-def generate_script_and_descriptions(topic, goal, model="llama3.1:8b"):
-    # prompt = (f"You are an expert short-form video script writer for Instagram Reels and YouTube Shorts. "
-    #           f"Create a script about '{topic}'. The total length is around {VIDEO_LENGTH_SECONDS} seconds, split into {num_segments} concise segments. "
-    #           f"Each segment should have a text part and a description of an image to use. "
-    #           f"Output a JSON array with each element having 'text' and 'image_description' keys. "
-    #           f"Example: [{{'text': '...', 'image_description': '...'}}, ...]")
-    prompt_prefix = f"""You are tasked with creating a script for {topic} video that is about {VIDEO_LENGTH_SECONDS} seconds.
-    Your goal is to {goal}.
-    Please follow these instructions to create an engaging and impactful video:
-    1. Begin by setting the scene and capturing the viewer's attention with a captivating visual.
-    2. Each scene cut should occur every 5-10 seconds, ensuring a smooth flow and transition throughout the video.
-    3. For each scene cut, provide a detailed description of the stock image being shown add action if possible, which will be used to search Pexels api for free video.
-    4. Along with each image description, include a corresponding text that complements and enhances the visual. The text should be concise and powerful.
-    5. Make sure the story makes sense and is easy to follow, with a clear beginning, middle, and end.
-    6. Ensure that the sequence of images and text builds excitement and encourages viewers to take action.
-    7. Strictly output your response in a JSON list format, adhering to the following sample structure:"""
-
-    sample_output = """
-    [
-        { "image_description": "Description of the first image here. be specific and concise. only 5 main words", "text": "Text accompanying the first scene cut." },
-        { "image_description": "Description of the second image here. be specific and concise. only 5 main words", "text": "Text accompanying the second scene cut." },
-        ...
-    ]"""
-
-    prompt_postinstruction = f"""By following these instructions, you will create an impactful {topic} short-form video.
-    Output:"""
-
-    prompt = prompt_prefix + sample_output + prompt_postinstruction
-    logging.info(f"Prompt:\n{prompt}")
-
-    # logging.info("Prompt:")
-    # logging.info(prompt)
-    headers = {
-        "Content-Type": "application/json"
-        # "Authorization": f"Bearer {OPENAI_API_KEY}"
-    }
-    # data = {
-    #     "model": "gpt-4o-mini",
-    #     "messages": [{"role":"system","content":You are a helpful assistant."},
-    #                  {"role":"user","content": prompt}],
-    #     "max_tokens": max_tokens,
-    #     "temperature": 0.7,
-    #     "n": 1
-    # }
-    # response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=data)
-    # response.raise_for_status()
-    # content = response.json()["choices"][0]["message"]["content"]
-    
-    # Define the JSON schema for the expected output
-    format_schema = {
-        "type": "array",
-        "items": {
-            "type": "object",
-            "properties": {
-                "image_description": {"type": "string"},
-                "text": {"type": "string"}
-            },
-            "required": ["image_description", "text"]
-        }
-    }
-    # Optional: Ollama generation options
-    options = {
-        # "temperature": 0.8,
-        # "top_k": 20,
-        # "top_p": 0.9,
-        # "repeat_penalty": 1.2,
-        # "presence_penalty": 1.5,
-        # "frequency_penalty": 1.0,
-        # "stop": ["\n", "user:"],
-        # "num_predict": 512
-    }
-
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": False,
-        "format": format_schema,
-        "options": options
-    }
-    response = requests.post(OLLAMA_URL, json=payload)
-    # logging.info("Ollama response :")
-    # logging.info(response)
-
-    response_json = response.json()
-    content = response_json.get("response", "").strip()
-
-    logging.info("Ollama response :")
-    logging.info(response)
-
-    if response.status_code != 200:
-        logging.info("Error:", response.status_code, response.text)
-        return [], []
-
-    try:
-        output = json.loads(content)
-        # logging.info(output)
-        image_prompts = [k['image_description'] for k in output]
-        texts = [k['text'] for k in output]
-        return image_prompts, texts
-    except Exception as e:
-        logging.info("Failed to parse JSON from Ollama response:", e)
-        logging.info("Raw content:", content)
-        return [], []
-    
-    # Try to parse JSON in openAI response robustly
-    try:
-        script_data = json.loads(content)
-    except Exception:
-        start = content.find("[")
-        end = content.rfind("]") + 1
-        script_data = json.loads(content[start:end])
-    return script_data
-
-    
 
 @measure_execution_time
 def fetch_image_pexels(query, save_path):
@@ -206,23 +114,28 @@ def fetch_image_pexels(query, save_path):
     headers = {"Authorization": PEXELS_API_KEY}
     params = {"query": query, "per_page": 1, "orientation": "portrait", "size": "medium"}
     
-    response = requests.get(url, headers=headers, params=params)
-    logging.info("Pexels response status:")
-    logging.info(response)
-    if response.status_code != 200:
-        raise Exception(f"Pexels API error: {response.status_code} {response.text}")
+    data = search_cache.get(url, params)
+    if data is None:
+        response = http_client.get(url, headers=headers, params=params)
+        logging.info("Pexels response status:")
+        logging.info(response)
+        if response.status_code != 200:
+            raise Exception(f"Pexels API error: {response.status_code} {response.text}")
+        data = response.json()
+        search_cache.put(url, params, data)
+    else:
+        logging.info(f"Pexels image search cache hit for '{query}' ({search_cache.stats()})")
     
-    data = response.json()
     if data["total_results"] == 0:
         raise Exception(f"No images found for query: {query}")
     
     image_url = data["photos"][0]["src"]["original"]
-    img_data = requests.get(image_url).content
+    img_data = http_client.get(image_url).content
     with open(save_path, "wb") as f:
         f.write(img_data)
 
 @measure_execution_time
-def fetch_video_pexels(query, save_path, per_page=1, orientation='portrait', size='medium', min_width=None, max_width=None, min_height=None, max_height=None, min_duration=None, max_duration=10):
+def fetch_video_pexels(query, save_path, per_page=1, orientation='portrait', size='medium', min_width=None, max_width=None, min_height=None, max_height=None, min_duration=None, max_duration=10, budget=None, local_picker=None):
     """
     Fetch videos from Pexels API based on query and parameters.
     Save the first result video to the specified path.
@@ -239,7 +152,16 @@ def fetch_video_pexels(query, save_path, per_page=1, orientation='portrait', siz
     - max_height (int): Maximum height in pixels.
     - min_duration (int): Minimum video duration in seconds.
     - max_duration (int): Maximum video duration in seconds.
+    - budget (renditions.BandwidthBudget): Optional per-job download byte budget.
+    - local_picker (clip_search.LocalClipPicker): Reuse matching library footage before calling Pexels.
     """
+    if local_picker:
+        local = local_picker.pick(query)
+        if local:
+            clip_library.link_into(local["path"], save_path)
+            logging.info(f"Local library hit for '{query}' (score {local['score']:.2f}), linked {local['path']}")
+            return
+
     url = "https://api.pexels.com/videos/search"
     headers = {"Authorization": PEXELS_API_KEY}
     params = {
@@ -263,34 +185,100 @@ def fetch_video_pexels(query, save_path, per_page=1, orientation='portrait', siz
     if max_duration:
         params["max_duration"] = max_duration
 
-    response = requests.get(url, headers=headers, params=params)
-    logging.info(f"Pexels video search response status: {response.status_code}")
-    if response.status_code != 200:
-        raise Exception(f"Pexels API error: {response.status_code} {response.text}")
+    data = search_cache.get(url, params)
+    if data is None:
+        response = http_client.get(url, headers=headers, params=params)
+        logging.info(f"Pexels video search response status: {response.status_code}")
+        if response.status_code != 200:
+            raise Exception(f"Pexels API error: {response.status_code} {response.text}")
+        data = response.json()
+        search_cache.put(url, params, data)
+    else:
+        logging.info(f"Pexels video search cache hit for '{query}' ({search_cache.stats()})")
 
-    data = response.json()
     if data["total_results"] == 0 or not data.get("videos"):
         raise Exception(f"No videos found for query: {query}")
 
     # You can choose the video quality/url from available video files
-    video_files = data["videos"][0]["video_files"]
-    # Select the highest quality mp4 file by default (or customize here)
-    video_url = None
-    for vf in sorted(video_files, key=lambda x: x["height"], reverse=True):
-        if vf["file_type"] == "video/mp4":
-            video_url = vf["link"]
-            break
-    if not video_url:
+    video = data["videos"][0]
+    video_files = video["video_files"]
+    # Footage already in the clip library is linked into the workspace (and has a mezzanine once the worker ran)
+    known = clip_library.find_by_provider("pexels", video["id"])
+    if known:
+        clip_library.link_into(known["path"], save_path)
+        logging.info(f"Video {video['id']} already in library, linked to {save_path}")
+        return
+    # Smallest mp4 that still covers 1080x1920 after the 9:16 crop (4K is wasted bandwidth and decode CPU)
+    if not any(vf["file_type"] == "video/mp4" for vf in video_files):
         raise Exception("No mp4 video file found for the selected video.")
-
-    video_data = requests.get(video_url).content
-    with open(save_path, "wb") as f:
-        f.write(video_data)
+    rendition = renditions.choose_rendition(video_files, budget=budget)
+    if not rendition:
+        if budget is not None and budget.max_bytes is not None:
+            raise Exception(f"Bandwidth budget exhausted ({budget.used} bytes used) for query: {query}")
+        raise Exception(f"No usable mp4 rendition for query: {query}")
+    video_url = rendition["link"]
+    logging.info(f"Selected {rendition.get('width')}x{rendition.get('height')} rendition for '{query}'")
+
+    # Download into the library (content-addressed, picked up by mezzanine_worker), then link into the workspace
+    tmp_path = clip_library.ROOT / f".pexels_{video['id']}_{rendition.get('id')}.mp4"
+    try:
+        result = downloader.download_file(video_url, tmp_path)
+    except Exception:
+        if budget is not None:
+            budget.release_rendition(rendition)
+        raise
+    clip = clip_library.add_clip(
+        tmp_path, source="pexels", provider_id=video["id"], file_id=rendition.get("id"), url=video.get("url"),
+        width=rendition.get("width"), height=rendition.get("height"), duration=video.get("duration"),
+        license="Pexels", tags=[query], sha1=result["sha1"],
+    )
+    mezzanine_worker.enqueue(clip)
+    clip_library.link_into(clip["path"], save_path)
     logging.info(f"Video saved to {save_path}")
 
 @measure_execution_time
-def generate_audio_elevenlabs(text, filename):
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
+def fetch_segment_videos(image_prompts, video_folder, max_workers=FETCH_CONCURRENCY, max_duration=10, budget=None,
+                         local_first=True):
+    """
+    Search and download one Pexels video per image prompt concurrently.
+    Segment i is written to `{video_folder}/{i}.mp4` (1-based, same as the sequential loop).
+    All segments share one bandwidth budget (JOB_BANDWIDTH_BUDGET_MB unless given).
+    With local_first, matching library clips are reused and Pexels is only called on a miss.
+    Returns a dict {segment_index: exception} for the segments that failed.
+    """
+    os.makedirs(video_folder, exist_ok=True)
+    budget = budget or renditions.BandwidthBudget.from_env()
+    local_picker = clip_search.LocalClipPicker() if local_first else None
+    failures = {}
+    if not image_prompts:
+        return failures
+
+    workers = max(1, min(max_workers, len(image_prompts)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pexels-fetch") as pool:
+        futures = {}
+        for i, image_prompt in enumerate(image_prompts, start=1):
+            video_path = os.path.join(video_folder, f"{i}.mp4")
+            future = pool.submit(fetch_video_pexels, image_prompt, video_path, max_duration=max_duration, budget=budget,
+                                 local_picker=local_picker)
+            futures[future] = (i, video_path)
+
+        for future in as_completed(futures):
+            i, video_path = futures[future]
+            try:
+                future.result()
+                logging.info(f"Image {i} downloaded: {video_path}")
+            except Exception as e:
+                failures[i] = e
+                logging.info(f"Failed to fetch image for segment {i}: {e}")
+    if local_picker:
+        logging.info(f"Local library: {local_picker.hits} hits, {local_picker.misses} misses")
+    if budget.max_bytes is not None:
+        logging.info(f"Segment downloads used {budget.used / 1e6:.1f} of {budget.max_bytes / 1e6:.1f} MB budget")
+    return failures
+
+@measure_execution_time
+def generate_audio_elevenlabs(text, filename, cache_only=False):
+    """ElevenLabs voice-over through tts_cache; returns the cached_synthesis result (None on a cache_only miss)."""
     headers = {
         "Accept": "audio/mpeg",
         "Content-Type": "application/json",
@@ -301,13 +289,102 @@ def generate_audio_elevenlabs(text, filename):
         "model_id": "eleven_multilingual_v2",
         "voice_settings": {"stability": 0.4, "similarity_boost": 0.8}
     }
-    
-    response = requests.post(url, headers=headers, json=payload)
-    if response.status_code == 200:
-        with open(filename, "wb") as f:
-            f.write(response.content)
+
+    def synthesize(path):
+        # streamed straight to disk; logs time-to-first-byte
+        if TTS_TIMESTAMPS:
+            # character alignment streams with the audio; captions use it instead of forced alignment / Whisper
+            info = tts_stream.elevenlabs_stream_with_timestamps(
+                text, path, ELEVENLABS_VOICE_ID, ELEVENLABS_API_KEY, payload["model_id"], payload["voice_settings"])
+            return {"meta": {"alignment": info["alignment"]}}
+        tts_stream.elevenlabs_stream(text, path, ELEVENLABS_VOICE_ID, ELEVENLABS_API_KEY, payload["model_id"],
+                                     payload["voice_settings"], accept=headers["Accept"])
+
+    settings = dict(payload["voice_settings"], with_timestamps=True) if TTS_TIMESTAMPS else payload["voice_settings"]
+    result = tts_cache.cached_synthesis("elevenlabs", ELEVENLABS_VOICE_ID, payload["model_id"], text,
+                                        settings, filename, synthesize, cache_only=cache_only)
+    if result is None:
+        return None
+    if result["cached"]:
+        logging.info(f"TTS cache hit for {filename}")
+    alignment = (result.get("meta") or {}).get("alignment")
+    if alignment:
+        word_timings.save(filename, alignment, "elevenlabs")
     else:
-        raise Exception(f"ElevenLabs TTS error {response.status_code}: {response.text}")
+        word_timings.discard(filename)
+    return result
+
+@measure_execution_time
+def generate_audio_hedged(text, filename):
+    """ElevenLabs, hedged to the secondary provider when slower than its learned p90 (or failing)."""
+    tts_hedge.hedged_synthesis(text, filename, [
+        ("elevenlabs", generate_audio_elevenlabs, "mp3"),
+        tts_hedge.PROVIDERS[TTS_HEDGE_SECONDARY],
+    ])
+
+
+def segment_tts():
+    return generate_audio_hedged if TTS_HEDGE else generate_audio_elevenlabs
+
+
+def segment_tts_provider():
+    """tts_stage cap for segment_tts(); the hedged path takes each provider's slot itself."""
+    return None if TTS_HEDGE else "elevenlabs"
+
+@measure_execution_time
+def run_streaming_segments(topic, goal, model, video_folder, audio_folder, max_workers=FETCH_CONCURRENCY,
+                           budget=None, local_first=True, synthesize_audio=True):
+    """
+    Steps 1-3 overlapped: each segment's video fetch and voice-over start as soon as
+    Ollama finishes writing it. Writes {i}.mp4 / {i}.mp3 like the sequential steps.
+    With synthesize_audio=False only the videos are fetched (whole-script TTS runs afterwards).
+    Returns (image_prompts, texts).
+    """
+    os.makedirs(video_folder, exist_ok=True)
+    os.makedirs(audio_folder, exist_ok=True)
+    budget = budget or renditions.BandwidthBudget.from_env()
+    local_picker = clip_search.LocalClipPicker() if local_first else None
+    fetch_futures, tts_futures = {}, {}
+    tts_errors = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pexels-fetch") as fetch_pool, \
+            ThreadPoolExecutor(max_workers=tts_stage.concurrency("elevenlabs"), thread_name_prefix="tts") as tts_pool:
+
+        def on_segment(i, image_prompt, text):
+            video_path = os.path.join(video_folder, f"{i}.mp4")
+            audio_path = os.path.join(audio_folder, f"{i}.mp3")
+            future = fetch_pool.submit(fetch_video_pexels, image_prompt, video_path, max_duration=10,
+                                       budget=budget, local_picker=local_picker)
+            fetch_futures[future] = (i, video_path)
+            if not synthesize_audio:
+                return
+            future = tts_pool.submit(tts_stage.synthesize_one, segment_tts(), text, audio_path,
+                                     segment_tts_provider())
+            tts_futures[future] = (i, audio_path)
+
+        image_prompts, texts = generate_script_streaming(topic, goal, model, on_segment=on_segment)
+
+        for future in as_completed(fetch_futures):
+            i, video_path = fetch_futures[future]
+            try:
+                future.result()
+                logging.info(f"Image {i} downloaded: {video_path}")
+            except Exception as e:
+                logging.info(f"Failed to fetch image for segment {i}: {e}")
+        tts_paths = {}
+        for future in as_completed(tts_futures):
+            i, audio_path = tts_futures[future]
+            try:
+                future.result()
+                tts_paths[i] = audio_path
+                logging.info(f"Audio {i} generated.")
+            except Exception as e:
+                logging.info(f"Failed to generate audio for segment {i}: {e}")
+                tts_errors[i] = e
+
+    if tts_errors:
+        raise tts_stage.TTSStageError(tts_errors, tts_paths)
+    return image_prompts, texts
 
 @measure_execution_time
 def create_video(image_folder, audio_folder, output_file, fps=24, out_res=(1080, 1920)):
@@ -360,20 +437,18 @@ def create_video_from_videos(video_folder, audio_folder, output_file, fps=24, ou
         audio_clip = AudioFileClip(audio_path)
         audio_clips.append(audio_clip)
         
-        # Load video clip
-        vid_clip = VideoFileClip(video_path)
-        
-        # Resize video keeping aspect ratio, then crop or pad to output resolution
-        vid_resized = vid_clip.resize(height=out_res[1])
-        
-        # If the width after resizing differs, add black bars (letterboxing/pillarboxing)
-        if vid_resized.w != out_res[0]:
-            # Center video on black background with output resolution
-            vid_resized = vid_resized.on_color(
-                size=out_res,
-                color=(0, 0, 0),
-                pos=('center', 'center')
-            )
+        # Pre-transcoded mezzanine (already out_res, fixed fps) skips all scale/crop work
+        mezzanine = clip_library.mezzanine_for(video_path, size=out_res)
+        if mezzanine:
+            vid_resized = VideoFileClip(mezzanine)
+        else:
+            # Load video clip
+            vid_clip = VideoFileClip(video_path)
+            
+            # Scale to cover and center crop, the same geometry as the mezzanine, so shots match either way
+            scaled_w, scaled_h, x1, y1 = mezzanine_worker.cover_crop(vid_clip.w, vid_clip.h, *out_res)
+            vid_resized = vid_clip.resize((scaled_w, scaled_h)).crop(
+                x1=x1, y1=y1, width=out_res[0], height=out_res[1])
         
         # Set video clip duration exactly to audio clip duration for sync
         clip = vid_resized.set_duration(audio_clip.duration).set_fps(fps)
@@ -406,7 +481,7 @@ def upload_audio_for_transcription(audio_filepath):
         files = {
             "file": (os.path.basename(audio_filepath), audio_file, "audio/mpeg")
         }
-        response = requests.post(url, headers=headers, files=files)
+        response = http_client.post(url, headers=headers, files=files, max_retries=1)
         logging.info(f"upload_audio_for_transcription response: {response.json()}")
     # response.raise_for_status()
     resp_json = response.json()
@@ -419,7 +494,7 @@ def poll_transcription(transcription_id, max_retries=15, wait_seconds=5):
         "xi-api-key": ELEVENLABS_API_KEY,
     }
     for i in range(max_retries):
-        response = requests.get(url, headers=headers)
+        response = http_client.get(url, headers=headers)
         logging.info(f"poll_transcription response: {response.json()}")
         if response.status_code != 200:
             raise Exception(f"Transcription status error {response.status_code}: {response.text}")
@@ -501,42 +576,69 @@ os.makedirs(IMAGE_SAVE_FOLDER, exist_ok=True)
 logging.info(f"------------------------ New Process started with path: {workspace_folder} ------------------------")
 # logging.info(f"Workspace folder created: {workspace_folder}")
 
-# Generate script and image prompts
-logging.info("Step 1: Generating script and image prompts via OpenAI...")
-script_data = generate_script_and_descriptions(VIDEO_TOPIC, VIDEO_GOAL, "llama3.1:8b")
-image_prompts, texts = script_data  # unpack the tuple
-
-logging.info("Final Data:")
-for i, (image_prompt, text) in enumerate(zip(image_prompts, texts), start=1):
-    logging.info(f"Text {i}: {text}")
-    logging.info(f"Image Prompt {i}: {image_prompt}")
-
-
-
-# Fetch images from Pexels
-logging.info("\nStep 2: Fetching images from Pexels...")
-for i, (image_prompt, text) in enumerate(zip(image_prompts, texts), start=1):
-    image_path = os.path.join(IMAGE_SAVE_FOLDER, workspace_folder, f"{i}.mp4")
-    os.makedirs(os.path.dirname(image_path), exist_ok=True)
-    try:
-        # fetch_image_pexels(image_prompt, image_path)
-        fetch_video_pexels(image_prompt, image_path, max_duration=10) #TODO: comment this line
-        logging.info(f"Image {i} downloaded: {image_path}")
-    except Exception as e:
-        logging.info(f"Failed to fetch image for segment {i}: {e}")
-
-# Generate audio clips using ElevenLabs
-# logging.info("\nStep 3: Generating audio clips with ElevenLabs TTS...")
-# for i, seg in enumerate(script_data, start=1):
-#     audio_path = os.path.join(workspace_folder, f"{i}.mp3")
-#     generate_audio_elevenlabs(seg[0], audio_path)
-#     logging.info(f"Audio {i} generated.")
-logging.info("\nStep 3: Generating audio clips with ElevenLabs TTS...")
-for i, text in enumerate(texts, start=1):
-    audio_path = os.path.join(AUDIO_SAVE_FOLDER, workspace_folder, f"{i}.mp3")
-    os.makedirs(os.path.dirname(audio_path), exist_ok=True)
-    generate_audio_elevenlabs(text, audio_path)
-    logging.info(f"Audio {i} generated.")    
+if STREAM_SCRIPT:
+    # Steps 1-3 overlapped: each segment is fetched and voiced as soon as Ollama finishes writing it
+    logging.info("Step 1-3: Streaming script from Ollama, fetching videos and generating audio per segment...")
+    image_prompts, texts = run_streaming_segments(
+        VIDEO_TOPIC,
+        VIDEO_GOAL,
+        "llama3.1:8b",
+        os.path.join(IMAGE_SAVE_FOLDER, workspace_folder),
+        os.path.join(AUDIO_SAVE_FOLDER, workspace_folder),
+        synthesize_audio=not TTS_WHOLE_SCRIPT,
+    )
+    logging.info("Final Data:")
+    for i, (image_prompt, text) in enumerate(zip(image_prompts, texts), start=1):
+        logging.info(f"Text {i}: {text}")
+        logging.info(f"Image Prompt {i}: {image_prompt}")
+else:
+    # Generate script and image prompts
+    logging.info("Step 1: Generating script and image prompts via OpenAI...")
+    script_data = generate_script_and_descriptions(VIDEO_TOPIC, VIDEO_GOAL, "llama3.1:8b")
+    image_prompts, texts = script_data  # unpack the tuple
+
+    logging.info("Final Data:")
+    for i, (image_prompt, text) in enumerate(zip(image_prompts, texts), start=1):
+        logging.info(f"Text {i}: {text}")
+        logging.info(f"Image Prompt {i}: {image_prompt}")
+
+
+
+    # Fetch images from Pexels
+    logging.info("\nStep 2: Fetching images from Pexels...")
+    # Every segment is searched and downloaded at the same time (bounded by FETCH_CONCURRENCY)
+    fetch_failures = fetch_segment_videos(
+        image_prompts[:len(texts)],
+        os.path.join(IMAGE_SAVE_FOLDER, workspace_folder),
+        max_workers=FETCH_CONCURRENCY,
+        max_duration=10,
+    )
+    if fetch_failures:
+        logging.info(f"{len(fetch_failures)} of {len(image_prompts)} segment videos failed: {sorted(fetch_failures)}")
+
+    # Generate audio clips using ElevenLabs
+    # logging.info("\nStep 3: Generating audio clips with ElevenLabs TTS...")
+    # for i, seg in enumerate(script_data, start=1):
+    #     audio_path = os.path.join(workspace_folder, f"{i}.mp3")
+    #     generate_audio_elevenlabs(seg[0], audio_path)
+    #     logging.info(f"Audio {i} generated.")
+    if not TTS_WHOLE_SCRIPT:
+        logging.info("\nStep 3: Generating audio clips with ElevenLabs TTS...")
+        # All segments at once, capped at the ElevenLabs concurrency limit; failed segments are retried on their own
+        tts_stage.synthesize_segments(texts, os.path.join(AUDIO_SAVE_FOLDER, workspace_folder),
+                                      segment_tts(), segment_tts_provider(),
+                                      workers=tts_stage.concurrency("elevenlabs"))
+
+if TTS_WHOLE_SCRIPT:
+    logging.info("\nStep 3: Generating the whole script audio in one ElevenLabs request...")
+    tts_script.synthesize_script_elevenlabs(
+        texts,
+        os.path.join(AUDIO_SAVE_FOLDER, workspace_folder),
+        ELEVENLABS_VOICE_ID,
+        ELEVENLABS_API_KEY,
+        "eleven_multilingual_v2",
+        {"stability": 0.4, "similarity_boost": 0.8},
+    )
 
 # Create combined video with blurred BG and centered images
 logging.info("\nStep 4: Creating combined video...")
@@ -567,14 +669,12 @@ except Exception as e:
     logging.info(f"Audio extraction failed: {e}")
 
 
-# wordlevel_info =  extract_word_timestamps(extracted_audio_path)
-# logging.info("wordlevel_info:::")
-# logging.info(wordlevel_info)
-# #create video with subtitles
-# final_video_path = os.path.join(IMAGE_SAVE_FOLDER, workspace_folder, "final_video_with_captions.mp4")
-# # generate_final_video(image_folder, wordlevel_info, extracted_audio_path, final_video_path)
-# video = VideoFileClip(combined_video_path)
-# add_captions_to_video(combined_video_path,wordlevel_info)
+if ADD_CAPTIONS:
+    # provider alignment per segment, shifted onto the combined timeline; Whisper only for segments without text
+    wordlevel_info = word_timings.caption_words(texts, audio_folder)
+    logging.info("wordlevel_info:::")
+    logging.info(wordlevel_info)
+    add_captions_to_video(combined_video_path, wordlevel_info)
 
 end_time = time.time()
 elapsed = end_time - start_time_main
@@ -0,0 +1,155 @@
+"""
+batch_scripts.py
+
+Generate segment scripts for many topics in one process, through a bounded worker
+pool against the Ollama endpoint.
+
+Input is a topics file, one job per entry:
+- .jsonl: {"topic": "...", "goal": "...", "model": "..." (optional)} per line
+- .csv:   header row with topic,goal[,model]
+- anything else: one "topic<TAB>goal" per line (# comments and blank lines ignored)
+
+Each job writes <out>/<job_id>/manifest.json with the segments, status, latency and
+Ollama token counters; <out>/batch_summary.json holds the per-topic latencies and
+the aggregate tokens/sec, for sizing the Ollama host. Keep --workers at or below
+the server's OLLAMA_NUM_PARALLEL, extra requests only queue on the server.
+
+Usage:
+    python batch_scripts.py topics.jsonl --out /final_videos/scripts --workers 2
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List
+
+import llm_cache
+import script_writer
+
+BATCH_WORKERS = int(os.getenv("BATCH_LLM_WORKERS", "2"))
+OUT_DIR = Path(os.getenv("BATCH_SCRIPTS_DIR", "/final_videos/scripts"))
+
+
+def load_topics(path: Path) -> List[dict]:
+    path = Path(path)
+    jobs = []
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix == ".jsonl":
+            jobs = [json.loads(line) for line in f if line.strip()]
+        elif path.suffix == ".csv":
+            jobs = [dict(row) for row in csv.DictReader(f)]
+        else:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                topic, _, goal = line.partition("\t")
+                jobs.append({"topic": topic.strip(), "goal": goal.strip()})
+    return [j for j in jobs if j.get("topic")]
+
+
+def job_id(job: dict) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", job["topic"].lower()).strip("-")[:40]
+    digest = hashlib.sha1(f"{job['topic']}\n{job.get('goal', '')}\n{job.get('model', '')}".encode("utf-8")).hexdigest()
+    return f"{slug}-{digest[:8]}"
+
+
+def run_job(job: dict, out_dir: Path, default_model: str) -> dict:
+    model = job.get("model") or default_model
+    manifest = {
+        "job_id": job_id(job),
+        "topic": job["topic"],
+        "goal": job.get("goal", ""),
+        "model": model,
+        "started_at": time.time(),
+    }
+    try:
+        result = script_writer.generate_script(job["topic"], job.get("goal", ""), model)
+    except Exception as e:
+        result = {"image_prompts": [], "texts": [], "cached": False, "error": str(e),
+                  "latency": time.time() - manifest["started_at"]}
+    manifest.update(result)
+    manifest["segments"] = [
+        {"image_description": d, "text": t} for d, t in zip(result["image_prompts"], result["texts"])
+    ]
+    del manifest["image_prompts"], manifest["texts"]
+    manifest["status"] = "ok" if manifest["segments"] else "failed"
+    if result.get("eval_count") and result.get("eval_duration"):
+        manifest["tokens_per_second"] = result["eval_count"] / (result["eval_duration"] / 1e9)
+
+    job_dir = out_dir / manifest["job_id"]
+    job_dir.mkdir(parents=True, exist_ok=True)
+    tmp = job_dir / "manifest.json.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, job_dir / "manifest.json")
+    return manifest
+
+
+def run_batch(jobs: List[dict], out_dir: Path = OUT_DIR, workers: int = BATCH_WORKERS,
+              model: str = script_writer.DEFAULT_MODEL) -> dict:
+    """Run every job through a pool of `workers`; returns (and writes) the batch summary."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    started = time.time()
+    manifests = []
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="llm-batch") as pool:
+        futures = {pool.submit(run_job, job, out_dir, model): job for job in jobs}
+        for future in as_completed(futures):
+            m = future.result()
+            manifests.append(m)
+            rate = f", {m['tokens_per_second']:.1f} tok/s" if m.get("tokens_per_second") else ""
+            source = "cache" if m.get("cached") else "ollama"
+            print(f"[{len(manifests)}/{len(jobs)}] {m['status']:6} {m['latency']:7.1f}s ({source}{rate}) {m['topic']}")
+    wall = time.time() - started
+
+    generated = [m for m in manifests if not m.get("cached") and m.get("eval_count")]
+    total_tokens = sum(m["eval_count"] for m in generated)
+    latencies = sorted(m["latency"] for m in manifests if not m.get("cached"))
+    summary = {
+        "jobs": len(manifests),
+        "ok": sum(1 for m in manifests if m["status"] == "ok"),
+        "failed": sum(1 for m in manifests if m["status"] != "ok"),
+        "cached": sum(1 for m in manifests if m.get("cached")),
+        "workers": workers,
+        "wall_seconds": wall,
+        "generated_tokens": total_tokens,
+        # throughput the Ollama host delivered across all parallel requests
+        "aggregate_tokens_per_second": total_tokens / wall if wall else 0.0,
+        "per_request_tokens_per_second": statistics.mean([m["tokens_per_second"] for m in generated
+                                                          if m.get("tokens_per_second")] or [0.0]),
+        "latency_p50": statistics.median(latencies) if latencies else None,
+        "latency_p95": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else None,
+        "llm_cache": llm_cache.stats(),
+        "per_topic": [
+            {"job_id": m["job_id"], "topic": m["topic"], "status": m["status"], "latency": m["latency"],
+             "cached": m.get("cached", False), "eval_count": m.get("eval_count")}
+            for m in sorted(manifests, key=lambda m: m["latency"], reverse=True)
+        ],
+    }
+    (out_dir / "batch_summary.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate scripts for a file of topics/goals.")
+    parser.add_argument("topics", type=Path, help=".jsonl, .csv or tab-separated topic/goal file")
+    parser.add_argument("--out", type=Path, default=OUT_DIR)
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--model", default=script_writer.DEFAULT_MODEL)
+    args = parser.parse_args()
+
+    summary = run_batch(load_topics(args.topics), args.out, args.workers, args.model)
+    print(f"\n{summary['ok']}/{summary['jobs']} scripts ok ({summary['cached']} from cache) "
+          f"in {summary['wall_seconds']:.1f}s")
+    print(f"Aggregate throughput: {summary['aggregate_tokens_per_second']:.1f} tok/s "
+          f"({summary['per_request_tokens_per_second']:.1f} tok/s per request, {args.workers} workers)")
+    if summary["latency_p50"] is not None:
+        print(f"Latency p50 {summary['latency_p50']:.1f}s, p95 {summary['latency_p95']:.1f}s")
+    print(f"Summary: {args.out / 'batch_summary.json'}")
@@ -1,34 +1,212 @@
-import requests
+"""
+chatterbox_api.py
 
+Client for the local Chatterbox TTS Gradio server.
+
+- Each reference voice is uploaded once (/gradio_api/upload) and the server-side
+  file path is reused by content hash, so the mp3 isn't re-sent with every line; the
+  mapping is kept in SQLite, checked with a one-byte range GET per batch and re-uploaded
+  if the server has dropped the file (e.g. after a restart)
+- Jobs go through Gradio's queue API: POST /gradio_api/call/<api> returns an event
+  id right away, GET /gradio_api/call/<api>/<event_id> streams the result. All
+  segments are submitted first and collected in order, so the server never idles
+  between lines
+- Generated audio goes through tts_cache like every other backend
+
+Usage:
+    client = ChatterboxClient()
+    paths = client.synthesize_segments(texts, "/generated_audio/<ws>", "/voices/narrator.mp3")
+"""
+
+import json
+import os
+import sqlite3
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import http_client
+import tts_cache
+from clip_library import sha1_file
 from utils import measure_execution_time, logging
 
+CHATTERBOX_URL = os.getenv("CHATTERBOX_URL", "http://localhost:7860")
+API_NAME = "generate_tts_audio"
+UPLOADS_DB = Path(os.getenv("CHATTERBOX_UPLOADS_DB", "/generated_audio/.tts_cache/chatterbox_uploads.sqlite3"))
+
+DEFAULT_SETTINGS = {
+    "language_id": "en",
+    "exaggeration_input": 0.25,
+    "temperature_input": 0.05,
+    "seed_num_input": 3,
+    "cfgw_input": 0.2,
+}
+# positional order of generate_tts_audio's inputs
+PARAM_ORDER = ["text_input", "language_id", "audio_prompt_path_input", "exaggeration_input",
+               "temperature_input", "seed_num_input", "cfgw_input"]
+
+
+class ChatterboxError(Exception):
+    pass
+
+
+class ChatterboxClient:
+    def __init__(self, base_url: str = CHATTERBOX_URL, api_name: str = API_NAME):
+        self.base_url = base_url.rstrip("/")
+        self.api_name = api_name
+        self._uploads = {}  # sha1 -> server path
+
+    # --- reference voice uploads ---
+
+    def _db(self) -> sqlite3.Connection:
+        UPLOADS_DB.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(UPLOADS_DB), timeout=30)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads (server TEXT NOT NULL, sha1 TEXT NOT NULL, path TEXT NOT NULL, "
+            "uploaded_at REAL NOT NULL, PRIMARY KEY (server, sha1))"
+        )
+        return conn
+
+    def _server_has(self, server_path: str) -> bool:
+        # Gradio answers HEAD on /file= with 405, so ask for the first byte instead
+        url = f"{self.base_url}/gradio_api/file={server_path}"
+        try:
+            with http_client.get(url, headers={"Range": "bytes=0-0"}, stream=True, max_retries=1) as response:
+                return response.status_code in (200, 206)
+        except Exception:
+            return False
+
+    def reference_path(self, audio_path, verify: bool = True) -> tuple:
+        """(sha1, server-side path) for a reference voice, uploading it only if the server doesn't have it yet."""
+        sha1 = sha1_file(Path(audio_path))
+        server_path = self._uploads.get(sha1)
+        if server_path is None:
+            conn = self._db()
+            try:
+                row = conn.execute("SELECT path FROM uploads WHERE server = ? AND sha1 = ?",
+                                   (self.base_url, sha1)).fetchone()
+            finally:
+                conn.close()
+            server_path = row[0] if row else None
+        if server_path and (not verify or self._server_has(server_path)):
+            self._uploads[sha1] = server_path
+            return sha1, server_path
+
+        with open(audio_path, "rb") as f:
+            files = {"files": (os.path.basename(str(audio_path)), f, "audio/mpeg")}
+            response = http_client.post(f"{self.base_url}/gradio_api/upload", files=files, max_retries=1,
+                                        timeout=http_client.LONG_TIMEOUT)
+        if response.status_code != 200:
+            raise ChatterboxError(f"Upload failed {response.status_code}: {response.text[:300]}")
+        server_path = response.json()[0]
+        self._uploads[sha1] = server_path
+        conn = self._db()
+        try:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO uploads (server, sha1, path, uploaded_at) VALUES (?, ?, ?, ?)",
+                             (self.base_url, sha1, server_path, time.time()))
+        finally:
+            conn.close()
+        logging.info(f"Uploaded reference voice {audio_path} -> {server_path}")
+        return sha1, server_path
+
+    # --- queue API ---
+
+    def submit(self, text: str, reference_server_path: str, settings: Optional[dict] = None) -> str:
+        """Queue one generation and return its event id without waiting for the audio."""
+        values = dict(DEFAULT_SETTINGS, **(settings or {}))
+        values["text_input"] = text
+        values["audio_prompt_path_input"] = {"path": reference_server_path, "meta": {"_type": "gradio.FileData"}}
+        response = http_client.post(f"{self.base_url}/gradio_api/call/{self.api_name}",
+                                    json={"data": [values[k] for k in PARAM_ORDER]})
+        if response.status_code != 200:
+            raise ChatterboxError(f"Submit failed {response.status_code}: {response.text[:300]}")
+        return response.json()["event_id"]
+
+    def result(self, event_id: str) -> dict:
+        """Block until the event completes; returns Gradio's FileData for the generated audio."""
+        url = f"{self.base_url}/gradio_api/call/{self.api_name}/{event_id}"
+        with http_client.get(url, stream=True, timeout=http_client.LONG_TIMEOUT) as response:
+            if response.status_code != 200:
+                raise ChatterboxError(f"Result failed {response.status_code}: {response.text[:300]}")
+            event = None
+            for line in response.iter_lines():
+                if line.startswith(b"event:"):
+                    event = line[len(b"event:"):].strip().decode()
+                elif line.startswith(b"data:"):
+                    if event == "complete":
+                        return json.loads(line[len(b"data:"):])[0]
+                    if event == "error":
+                        raise ChatterboxError(f"Generation failed: {line[len(b'data:'):].strip().decode()}")
+        raise ChatterboxError(f"Event {event_id} ended without a result")
+
+    def download(self, file_data: dict, out_path: str):
+        url = file_data.get("url") or f"{self.base_url}/gradio_api/file={file_data['path']}"
+        src_ext = os.path.splitext(file_data.get("orig_name") or file_data.get("path") or url)[1]
+        tmp = f"{out_path}.part"  # not an audio extension, so segment globs never see it
+        with http_client.get(url, stream=True) as response:
+            if response.status_code != 200:
+                raise ChatterboxError(f"Download failed {response.status_code}")
+            with open(tmp, "wb") as f:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+        if src_ext.lower() == os.path.splitext(out_path)[1].lower():
+            os.replace(tmp, out_path)
+            return
+        try:
+            subprocess.run(["ffmpeg", "-y", "-v", "error", "-i", tmp, out_path], check=True)
+        finally:
+            os.remove(tmp)
+
+    # --- segments ---
+
+    @measure_execution_time
+    def synthesize_segments(self, texts: List[str], out_dir, reference_audio, settings: Optional[dict] = None,
+                            ext: str = "mp3") -> Dict[int, str]:
+        """
+        Synthesize texts[i-1] into out_dir/{i}.<ext>. Cached lines are copied from tts_cache,
+        the rest are all queued on the server before the first result is awaited.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        sha1 = sha1_file(Path(reference_audio))
+        values = dict(DEFAULT_SETTINGS, **(settings or {}))
+        paths, pending = {}, {}
+        for i, text in enumerate(texts, start=1):
+            path = os.path.join(out_dir, f"{i}.{ext}")
+            key = tts_cache.make_key("chatterbox", sha1, None, text, values, ext)
+            if tts_cache.get(key, path) is not None:
+                paths[i] = path
+                continue
+            pending[i] = (path, key, text)
+        if pending:
+            sha1, server_path = self.reference_path(reference_audio)
+
+        events = {}
+        for i, (path, key, text) in pending.items():
+            events[i] = (self.submit(text, server_path, values), time.time())
+        logging.info(f"Chatterbox: {len(paths)} cached, {len(events)} queued")
+
+        for i, (event_id, submitted) in events.items():
+            path, key, text = pending[i]
+            self.download(self.result(event_id), path)
+            tts_cache.put(key, path, "chatterbox", sha1, None, text, ext, synth_seconds=time.time() - submitted)
+            paths[i] = path
+            logging.info(f"Audio {i} generated.")
+        return dict(sorted(paths.items()))
+
+
 @measure_execution_time
 def callChatAPI():
-    api_url = 'http://localhost:7860/gradio_api/call/generate_tts_audio'
-
-    # Other form fields as per API spec
-    data = {
-        "text_input": "Hello from local file!", 
-        "language_id": "en",
-        "exaggeration_input": 0.25,
-        "temperature_input": 0.05,
-        "seed_num_input": 3,
-        "cfgw_input": 0.2
-    }
-
-    # Open your local mp3 file in binary mode
-    with open(r"/app/generated_audio/cfdc0787-52af-40b5-87f9-e9a3b9a7bad5/1.mp3", "rb") as f:
-        files = {
-            'audio_prompt_path_input': ('1.mp3', f, 'audio/mpeg')
-        }
-
-        response = requests.post(api_url, data=data, files=files)
-
-    logging(response.status_code)
-    try:
-        logging(response.json())
-    except Exception:
-        logging(response.text)
-
-
-callChatAPI()
\ No newline at end of file
+    client = ChatterboxClient()
+    paths = client.synthesize_segments(
+        ["Hello from local file!"],
+        "/app/generated_audio/chatterbox_test",
+        r"/app/generated_audio/cfdc0787-52af-40b5-87f9-e9a3b9a7bad5/1.mp3",
+        ext="wav",
+    )
+    logging.info(paths)
+
+
+if __name__ == "__main__":
+    callChatAPI()
@@ -0,0 +1,402 @@
+"""
+clip_library.py
+
+Content-addressed store for the stock clip library under /Videos, indexed by SQLite.
+
+- Every clip is stored once as /Videos/<sha1>.mp4, whatever provider/id it came from
+- library.sqlite3 records source, provider id, sha1, dimensions, duration, codec,
+  tags and last-used time, with indexes so lookups stay O(log n) as the library grows
+- Downloaders call find_by_provider() before fetching and add_clip() after, so the
+  same footage is never downloaded or stored twice under different ids
+- import_metadata_csv() migrates the old metadata.csv written by main.py
+- mezzanines (1080x1920 pre-transcodes made by mezzanine_worker) are recorded per clip
+- clip_text is an FTS5 index over tags and provider titles, queried by clip_search
+
+Files stay flat in /Videos so existing `glob("*.mp4")` consumers keep working.
+"""
+
+import csv
+import hashlib
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+ROOT = Path(os.getenv("CLIP_LIBRARY_ROOT", "/Videos"))
+DB_PATH = ROOT / "library.sqlite3"
+LEGACY_META_CSV = ROOT / "metadata.csv"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    sha1         TEXT PRIMARY KEY,
+    path         TEXT NOT NULL,
+    size_bytes   INTEGER,
+    width        INTEGER,
+    height       INTEGER,
+    duration     REAL,
+    codec        TEXT,
+    license      TEXT,
+    added_at     REAL NOT NULL,
+    last_used_at REAL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    source      TEXT NOT NULL,
+    provider_id TEXT NOT NULL,
+    file_id     TEXT,
+    url         TEXT,
+    sha1        TEXT NOT NULL REFERENCES clips(sha1) ON DELETE CASCADE,
+    added_at    REAL NOT NULL,
+    PRIMARY KEY (source, provider_id)
+);
+CREATE INDEX IF NOT EXISTS idx_sources_sha1 ON sources(sha1);
+CREATE TABLE IF NOT EXISTS tags (
+    tag  TEXT NOT NULL,
+    sha1 TEXT NOT NULL REFERENCES clips(sha1) ON DELETE CASCADE,
+    PRIMARY KEY (tag, sha1)
+);
+CREATE INDEX IF NOT EXISTS idx_tags_sha1 ON tags(sha1);
+CREATE INDEX IF NOT EXISTS idx_clips_last_used ON clips(last_used_at);
+CREATE INDEX IF NOT EXISTS idx_clips_path ON clips(path);
+CREATE TABLE IF NOT EXISTS mezzanines (
+    sha1       TEXT PRIMARY KEY REFERENCES clips(sha1) ON DELETE CASCADE,
+    path       TEXT NOT NULL,
+    width      INTEGER NOT NULL,
+    height     INTEGER NOT NULL,
+    fps        REAL NOT NULL,
+    gop        INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS clip_text USING fts5(sha1 UNINDEXED, body, tokenize='porter unicode61');
+"""
+
+
+# ----------------------- utilities -----------------------
+
+def sha1_file(path: Path) -> str:
+    h = hashlib.sha1()
+    with Path(path).open("rb") as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def normalize_tag(tag: str) -> str:
+    return " ".join(str(tag).lower().split())
+
+
+def title_from_url(url: str) -> str:
+    """Provider page slug as words, e.g. .../video/man-hiking-on-a-mountain-1234567/ -> 'man hiking on a mountain'."""
+    if not url:
+        return ""
+    slug = url.rstrip("/").rsplit("/", 1)[-1]
+    words = [w for w in re.split(r"[-_]+", slug) if w and not w.isdigit()]
+    return " ".join(words)
+
+
+def _reindex_text(conn: sqlite3.Connection, sha1: str):
+    """Rebuild the clip's searchable text from its tags and every provider title it is known under."""
+    tags = [r[0] for r in conn.execute("SELECT tag FROM tags WHERE sha1 = ?", (sha1,))]
+    titles = [title_from_url(r[0]) for r in conn.execute("SELECT url FROM sources WHERE sha1 = ?", (sha1,))]
+    conn.execute("DELETE FROM clip_text WHERE sha1 = ?", (sha1,))
+    conn.execute("INSERT INTO clip_text (sha1, body) VALUES (?, ?)", (sha1, " ".join(tags + titles)))
+
+
+def store_path(sha1: str, ext: str = ".mp4") -> Path:
+    return ROOT / f"{sha1}{ext}"
+
+
+def connect(db_path: Path = None) -> sqlite3.Connection:
+    """Open the catalog (one short-lived connection per call keeps threads/processes independent)."""
+    db_path = Path(db_path or DB_PATH)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _probe(path: Path) -> dict:
+    """Read width/height/duration/codec from the file; empty dict if ffprobe isn't available."""
+    try:
+        import ffmpeg
+        info = ffmpeg.probe(str(path), select_streams="v:0")
+        stream = info["streams"][0]
+        return {
+            "width": stream.get("width"),
+            "height": stream.get("height"),
+            "duration": float(stream.get("duration") or info["format"].get("duration") or 0) or None,
+            "codec": stream.get("codec_name"),
+        }
+    except Exception as e:
+        logging.warning(f"Probe failed for {path}: {e}")
+        return {}
+
+
+# ----------------------- lookups -----------------------
+
+def find_by_provider(source: str, provider_id, conn: sqlite3.Connection = None) -> Optional[dict]:
+    """Return the stored clip for a provider video id, if the file is still on disk."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        row = conn.execute(
+            "SELECT c.* FROM sources s JOIN clips c ON c.sha1 = s.sha1 WHERE s.source = ? AND s.provider_id = ?",
+            (source, str(provider_id)),
+        ).fetchone()
+        if row and Path(row["path"]).exists():
+            return dict(row)
+        return None
+    finally:
+        if own:
+            conn.close()
+
+
+def find_by_sha1(sha1: str, conn: sqlite3.Connection = None) -> Optional[dict]:
+    own = conn is None
+    conn = conn or connect()
+    try:
+        row = conn.execute("SELECT * FROM clips WHERE sha1 = ?", (sha1,)).fetchone()
+        if row and Path(row["path"]).exists():
+            return dict(row)
+        return None
+    finally:
+        if own:
+            conn.close()
+
+
+def find_by_path(path) -> Optional[dict]:
+    """Catalog entry for a library file, following workspace symlinks back into the store."""
+    conn = connect()
+    try:
+        row = conn.execute(
+            "SELECT * FROM clips WHERE path IN (?, ?)", (os.path.realpath(path), os.path.abspath(path))
+        ).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+
+def mezzanine_for(path, size=None) -> Optional[str]:
+    """Path of the normalized mezzanine for a library clip (optionally only if it is `size`), or None."""
+    clip = find_by_path(path)
+    if not clip:
+        return None
+    conn = connect()
+    try:
+        row = conn.execute("SELECT * FROM mezzanines WHERE sha1 = ?", (clip["sha1"],)).fetchone()
+    finally:
+        conn.close()
+    if not row or not Path(row["path"]).exists():
+        return None
+    if size and (row["width"], row["height"]) != tuple(size):
+        return None
+    return row["path"]
+
+
+def clips_without_mezzanine(limit: int = 100) -> List[dict]:
+    conn = connect()
+    try:
+        rows = conn.execute(
+            "SELECT c.* FROM clips c LEFT JOIN mezzanines m ON m.sha1 = c.sha1 WHERE m.sha1 IS NULL "
+            "ORDER BY c.added_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [dict(r) for r in rows if Path(r["path"]).exists()]
+    finally:
+        conn.close()
+
+
+def clips_with_tag(tag: str, limit: int = 50) -> List[dict]:
+    conn = connect()
+    try:
+        rows = conn.execute(
+            "SELECT c.* FROM tags t JOIN clips c ON c.sha1 = t.sha1 WHERE t.tag = ? "
+            "ORDER BY c.last_used_at IS NOT NULL, c.last_used_at LIMIT ?",
+            (normalize_tag(tag), limit),
+        ).fetchall()
+        return [dict(r) for r in rows]
+    finally:
+        conn.close()
+
+
+def touch(sha1: str):
+    """Mark a clip as used now (least recently used clips are picked first)."""
+    conn = connect()
+    try:
+        with conn:
+            conn.execute("UPDATE clips SET last_used_at = ? WHERE sha1 = ?", (time.time(), sha1))
+    finally:
+        conn.close()
+
+
+# ----------------------- writes -----------------------
+
+def add_clip(
+    file_path: Path,
+    source: str,
+    provider_id,
+    file_id=None,
+    url: str = None,
+    width: int = None,
+    height: int = None,
+    duration: float = None,
+    codec: str = None,
+    license: str = None,
+    tags: Iterable[str] = (),
+    sha1: str = None,
+) -> dict:
+    """
+    Move a freshly downloaded file into the content-addressed store and index it.
+
+    If the same bytes are already stored (under any provider id) the new file is deleted
+    and the existing clip is returned with `is_new=False`; the provider id is still
+    recorded as an alias so the next lookup skips the download entirely.
+    """
+    file_path = Path(file_path)
+    sha1 = sha1 or sha1_file(file_path)
+    now = time.time()
+    conn = connect()
+    try:
+        existing = find_by_sha1(sha1, conn)
+        if existing:
+            if file_path.resolve() != Path(existing["path"]).resolve():
+                file_path.unlink(missing_ok=True)
+            is_new = False
+        else:
+            target = store_path(sha1, file_path.suffix if file_path.suffix == ".mp4" else ".mp4")
+            if file_path.resolve() != target.resolve():
+                os.replace(file_path, target)
+            probed = _probe(target) if not (width and height and duration and codec) else {}
+            existing = {
+                "sha1": sha1,
+                "path": str(target),
+                "size_bytes": target.stat().st_size,
+                "width": width or probed.get("width"),
+                "height": height or probed.get("height"),
+                "duration": duration or probed.get("duration"),
+                "codec": codec or probed.get("codec"),
+                "license": license,
+                "added_at": now,
+                "last_used_at": None,
+            }
+            is_new = True
+
+        with conn:
+            if is_new:
+                # upsert rather than REPLACE so a re-stored file keeps its aliases/tags (no cascade delete)
+                conn.execute(
+                    "INSERT INTO clips (sha1, path, size_bytes, width, height, duration, codec, license, added_at, last_used_at) "
+                    "VALUES (:sha1, :path, :size_bytes, :width, :height, :duration, :codec, :license, :added_at, :last_used_at) "
+                    "ON CONFLICT(sha1) DO UPDATE SET path = excluded.path, size_bytes = excluded.size_bytes, "
+                    "width = excluded.width, height = excluded.height, duration = excluded.duration, codec = excluded.codec",
+                    existing,
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO sources (source, provider_id, file_id, url, sha1, added_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (source, str(provider_id), None if file_id is None else str(file_id), url, sha1, now),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO tags (tag, sha1) VALUES (?, ?)",
+                [(normalize_tag(t), sha1) for t in tags if t and normalize_tag(t)],
+            )
+            _reindex_text(conn, sha1)
+        return dict(existing, is_new=is_new)
+    finally:
+        conn.close()
+
+
+def record_mezzanine(sha1: str, path, width: int, height: int, fps: float, gop: int):
+    conn = connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO mezzanines (sha1, path, width, height, fps, gop, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (sha1, str(path), width, height, fps, gop, time.time()),
+            )
+    finally:
+        conn.close()
+
+
+def link_into(clip_path, dest):
+    """Expose a library clip at a workspace path (symlink, or a copy where links aren't possible)."""
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.is_symlink() or dest.exists():
+        dest.unlink()
+    try:
+        os.symlink(os.path.realpath(clip_path), dest)
+    except OSError:
+        shutil.copyfile(clip_path, dest)
+    return dest
+
+
+def add_alias(source: str, provider_id, sha1: str, file_id=None, url: str = None, tags: Iterable[str] = ()):
+    """Record that a provider id is the same footage as an already stored clip (no file involved)."""
+    conn = connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sources (source, provider_id, file_id, url, sha1, added_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (source, str(provider_id), None if file_id is None else str(file_id), url, sha1, time.time()),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO tags (tag, sha1) VALUES (?, ?)",
+                [(normalize_tag(t), sha1) for t in tags if t and normalize_tag(t)],
+            )
+            _reindex_text(conn, sha1)
+    finally:
+        conn.close()
+
+
+def rebuild_text_index() -> int:
+    """Re-create clip_text for every clip (for catalogs created before the index existed)."""
+    conn = connect()
+    try:
+        with conn:
+            sha1s = [r[0] for r in conn.execute("SELECT sha1 FROM clips")]
+            for sha1 in sha1s:
+                _reindex_text(conn, sha1)
+        return len(sha1s)
+    finally:
+        conn.close()
+
+
+def import_metadata_csv(csv_path: Path = LEGACY_META_CSV) -> int:
+    """One-off migration of main.py's old metadata.csv rows into the catalog. Returns rows imported."""
+    csv_path = Path(csv_path)
+    if not csv_path.exists():
+        return 0
+    imported = 0
+    with csv_path.open(newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            local = Path(row.get("local_path") or "")
+            if not local.is_file():
+                continue
+            if find_by_provider(row["source"], row["id"]):
+                continue
+            add_clip(
+                local,
+                source=row["source"],
+                provider_id=row["id"],
+                url=row.get("url"),
+                width=int(float(row["width"])) if row.get("width") else None,
+                height=int(float(row["height"])) if row.get("height") else None,
+                duration=float(row["duration"]) if row.get("duration") else None,
+                license=row.get("license"),
+                tags=[row.get("tags")],
+            )
+            imported += 1
+    return imported
+
+
+if __name__ == "__main__":
+    print(f"Imported {import_metadata_csv()} rows from {LEGACY_META_CSV}")
@@ -0,0 +1,117 @@
+"""
+clip_search.py
+
+Local-first clip retrieval: find library footage for an image_description before
+calling Pexels.
+
+Uses the clip_text FTS5 index in the library catalog (tags written by the
+downloaders + provider page titles), ranked with SQLite's built-in BM25 and the
+porter stemmer. A result must cover a minimum share of the query's content words,
+so only genuinely matching clips are reused and everything else falls through to
+the network. The BM25 score threshold only applies once the library holds
+LOCAL_CLIP_MIN_DOCS clips: on a small library IDF is close to zero, so raw BM25
+scores say nothing about match quality and coverage alone decides.
+
+Usage:
+    picker = clip_search.LocalClipPicker()
+    clip = picker.pick("man hiking on a mountain at sunrise")   # dict or None
+"""
+
+import os
+import re
+import threading
+from typing import List, Optional
+
+import clip_library
+
+MIN_SCORE = float(os.getenv("LOCAL_CLIP_MIN_SCORE", "1.0"))        # -bm25(), higher is better
+MIN_COVERAGE = float(os.getenv("LOCAL_CLIP_MIN_COVERAGE", "0.6"))  # share of query words matched
+MIN_DOCS = int(os.getenv("LOCAL_CLIP_MIN_DOCS", "200"))            # library size before MIN_SCORE applies
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "with", "for", "from", "by", "is", "are",
+    "be", "it", "its", "this", "that", "their", "his", "her", "into", "over", "up", "down", "as", "while",
+    "image", "video", "shot", "scene", "description", "showing", "shows",
+}
+
+
+def query_terms(text: str) -> List[str]:
+    words = re.findall(r"[a-z0-9]+", str(text).lower())
+    seen = []
+    for w in words:
+        if w not in STOPWORDS and len(w) > 1 and w not in seen:
+            seen.append(w)
+    return seen
+
+
+def _stem(word: str) -> str:
+    # rough match for FTS5's porter stemmer, only used for the coverage check
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+def search(description: str, limit: int = 10, min_score: float = MIN_SCORE,
+           min_coverage: float = MIN_COVERAGE) -> List[dict]:
+    """
+    Ranked library clips for a description (best first), each with `score` and `coverage`.
+    `min_score` is ignored while the library has fewer than MIN_DOCS clips.
+    """
+    terms = query_terms(description)
+    if not terms:
+        return []
+    match = " OR ".join(f'"{t}"' for t in terms)
+    conn = clip_library.connect()
+    try:
+        rows = conn.execute(
+            "SELECT c.*, t.body AS body, -bm25(clip_text) AS score FROM clip_text t "
+            "JOIN clips c ON c.sha1 = t.sha1 WHERE clip_text MATCH ? ORDER BY bm25(clip_text) LIMIT ?",
+            (match, limit * 5),
+        ).fetchall()
+        if rows and conn.execute("SELECT count(*) FROM clip_text").fetchone()[0] < MIN_DOCS:
+            min_score = float("-inf")  # too few documents for meaningful IDF
+    finally:
+        conn.close()
+
+    stems = {_stem(t) for t in terms}
+    results = []
+    for row in rows:
+        body_stems = {_stem(w) for w in query_terms(row["body"])}
+        coverage = len(stems & body_stems) / len(stems)
+        if row["score"] < min_score or coverage < min_coverage:
+            continue
+        if not os.path.exists(row["path"]):
+            continue
+        clip = dict(row)
+        clip["coverage"] = coverage
+        results.append(clip)
+        if len(results) >= limit:
+            break
+    return results
+
+
+class LocalClipPicker:
+    """Picks the best unused local clip per segment, so one short doesn't repeat footage. Thread-safe."""
+
+    def __init__(self, min_score: float = MIN_SCORE, min_coverage: float = MIN_COVERAGE):
+        self.min_score = min_score
+        self.min_coverage = min_coverage
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def pick(self, description: str) -> Optional[dict]:
+        candidates = search(description, limit=10, min_score=self.min_score, min_coverage=self.min_coverage)
+        with self._lock:
+            for clip in candidates:
+                if clip["sha1"] not in self.used:
+                    self.used.add(clip["sha1"])
+                    self.hits += 1
+                    break
+            else:
+                self.misses += 1
+                return None
+        clip_library.touch(clip["sha1"])
+        return clip
@@ -0,0 +1,184 @@
+"""
+downloader.py
+
+Resumable, integrity-checked downloads for large stock footage files.
+
+- Streams in large chunks (DOWNLOAD_CHUNK_SIZE, default 4 MB) so memory stays flat
+- Writes to `<target>.part` and atomically renames it into place when complete
+- Resumes an existing .part file (from a failed attempt or an earlier run) with an
+  HTTP Range request; falls back to a full download if the server ignores the range
+- SHA1 is computed while streaming, so callers don't need a second sha1_file() pass
+- The final size is checked against Content-Length / Content-Range
+- One download per target at a time: a per-path thread lock plus flock on the .part
+  file, so concurrent segments that picked the same clip wait for the first one and
+  reuse its file instead of appending to each other's partial download
+
+Usage:
+    result = downloader.download_file(url, Path("/Videos/clip.mp4"))
+    result["sha1"], result["size"], result["path"]
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+import http_client
+
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(4 * 1024 * 1024)))
+MAX_ATTEMPTS = 5
+
+_target_locks = {}
+_target_locks_guard = threading.Lock()
+
+
+class DownloadError(Exception):
+    pass
+
+
+def _hash_existing(path: Path, hasher, chunk_size: int) -> int:
+    """Feed an existing partial file into the hasher; returns its size."""
+    size = 0
+    with path.open("rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            size += len(chunk)
+    return size
+
+
+def _total_from_content_range(value: str):
+    # "bytes 100-999/1000" or "bytes */1000"
+    m = re.match(r"bytes\s+(\*|(\d+)-(\d+))/(\d+|\*)", value or "")
+    if not m:
+        return None, None
+    start = int(m.group(2)) if m.group(2) is not None else None
+    total = int(m.group(4)) if m.group(4) != "*" else None
+    return start, total
+
+
+def _target_lock(path: Path) -> threading.Lock:
+    with _target_locks_guard:
+        return _target_locks.setdefault(str(path.resolve()), threading.Lock())
+
+
+def _lock_part(part_path: Path, finished):
+    """
+    Open and flock the .part file; returns the locked file, or None when another
+    process finished the target (and renamed the .part away) while we waited.
+    """
+    while True:
+        f = part_path.open("ab")
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            current = os.stat(part_path)
+        except FileNotFoundError:
+            current = None
+        if current is not None and os.path.samestat(os.fstat(f.fileno()), current):
+            return f
+        f.close()
+        if finished():
+            return None
+
+
+def _completed(out_path: Path, chunk_size: int) -> dict:
+    hasher = hashlib.sha1()
+    size = _hash_existing(out_path, hasher, chunk_size)
+    return {"path": out_path, "sha1": hasher.hexdigest(), "size": size}
+
+
+def download_file(url: str, out_path: Path, headers: dict = None, chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                  max_attempts: int = MAX_ATTEMPTS) -> dict:
+    """
+    Download `url` to `out_path`, resuming any `<out_path>.part` left behind.
+    Returns {"path", "sha1", "size"}; raises DownloadError when all attempts fail.
+    A concurrent download of the same target is waited for and its file reused.
+    """
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    part_path = out_path.with_name(out_path.name + ".part")
+    existed = out_path.exists()
+
+    def finished():
+        return not existed and out_path.exists()
+
+    with _target_lock(out_path):
+        if finished():
+            return _completed(out_path, chunk_size)
+        lock_file = _lock_part(part_path, finished)
+        if lock_file is None:
+            return _completed(out_path, chunk_size)
+        try:
+            return _download(url, out_path, part_path, headers, chunk_size, max_attempts)
+        finally:
+            lock_file.close()
+
+
+def _download(url: str, out_path: Path, part_path: Path, headers: dict, chunk_size: int, max_attempts: int) -> dict:
+    hasher = hashlib.sha1()
+    offset = _hash_existing(part_path, hasher, chunk_size) if part_path.exists() else 0
+    last_error = None
+
+    for attempt in range(max_attempts):
+        req_headers = dict(headers or {})
+        if offset:
+            req_headers["Range"] = f"bytes={offset}-"
+        try:
+            # this loop does the retrying; one http_client attempt each keeps it at max_attempts requests
+            with http_client.get(url, headers=req_headers, stream=True, max_retries=1) as r:
+                if r.status_code == 416 and offset:
+                    # nothing left to send: the partial file may already be complete
+                    _, total = _total_from_content_range(r.headers.get("Content-Range"))
+                    if total == offset:
+                        break
+                    part_path.open("wb").close()  # truncate in place: the flock is held on this inode
+                    hasher, offset = hashlib.sha1(), 0
+                    continue
+                if r.status_code not in (200, 206):
+                    raise DownloadError(f"HTTP {r.status_code} for {url}")
+
+                if r.status_code == 206:
+                    start, expected_total = _total_from_content_range(r.headers.get("Content-Range"))
+                    if start != offset:
+                        raise DownloadError(f"Server resumed at byte {start}, expected {offset}")
+                    mode = "ab"
+                else:
+                    # full body: server ignored or doesn't support the range
+                    if offset:
+                        hasher, offset = hashlib.sha1(), 0
+                    length = r.headers.get("Content-Length")
+                    expected_total = int(length) if length is not None else None
+                    mode = "wb"
+
+                with part_path.open(mode) as f:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            hasher.update(chunk)
+                            offset += len(chunk)
+
+                if expected_total is not None and offset != expected_total:
+                    raise DownloadError(f"Size mismatch for {url}: got {offset} of {expected_total} bytes")
+                break
+        except (requests.RequestException, DownloadError, OSError) as e:
+            last_error = e
+            logging.warning(f"Download attempt {attempt + 1}/{max_attempts} failed at byte {offset}: {e}")
+            if offset and part_path.exists() and part_path.stat().st_size != offset:
+                # keep hash state and file in step; re-hash what actually reached disk
+                hasher = hashlib.sha1()
+                offset = _hash_existing(part_path, hasher, chunk_size)
+            if attempt < max_attempts - 1:
+                time.sleep(http_client.backoff_delay(attempt))
+    else:
+        raise DownloadError(f"Download failed after {max_attempts} attempts: {last_error}")
+
+    os.replace(part_path, out_path)
+    return {"path": out_path, "sha1": hasher.hexdigest(), "size": offset}
@@ -0,0 +1,195 @@
+"""
+forced_align.py
+
+Word timings for narration whose text we already know (the LLM `texts`, `story_text`),
+without running speech recognition.
+
+- The audio is reduced to a 10 ms energy envelope; pauses are the quiet runs of it
+- Every word gap in the text gets an expected time (speaking time shared out by
+  word length, plus a pause allowance after punctuation)
+- A DTW pass matches word gaps to detected pauses: a match is cheap when the pause
+  sits near the expected time and the gap has punctuation, an unmatched long pause
+  (one that would fall inside a word) is expensive
+- Matched pauses are anchors; words between two anchors share the speech between
+  them by length, so drift never carries past a pause
+
+A segment aligns in milliseconds (numpy only, no model), against seconds for a
+Whisper pass. Output has the extract_word_timestamps shape: [{'word', 'start', 'end'}].
+
+Usage:
+    words = forced_align.align_segments(texts, [f"{audio_folder}/{i}.mp3" for i in range(1, len(texts) + 1)])
+    timings = forced_align.sentence_timings(story_text, audio_file)   # [(start, end, sentence)]
+"""
+
+import re
+from typing import List, Optional
+
+import numpy as np
+
+from tts_script import decode_mono
+
+FRAME_SECONDS = 0.01
+MIN_PAUSE_SECONDS = 0.06
+POSITION_TOLERANCE = 0.6   # seconds of expected-vs-detected offset costing as much as one unmatched pause
+
+# pause allowance (in characters) and match bonus by the punctuation ending a word
+STRONG, MEDIUM, WEAK = 2, 1, 0
+PAUSE_CHARS = {STRONG: 6.0, MEDIUM: 3.0, WEAK: 0.0}
+PAUSE_BONUS = {STRONG: 1.5, MEDIUM: 1.0, WEAK: 0.2}
+
+_WORD_RE = re.compile(r"[^\s—–]+[—–]?|[—–]")
+
+
+def split_words(text: str) -> List[str]:
+    """Whitespace words; dashes end the word before them so the pause can land there."""
+    return [w for w in _WORD_RE.findall(text) if re.search(r"\w", w)]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()]
+
+
+def _weight(word: str) -> float:
+    letters = sum(c.isalpha() for c in word)
+    digits = sum(c.isdigit() for c in word)
+    return max(2.0, letters + 3.0 * digits)  # numbers are read out as several words
+
+
+def _strength(word: str) -> int:
+    tail = word.rstrip("\"'”’)]»")
+    if tail.endswith((".", "!", "?", "…")):
+        return STRONG
+    if tail.endswith((",", ";", ":", "—", "–")) or tail != word:
+        return MEDIUM
+    return WEAK
+
+
+def energy_pauses(samples: np.ndarray, rate: int) -> tuple:
+    """(speech_start, speech_end, [(pause_start, pause_end), ...]) from the frame energy envelope."""
+    frame = max(1, int(rate * FRAME_SECONDS))
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return 0.0, 0.0, []
+    rms = np.sqrt(np.mean(samples[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1))
+    rms = np.convolve(rms, np.ones(3) / 3, mode="same")  # smooth over 30 ms
+    threshold = max(np.percentile(rms, 10) * 2, rms.max() * 0.02)
+    voiced = np.flatnonzero(rms >= threshold)
+    if len(voiced) == 0:
+        return 0.0, n_frames * FRAME_SECONDS, []
+    first, last = voiced[0], voiced[-1] + 1
+
+    # quiet runs strictly inside the speech
+    silent = np.concatenate(([False], rms[first:last] < threshold, [False]))
+    edges = np.flatnonzero(np.diff(silent.astype(np.int8)))
+    pauses = [((first + a) * FRAME_SECONDS, (first + b) * FRAME_SECONDS)
+              for a, b in zip(edges[::2], edges[1::2]) if (b - a) * FRAME_SECONDS >= MIN_PAUSE_SECONDS]
+    return first * FRAME_SECONDS, last * FRAME_SECONDS, pauses
+
+
+def _match_gaps(expected: np.ndarray, strengths: List[int], pauses: List[tuple]) -> dict:
+    """DTW between word gaps and detected pauses; returns {gap index: pause index}."""
+    n, m = len(expected), len(pauses)
+    centers = np.array([(a + b) / 2 for a, b in pauses])
+    lengths = np.array([b - a for a, b in pauses])
+    skip_pause = np.minimum(lengths / 0.15, 4.0)  # a long pause inside a word is implausible
+    bonus = np.array([PAUSE_BONUS[s] for s in strengths])
+
+    cost = np.full((n + 1, m + 1), np.inf)
+    move = np.zeros((n + 1, m + 1), dtype=np.int8)  # 0 match, 1 skip gap, 2 skip pause
+    cost[0, 0] = 0.0
+    cost[0, 1:] = np.cumsum(skip_pause)
+    move[0, 1:] = 2
+    cost[1:, 0] = 0.0
+    move[1:, 0] = 1
+    for k in range(1, n + 1):
+        match = cost[k - 1, :-1] + np.abs(expected[k - 1] - centers) / POSITION_TOLERANCE - bonus[k - 1]
+        skip_gap = cost[k - 1, 1:]
+        row = np.minimum(match, skip_gap)
+        row_move = np.where(match <= skip_gap, 0, 1)
+        # skipping pauses runs along the row, so it is resolved left to right
+        for j in range(1, m + 1):
+            best, how = row[j - 1], row_move[j - 1]
+            via_skip = cost[k, j - 1] + skip_pause[j - 1]
+            if via_skip < best:
+                best, how = via_skip, 2
+            cost[k, j], move[k, j] = best, how
+
+    matches = {}
+    k, j = n, m
+    while k > 0 or j > 0:
+        how = move[k, j]
+        if how == 0:
+            matches[k - 1] = j - 1
+            k, j = k - 1, j - 1
+        elif how == 1:
+            k -= 1
+        else:
+            j -= 1
+    return matches
+
+
+def align_words(text: str, samples: np.ndarray, rate: int) -> List[dict]:
+    """Word timings of `text` within one piece of audio."""
+    words = split_words(text)
+    if not words:
+        return []
+    duration = len(samples) / rate
+    start, end, pauses = energy_pauses(samples, rate)
+    if end <= start:
+        start, end, pauses = 0.0, duration, []
+
+    weights = np.array([_weight(w) for w in words])
+    strengths = [_strength(w) for w in words[:-1]]
+    # expected time of each gap: speaking time shared by length plus punctuation pauses
+    extra = np.array([PAUSE_CHARS[s] for s in strengths] + [0.0])
+    span = np.cumsum(weights + extra)
+    expected = start + (end - start) * (span[:-1] - extra[:-1] / 2) / span[-1]
+    matches = _match_gaps(expected, strengths, pauses) if pauses else {}
+
+    # anchored groups: words between two matched pauses share the speech between them
+    timings = [None] * len(words)
+    group_start, prev_k = start, -1
+    for k in sorted(matches) + [len(words) - 1]:
+        if k in matches:
+            pause_start, pause_end = pauses[matches[k]]
+            group_end, next_start = pause_start, pause_end
+        else:
+            group_end, next_start = end, end
+        group = range(prev_k + 1, k + 1)
+        w = weights[prev_k + 1:k + 1]
+        edges = group_start + (group_end - group_start) * np.concatenate(([0.0], np.cumsum(w) / w.sum()))
+        for i, a, b in zip(group, edges[:-1], edges[1:]):
+            timings[i] = {"word": words[i], "start": round(float(a), 3), "end": round(float(b), 3)}
+        group_start, prev_k = next_start, k
+    return timings
+
+
+def align_file(text: str, audio_path) -> List[dict]:
+    samples, rate = decode_mono(audio_path)
+    return align_words(text, samples, rate)
+
+
+def align_segments(texts: List[str], audio_paths: List[str]) -> List[dict]:
+    """Word timings on the timeline of the concatenated segment audio (create_video's order)."""
+    words, offset = [], 0.0
+    for text, path in zip(texts, audio_paths):
+        samples, rate = decode_mono(path)
+        for w in align_words(text, samples, rate):
+            words.append({"word": w["word"], "start": w["start"] + offset, "end": w["end"] + offset})
+        offset += len(samples) / rate
+    return words
+
+
+def sentence_timings(text: str, audio_path, words: Optional[List[dict]] = None) -> List[tuple]:
+    """[(start, end, sentence)]: each sentence shown from its first word until the next sentence starts."""
+    words = words if words is not None else align_file(text, audio_path)
+    timings, i = [], 0
+    for sentence in split_sentences(text):
+        n = len(split_words(sentence))
+        if n == 0 or i >= len(words):
+            continue
+        timings.append([words[i]["start"], words[min(i + n, len(words)) - 1]["end"], sentence])
+        i += n
+    for current, following in zip(timings, timings[1:]):
+        current[1] = following[0]
+    return [tuple(t) for t in timings]
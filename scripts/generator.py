@@ -1,10 +1,13 @@
-import os, random, re
+import os, random
 from pathlib import Path
 from moviepy.editor import (
     VideoFileClip, concatenate_videoclips, AudioFileClip,
     CompositeAudioClip, CompositeVideoClip, TextClip
 )
 from gtts import gTTS
+import clip_library
+import tts_cache
+import forced_align
 
 # -------------------------------
 # Config
@@ -34,7 +37,8 @@ if not audio_file.exists():
         "Now, I understand—karma may take its time, but it always returns. Betrayal hurt, but compassion healed. "
         "In the end, it’s not what was taken from me that defines my story, but what I chose to give."
     )
-    gTTS(story_text, lang="en", slow=False).save(str(audio_file))
+    tts_cache.cached_synthesis("gtts", "en", None, story_text, {"slow": False}, audio_file,
+                               lambda path: gTTS(story_text, lang="en", slow=False).save(path))
 # else:
 #     # If audio exists, reload story_text for subtitle generation
 #     with open(audio_file.with_suffix('.txt'), 'r', encoding='utf-8') as f:
@@ -46,7 +50,7 @@ audio_duration = narration.duration
 # -------------------------------
 # Step 2: Select and resize clips
 # -------------------------------
-all_videos = [VideoFileClip(str(p)) for p in clips_folder.glob("*.mp4")]
+all_videos = list(clips_folder.glob("*.mp4"))
 if not all_videos:
     raise Exception("No video files found!")
 
@@ -56,11 +60,17 @@ selected = random.sample(all_videos, min(num_clips, len(all_videos)))
 target_each = audio_duration / len(selected)
 
 processed = []
-for clip in selected:
-    clip = clip.resize(height=vertical_resolution[1]).crop(
-        x_center=clip.w // 2, width=vertical_resolution[0],
-        y_center=clip.h // 2, height=vertical_resolution[1]
-    ).fadein(fade_duration).fadeout(fade_duration)
+for path in selected:
+    # Pre-transcoded 1080x1920 mezzanine (mezzanine_worker) needs no resize/crop
+    mezzanine = clip_library.mezzanine_for(path, size=vertical_resolution)
+    if mezzanine:
+        clip = VideoFileClip(mezzanine).fadein(fade_duration).fadeout(fade_duration)
+    else:
+        clip = VideoFileClip(str(path))
+        clip = clip.resize(height=vertical_resolution[1]).crop(
+            x_center=clip.w // 2, width=vertical_resolution[0],
+            y_center=clip.h // 2, height=vertical_resolution[1]
+        ).fadein(fade_duration).fadeout(fade_duration)
 
     if clip.duration > target_each:
         clip = clip.subclip(0, target_each)
@@ -79,19 +89,8 @@ video = video.set_duration(audio_duration).set_audio(narration)
 # -------------------------------
 # Step 4: Generate subtitles WITHOUT Whisper
 # -------------------------------
-def split_sentences(text):
-    # Split on sentence-ending punctuation followed by a space or end of string
-    return [s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()]
-
-sentences = split_sentences(story_text)
-n_sentences = len(sentences)
-sentence_duration = audio_duration / n_sentences
-
-subtitle_timings = []
-for i, sentence in enumerate(sentences):
-    start = i * sentence_duration
-    end = (i + 1) * sentence_duration
-    subtitle_timings.append((start, end, sentence))
+# The text is known: align it to the narration instead of spacing sentences evenly
+subtitle_timings = forced_align.sentence_timings(story_text, audio_file)
 
 # -------------------------------
 # Step 5: Karaoke-style text overlay (no Whisper)
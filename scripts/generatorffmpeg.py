@@ -1,10 +1,13 @@
 import os
 import random
-import re
 from pathlib import Path
 from gtts import gTTS
 import ffmpeg
 import subprocess
+import probe_cache
+import clip_library
+import tts_cache
+import forced_align
 
 # -------------------------------
 # Config
@@ -36,7 +39,8 @@ story_text = (
     "Now, I understand—karma may take its time, but it always returns. Betrayal hurt, but compassion healed. "
     "In the end, it’s not what was taken from me that defines my story, but what I chose to give."
 )
-gTTS(story_text, lang="en", slow=False).save(str(audio_file))
+tts_cache.cached_synthesis("gtts", "en", None, story_text, {"slow": False}, audio_file,
+                           lambda path: gTTS(story_text, lang="en", slow=False).save(path))
 with open(story_file, "w", encoding="utf-8") as f:
     f.write(story_text)
 # else:
@@ -57,9 +61,11 @@ audio_duration = get_audio_duration(audio_file)
 # Step 2: Select and resize/crop clips
 # -------------------------------
 # all_videos = list(clips_folder.glob("*.mp4"))
-all_videos = [p for p in clips_folder.glob("*.mp4")
-              if ffmpeg.probe(str(p))['streams'][0]['width'] >= vertical_resolution[0]
-              and ffmpeg.probe(str(p))['streams'][0]['height'] >= vertical_resolution[1]]
+# Cached probe metadata: only new/changed files are probed (in parallel), the rest is a single stat()
+clip_meta = probe_cache.refresh(clips_folder)
+all_videos = [Path(p) for p, m in clip_meta.items()
+              if (m['width'] or 0) >= vertical_resolution[0]
+              and (m['height'] or 0) >= vertical_resolution[1]]
 
 if not all_videos:
     raise Exception("No video files found!")
@@ -71,12 +77,8 @@ target_each = audio_duration / len(selected)
 # -------------------------------
 # Step 3: Generate SRT subtitles
 # -------------------------------
-def split_sentences(text):
-    return [s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()]
-
-sentences = split_sentences(story_text)
-n_sentences = len(sentences)
-sentence_duration = audio_duration / n_sentences
+# Sentence times come from aligning the known text to the narration (even spacing drifted)
+subtitle_timings = forced_align.sentence_timings(story_text, audio_file)
 
 def seconds_to_srt_time(seconds):
     h = int(seconds // 3600)
@@ -86,9 +88,7 @@ def seconds_to_srt_time(seconds):
     return f"{h:02}:{m:02}:{s:02},{ms:03}"
 
 with open(srt_file, "w", encoding="utf-8") as f:
-    for i, sentence in enumerate(sentences):
-        start = i * sentence_duration
-        end = (i + 1) * sentence_duration
+    for i, (start, end, sentence) in enumerate(subtitle_timings):
         f.write(f"{i+1}\n{seconds_to_srt_time(start)} --> {seconds_to_srt_time(end)}\n{sentence}\n\n")
 
 # -------------------------------
@@ -97,12 +97,19 @@ with open(srt_file, "w", encoding="utf-8") as f:
 # Build input streams and process each clip
 processed_clips = []
 for clip in selected:
-    # Build filter chain for each clip
+    # Build filter chain for each clip; mezzanines are already 1080x1920 so scale/crop is skipped
+    mezzanine = clip_library.mezzanine_for(clip, size=vertical_resolution)
+    if mezzanine:
+        stream = ffmpeg.input(mezzanine).video
+    else:
+        stream = (
+            ffmpeg
+            .input(str(clip))
+            .filter('scale', -2, vertical_resolution[1])
+            .filter('crop', vertical_resolution[0], vertical_resolution[1])
+        )
     processed = (
-        ffmpeg
-        .input(str(clip))
-        .filter('scale', -2, vertical_resolution[1])
-        .filter('crop', vertical_resolution[0], vertical_resolution[1])
+        stream
         .filter('fade', type='in', start_time=0, duration=fade_duration)
         .filter('fade', type='out', start_time=target_each-fade_duration, duration=fade_duration)
         .trim(start=0, end=target_each)
@@ -0,0 +1,131 @@
+"""
+http_client.py
+
+Shared, pooled HTTP client for every outbound API call in the pipeline
+(Pexels, Pixabay, ElevenLabs, Gemini, Ollama, Chatterbox).
+
+- One requests.Session per process with keep-alive connection pools per host
+- Default (connect, read) timeouts so a hung call can't stall a worker forever
+- Retries on 429/5xx and connection errors with jittered exponential backoff
+  (same schedule as the old main.safe_get, plus jitter and Retry-After support)
+- Streaming bodies via stream=True, passed straight through to requests
+- Calls to provider APIs (Pexels, Pixabay, ElevenLabs, Gemini) take a token from the
+  cross-process rate_limiter first; a 429 drains that provider's shared bucket
+
+Usage:
+    import http_client
+    r = http_client.get(url, headers=..., params=...)
+    r = http_client.post(url, json=payload, timeout=http_client.LONG_TIMEOUT)
+"""
+
+import os
+import random
+import threading
+import time
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import rate_limiter
+
+# (connect, read) seconds
+DEFAULT_TIMEOUT = (float(os.getenv("HTTP_CONNECT_TIMEOUT", "10")), float(os.getenv("HTTP_READ_TIMEOUT", "60")))
+# LLM generation / long TTS renders can legitimately take minutes before the first byte
+LONG_TIMEOUT = (DEFAULT_TIMEOUT[0], float(os.getenv("HTTP_LONG_READ_TIMEOUT", "600")))
+
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "5"))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_BACKOFF_SECONDS = 60.0
+
+POOL_HOSTS = 16        # number of per-host pools kept alive
+POOL_MAXSIZE = 32      # keep-alive connections per host (>= FETCH_CONCURRENCY)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                # retries are handled in request() so they get jitter + logging
+                adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                _session = s
+    return _session
+
+
+def backoff_delay(attempt: int, retry_after=None) -> float:
+    """Backoff used by safe_get ((2**attempt) + 0.5*attempt) with +/-50% jitter, or Retry-After if given."""
+    seconds = rate_limiter.retry_after_seconds(retry_after)
+    if seconds is not None:
+        return min(seconds, MAX_BACKOFF_SECONDS)
+    base = (2 ** attempt) + (0.5 * attempt)
+    return min(base * random.uniform(0.5, 1.5), MAX_BACKOFF_SECONDS)
+
+
+def request(method: str, url: str, *, timeout=DEFAULT_TIMEOUT, max_retries=MAX_RETRIES,
+            retry_statuses=RETRY_STATUSES, provider=None, **kwargs) -> requests.Response:
+    """
+    Send a request through the shared session.
+
+    Retries on `retry_statuses` and on connection errors/timeouts. When retries are
+    exhausted the last response is returned (callers keep checking status_code as
+    before); the last connection error is re-raised if no response was ever received.
+    Pass max_retries=1 when uploading open file objects, which can't be replayed.
+
+    `provider` names the rate-limit bucket; by default it's derived from the host
+    (rate_limiter.HOST_PROVIDERS), and provider=False skips rate limiting.
+    """
+    session = get_session()
+    if provider is None:
+        provider = rate_limiter.provider_for_url(url)
+    attempts = max(1, max_retries)
+    for attempt in range(attempts):
+        last_attempt = attempt == attempts - 1
+        if provider:
+            waited = rate_limiter.acquire(provider)
+            if waited > 1:
+                logging.info(f"Waited {waited:.1f}s for a {provider} rate-limit token")
+        try:
+            r = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if last_attempt:
+                raise
+            backoff = backoff_delay(attempt)
+            logging.warning(f"{method} {url} failed ({e.__class__.__name__}). Retrying in {backoff:.1f}s...")
+            time.sleep(backoff)
+            continue
+
+        if r.status_code == 429 and provider:
+            rate_limiter.penalize(provider, r.headers.get("Retry-After"))
+            if not last_attempt:
+                # the next acquire() waits for the drained shared bucket to refill
+                logging.warning(f"Rate limited (429) by {provider}. Waiting on the shared token bucket...")
+                r.close()
+                continue
+        if r.status_code in retry_statuses and not last_attempt:
+            backoff = backoff_delay(attempt, r.headers.get("Retry-After"))
+            logging.warning(f"Rate limited or server error {r.status_code} from {url}. Backing off {backoff:.1f}s...")
+            r.close()
+            time.sleep(backoff)
+            continue
+        return r
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def head(url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("allow_redirects", True)
+    return request("HEAD", url, **kwargs)
@@ -0,0 +1,135 @@
+"""
+llm_cache.py
+
+Prompt-keyed cache for Ollama script generations.
+
+- Responses are keyed on (model, prompt hash, format schema, options), so rerunning
+  the same topic/goal/model returns the stored script instantly instead of calling
+  Ollama again. Entries expire after LLM_CACHE_TTL seconds and the least recently
+  used ones are evicted past LLM_CACHE_MAX_ENTRIES.
+- Prompts put the long, topic-independent instructions first and the topic last.
+  keep_alive keeps the model loaded between jobs, so Ollama's prompt (KV) cache
+  already holds the shared prefix and only the topic-specific tail is evaluated.
+
+Usage:
+    key = llm_cache.make_key(model, full_prompt, format_schema, options)
+    text = llm_cache.get(key)
+    if text is None:
+        ...  # call Ollama with "keep_alive": llm_cache.KEEP_ALIVE
+        llm_cache.put(key, model, response_text)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", "/Videos/llm_cache.sqlite3"))
+TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # how long Ollama keeps the model loaded after a call
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_responses (
+    key         TEXT PRIMARY KEY,
+    model       TEXT NOT NULL,
+    response    TEXT NOT NULL,
+    eval_count  INTEGER,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_responses_accessed ON llm_responses(accessed_at);
+"""
+
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str, n: int = 1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def stats() -> dict:
+    """Hit/miss counters for this process, plus the hit rate."""
+    with _stats_lock:
+        out = dict(_stats)
+    lookups = out["hits"] + out["misses"]
+    out["hit_rate"] = out["hits"] / lookups if lookups else 0.0
+    return out
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_key(model: str, prompt: str, format_schema=None, options=None) -> str:
+    """Cache key for one generation; unset options don't change the key."""
+    options = {k: v for k, v in (options or {}).items() if v is not None}
+    parts = [model, _hash(prompt), json.dumps(format_schema, sort_keys=True), json.dumps(options, sort_keys=True)]
+    return _hash("\n".join(parts))
+
+
+def _connect() -> sqlite3.Connection:
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(CACHE_PATH), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def get(key: str) -> Optional[str]:
+    """Return the cached response text, or None on miss/expiry."""
+    now = time.time()
+    try:
+        conn = _connect()
+    except sqlite3.Error as e:
+        logging.warning(f"LLM cache unavailable: {e}")
+        _count("misses")
+        return None
+    try:
+        row = conn.execute("SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > TTL_SECONDS:
+            if row is not None:
+                with conn:
+                    conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            _count("misses")
+            return None
+        with conn:
+            conn.execute("UPDATE llm_responses SET accessed_at = ? WHERE key = ?", (now, key))
+        _count("hits")
+        return row[0]
+    finally:
+        conn.close()
+
+
+def put(key: str, model: str, response: str, eval_count: Optional[int] = None):
+    """Store a response that parsed successfully and evict least recently used entries past MAX_ENTRIES."""
+    now = time.time()
+    try:
+        conn = _connect()
+    except sqlite3.Error as e:
+        logging.warning(f"LLM cache unavailable: {e}")
+        return
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, model, response, eval_count, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, eval_count, now, now),
+            )
+            overflow = conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0] - MAX_ENTRIES
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM llm_responses WHERE key IN "
+                    "(SELECT key FROM llm_responses ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+                _count("evictions", overflow)
+    finally:
+        conn.close()
@@ -0,0 +1,106 @@
+"""
+llm_stream.py
+
+Streaming Ollama generation with an incremental JSON array parser.
+
+The script prompt asks llama3.1 for a JSON array of
+{"image_description", "text"} objects. With "stream": true Ollama sends NDJSON
+chunks of the response text as they are generated; ArrayItemParser picks each
+top-level array element out of that text the moment its closing brace arrives,
+so segment 1 can be fetched and voiced while segment 8 is still being written.
+
+Usage:
+    stream = OllamaStream(OLLAMA_URL, payload)
+    for item in stream.items():
+        ...                       # dict per array element, in order
+    stream.final                  # last NDJSON message (eval_count, prompt_eval_count, ...)
+"""
+
+import json
+from typing import Iterator, List, Optional
+
+import http_client
+
+
+class ArrayItemParser:
+    """Feed text fragments of a JSON array; complete top-level elements come back as soon as they close."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0           # next char of buffer to scan
+        self.depth = 0         # bracket/brace depth, the outer array is depth 1
+        self.in_string = False
+        self.escape = False
+        self.item_start = None
+
+    def feed(self, text: str) -> List:
+        self.buffer += text
+        items = []
+        buf = self.buffer
+        i = self.pos
+        while i < len(buf):
+            ch = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "[{":
+                if self.depth == 1 and self.item_start is None:
+                    self.item_start = i
+                self.depth += 1
+            elif ch in "]}":
+                self.depth -= 1
+                if self.depth == 1 and self.item_start is not None:
+                    items.append(json.loads(buf[self.item_start:i + 1]))
+                    self.item_start = None
+            i += 1
+        self.pos = i
+        # drop consumed text so memory doesn't grow with the response
+        if self.item_start is None and self.depth <= 1 and not self.in_string:
+            self.buffer = ""
+            self.pos = 0
+        elif self.item_start:
+            self.buffer = self.buffer[self.item_start:]
+            self.pos -= self.item_start
+            self.item_start = 0
+        return items
+
+
+class OllamaStream:
+    """Iterate an Ollama /api/generate call with stream=True."""
+
+    def __init__(self, url: str, payload: dict, timeout=http_client.LONG_TIMEOUT):
+        self.url = url
+        self.payload = dict(payload, stream=True)
+        self.timeout = timeout
+        self.text = ""                 # full response text, for fallback parsing / logging
+        self.final: Optional[dict] = None
+
+    def fragments(self) -> Iterator[str]:
+        with http_client.post(self.url, json=self.payload, stream=True, timeout=self.timeout) as r:
+            if r.status_code != 200:
+                raise Exception(f"Ollama error {r.status_code}: {r.text[:300]}")
+            for line in r.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                msg = json.loads(line)
+                if msg.get("error"):
+                    raise Exception(f"Ollama error: {msg['error']}")
+                fragment = msg.get("response", "")
+                if fragment:
+                    self.text += fragment
+                    yield fragment
+                if msg.get("done"):
+                    self.final = msg
+                    break
+
+    def items(self) -> Iterator[dict]:
+        parser = ArrayItemParser()
+        for fragment in self.fragments():
+            for item in parser.feed(fragment):
+                yield item
@@ -5,8 +5,15 @@ Requirements:
   ffmpeg must be installed on system (moviepy uses it).
 """
 
-import os, time, csv, math, sys
+import os, time, math, sys
 import requests
+import http_client
+import clip_library
+import mezzanine_worker
+import search_cache
+import downloader
+import perceptual_index
+import renditions
 from pathlib import Path
 from moviepy import VideoFileClip
 from dotenv import load_dotenv
@@ -18,52 +25,41 @@ PEXELS_API_KEY = "d3O5RKoi56lDxKv3QPDQHE0hqX5XRnwLOVVa6iY4EFQjam5VE8WAPyF1"; #os
 PIXABAY_API_KEY = os.getenv("PIXABAY_API_KEY")
 OUT_DIR = Path("/Videos")
 OUT_DIR.mkdir(exist_ok=True)
-META_CSV = OUT_DIR / "metadata.csv"
 
 HEADERS = {"Authorization": PEXELS_API_KEY} if PEXELS_API_KEY else {}
 
 # ---------- helpers ----------
-def save_metadata_row(row):
-    is_new = not META_CSV.exists()
-    with open(META_CSV, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if is_new:
-            writer.writerow(["source", "id", "url", "local_path", "width", "height", "duration", "license", "tags", "downloaded_at"])
-        writer.writerow(row)
-
 def safe_get(url, headers=None, params=None, max_retries=5):
-    for attempt in range(max_retries):
-        r = requests.get(url, headers=headers, params=params, stream=True, timeout=30)
-        if r.status_code == 200:
-            return r
-        if r.status_code in (429, 503, 502, 500):
-            backoff = (2 ** attempt) + (0.5 * attempt)
-            print(f"Rate limited or server error {r.status_code}. Backing off {backoff}s...")
-            time.sleep(backoff)
-            continue
-        else:
-            print("Request failed:", r.status_code, r.text[:200])
-            return None
+    # pooled connection + jittered backoff on 429/5xx live in http_client
+    try:
+        r = http_client.get(url, headers=headers, params=params, stream=True, max_retries=max_retries)
+    except requests.RequestException as e:
+        print("Request failed:", e)
+        return None
+    if r.status_code == 200:
+        return r
+    print("Request failed:", r.status_code, r.text[:200])
     return None
 
 # ---------- Pexels ----------
 def search_pexels_videos(query, per_page=15, page=1):
     url = "https://api.pexels.com/videos/search"
     params = {"query": query, "per_page": per_page, "page": page}
-    r = safe_get(url, headers=HEADERS, params=params)
-    if not r: return []
-    data = r.json()
+    data = search_cache.get(url, params)
+    if data is None:
+        r = safe_get(url, headers=HEADERS, params=params)
+        if not r: return []
+        data = r.json()
+        search_cache.put(url, params, data)
     return data.get("videos", [])
 
 def download_url_to_file(url, out_path):
-    r = safe_get(url)
-    if not r: return False
-    total = int(r.headers.get('content-length', 0))
-    with open(out_path, "wb") as f:
-        for chunk in r.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
-    return True
+    # resumable + hashed while streaming; returns {"path", "sha1", "size"} or None
+    try:
+        return downloader.download_file(url, out_path)
+    except downloader.DownloadError as e:
+        print("Download failed:", e)
+        return None
 
 # ---------- Pixabay ----------
 def search_pixabay_videos(query, per_page=20, page=1):
@@ -76,55 +72,67 @@ def search_pixabay_videos(query, per_page=20, page=1):
 
 # ---------- Processing ----------
 def crop_to_9_16(input_path, output_path, target_w=1080, target_h=1920):
+    # scale to cover + center crop in one ffmpeg pass (same path the mezzanine worker uses)
     try:
-        clip = VideoFileClip(str(input_path))
-        w, h = clip.size
-        # scale to target width then center crop
-        scale = target_w / float(w)
-        new_h = int(h * scale)
-        clip_resized = clip.resize(width=target_w)
-        # if new_h < target_h -> scale by height instead
-        if new_h < target_h:
-            scale = target_h / float(h)
-            clip_resized = clip.resize(height=target_h)
-        # now crop center
-        clip_cropped = clip_resized.fx(lambda c: c.crop(x_center=c.w/2, y_center=c.h/2, width=target_w, height=target_h))
-        clip_cropped.write_videofile(str(output_path), codec="libx264", audio_codec="aac", threads=2, verbose=False, logger=None)
-        clip.close()
-        clip_resized.close()
-        clip_cropped.close()
-        return True
+        return mezzanine_worker.normalize_file(input_path, output_path, target_w=target_w, target_h=target_h)
     except Exception as e:
         print("Crop failed:", e)
         return False
 
-def process_topic(topic, max_download=5):
+def process_topic(topic, max_download=5, budget=None):
     print(f"Searching for topic: {topic}")
     downloaded = 0
+    budget = budget or renditions.BandwidthBudget.from_env()
 
     # Pexels
     videos = search_pexels_videos(topic, per_page=15)
     for v in videos:
         if downloaded >= max_download: break
         vid_id = v.get("id")
-        # choose a video file (prefer 720/1080)
         files = v.get("video_files", [])
         if not files: continue
-        file_choice = sorted(files, key=lambda x: x.get("height", 0), reverse=True)[0]
-        video_url = file_choice.get("link")
-        filename = OUT_DIR / f"pexels_{vid_id}_{file_choice.get('id')}.mp4"
-        if filename.exists(): 
-            print("Already downloaded:", filename)
+        known = clip_library.find_by_provider("pexels", vid_id)
+        if known:
+            print("Already downloaded:", known["path"])
             continue
+        # near-duplicate footage (same shot, other id/rendition) is skipped before reserving or downloading
+        dup, thumb_hash = perceptual_index.find_near_duplicate_thumbnail(v.get("image"))
+        if dup:
+            print("Near-duplicate of library clip", dup, "- skipping Pexels", vid_id)
+            clip_library.add_alias("pexels", vid_id, dup, url=v.get("url"), tags=[topic])
+            continue
+        # smallest mp4 that still covers 1080x1920 after the 9:16 crop, within the job's byte budget
+        file_choice = renditions.choose_rendition(files, budget=budget)
+        if not file_choice:
+            print("No rendition fits the remaining bandwidth budget for Pexels", vid_id)
+            continue
+        video_url = file_choice.get("link")
+        # a failed download leaves <filename>.part behind, which the next run resumes
+        filename = OUT_DIR / f".pexels_{vid_id}_{file_choice.get('id')}.mp4"
         print("Downloading Pexels clip:", video_url)
-        ok = download_url_to_file(video_url, filename)
-        if not ok: continue
-        # get metadata
-        width = file_choice.get("width")
-        height = file_choice.get("height")
-        duration = v.get("duration")
+        result = download_url_to_file(video_url, filename)
+        if not result:
+            budget.release_rendition(file_choice)
+            continue
+        dup, frame_hashes = perceptual_index.find_near_duplicate_clip(filename)
+        if dup:
+            print("Near-duplicate of library clip", dup, "- discarding", filename)
+            filename.unlink(missing_ok=True)
+            budget.release_rendition(file_choice)
+            clip_library.add_alias("pexels", vid_id, dup, file_id=file_choice.get("id"), url=v.get("url"), tags=[topic])
+            continue
         license_label = "Pexels"  # Pexels license: free for commercial use (verify current TOS)
-        save_metadata_row(["pexels", vid_id, v.get("url"), str(filename), width, height, duration, license_label, topic, time.time()])
+        clip = clip_library.add_clip(
+            filename, source="pexels", provider_id=vid_id, file_id=file_choice.get("id"), url=v.get("url"),
+            width=file_choice.get("width"), height=file_choice.get("height"), duration=v.get("duration"),
+            license=license_label, tags=[topic], sha1=result["sha1"],
+        )
+        if not clip["is_new"]:
+            print("Same footage already in library:", clip["path"])
+            budget.release_rendition(file_choice)
+            continue
+        perceptual_index.add_fingerprint(clip["sha1"], frame_hashes, thumb_hash)
+        mezzanine_worker.enqueue(clip)
         downloaded += 1
 
     # # Pixabay
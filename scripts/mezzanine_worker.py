@@ -0,0 +1,168 @@
+"""
+mezzanine_worker.py
+
+Background worker that pre-transcodes library clips into render-ready mezzanines.
+
+Every clip in the catalog is converted once into a canonical 1080x1920, fixed-fps,
+short-GOP H.264 file (scale to cover + center crop, no audio) under
+/Videos/mezzanine/ and recorded in the catalog. Renders then ask
+clip_library.mezzanine_for(path) and skip resize/crop/fps work entirely, falling
+back to the raw clip when no mezzanine exists yet.
+
+Clips added by the fetchers are queued right away with enqueue(); the watcher picks
+up anything else. enqueue() uses threads rather than the watcher's process pool:
+each job only starts an ffmpeg subprocess and waits for it, so the encode runs in its
+own process anyway and the fetching script doesn't pay for forking its interpreter.
+
+Renders without a mezzanine use cover_crop() so the raw clip gets the same
+scale-to-cover + center-crop geometry as the mezzanine.
+
+Run next to the pipeline:
+    python mezzanine_worker.py --watch        # poll the catalog for new clips
+    python mezzanine_worker.py                # convert the current backlog once
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Optional
+
+import clip_library
+
+MEZZANINE_DIR = clip_library.ROOT / "mezzanine"
+TARGET_RES = (1080, 1920)
+MEZZANINE_FPS = int(os.getenv("MEZZANINE_FPS", "30"))
+MEZZANINE_GOP = MEZZANINE_FPS  # one keyframe per second: cheap seeks and trims
+WORKERS = int(os.getenv("MEZZANINE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+POLL_SECONDS = 30
+ENQUEUE_ON_ADD = os.getenv("MEZZANINE_ON_ADD", "1") == "1"  # transcode new clips from the fetching process
+
+_failed = set()  # sha1s that failed in this process; not retried until restart
+_queued = set()
+_queue_lock = threading.Lock()
+_queue_pool = None
+
+
+def cover_crop(src_w: int, src_h: int, target_w: int = TARGET_RES[0], target_h: int = TARGET_RES[1]) -> tuple:
+    """
+    (scaled_w, scaled_h, x1, y1): scale so the source covers target_w x target_h, then the
+    top-left of the centered crop. Same geometry as normalize_file's ffmpeg filter.
+    """
+    scale = max(target_w / src_w, target_h / src_h)
+    scaled_w = max(target_w, int(round(src_w * scale)))
+    scaled_h = max(target_h, int(round(src_h * scale)))
+    return scaled_w, scaled_h, (scaled_w - target_w) // 2, (scaled_h - target_h) // 2
+
+
+def normalize_file(input_path, output_path, target_w=TARGET_RES[0], target_h=TARGET_RES[1],
+                   fps=MEZZANINE_FPS, gop=MEZZANINE_GOP) -> bool:
+    """Scale to cover target_w x target_h, center crop, resample to `fps`, encode with a fixed short GOP."""
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    # unique per writer: the watcher and an enqueue() in a fetching process may race on the same clip
+    tmp_path = output_path.with_name(f"{output_path.stem}.{os.getpid()}.{threading.get_ident()}.tmp{output_path.suffix}")
+    vf = (f"scale={target_w}:{target_h}:force_original_aspect_ratio=increase,"
+          f"crop={target_w}:{target_h},fps={fps},setsar=1")
+    cmd = [
+        "ffmpeg", "-y", "-v", "error", "-i", str(input_path), "-an", "-vf", vf,
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p",
+        "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+        "-threads", "2", "-movflags", "+faststart", str(tmp_path),
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        logging.warning(f"Normalize failed for {input_path}: {result.stderr.strip()[:300]}")
+        Path(tmp_path).unlink(missing_ok=True)
+        return False
+    os.replace(tmp_path, output_path)
+    return True
+
+
+def _convert(sha1: str, src: str) -> tuple:
+    out = MEZZANINE_DIR / f"{sha1}.mp4"
+    return sha1, out, normalize_file(src, out)
+
+
+def _mark_failed(sha1: str):
+    with _queue_lock:
+        _failed.add(sha1)
+
+
+def enqueue(clip: dict) -> Optional[Future]:
+    """Transcode a clip just added to the library in the background, unless it already has a mezzanine."""
+    global _queue_pool
+    if not ENQUEUE_ON_ADD or clip_library.mezzanine_for(clip["path"], size=TARGET_RES):
+        return None
+    sha1 = clip["sha1"]
+    with _queue_lock:
+        if sha1 in _queued or sha1 in _failed:
+            return None
+        _queued.add(sha1)
+        if _queue_pool is None:
+            _queue_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="mezzanine")
+
+    def job():
+        _, out, ok = _convert(sha1, clip["path"])
+        if ok:
+            clip_library.record_mezzanine(sha1, out, TARGET_RES[0], TARGET_RES[1], MEZZANINE_FPS, MEZZANINE_GOP)
+            logging.info(f"Mezzanine ready: {out}")
+        else:
+            _mark_failed(sha1)
+
+    return _queue_pool.submit(job)
+
+
+def run_once(workers: int = WORKERS, limit: int = 100) -> int:
+    """Convert clips that don't have a mezzanine yet. Returns how many were converted."""
+    with _queue_lock:
+        failed = set(_failed)
+    pending = [c for c in clip_library.clips_without_mezzanine(limit=limit + len(failed)) if c["sha1"] not in failed]
+    if not pending:
+        return 0
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_convert, c["sha1"], c["path"]): c["sha1"] for c in pending}
+        for future in as_completed(futures):
+            try:
+                sha1, out, ok = future.result()
+            except Exception as e:
+                logging.warning(f"Mezzanine job failed: {e}")
+                _mark_failed(futures[future])
+                continue
+            if not ok:
+                _mark_failed(sha1)
+            else:
+                clip_library.record_mezzanine(sha1, out, TARGET_RES[0], TARGET_RES[1], MEZZANINE_FPS, MEZZANINE_GOP)
+                done += 1
+                logging.info(f"Mezzanine ready: {out}")
+    return done
+
+
+def watch(workers: int = WORKERS, poll_seconds: float = POLL_SECONDS):
+    logging.info(f"Watching {clip_library.DB_PATH} for new clips ({workers} workers)...")
+    while True:
+        if run_once(workers) == 0:
+            time.sleep(poll_seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-transcode library clips into 1080x1920 mezzanines.")
+    parser.add_argument("--watch", action="store_true", help="Keep running and convert new clips as they arrive.")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.watch:
+        watch(args.workers)
+    else:
+        total = 0
+        while True:
+            n = run_once(args.workers)
+            total += n
+            if n == 0:
+                break
+        print(f"Converted {total} clips.")
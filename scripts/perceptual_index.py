@@ -0,0 +1,209 @@
+"""
+perceptual_index.py
+
+Perceptual near-duplicate index for the clip library.
+
+Pexels serves the same footage under different ids and renditions, so the sha1
+dedupe in clip_library misses re-encoded copies. Each library clip gets a
+fingerprint of 64-bit pHashes (a few downscaled keyframes plus the provider
+thumbnail), stored in the library catalog and kept in an in-memory BK-tree for
+sub-linear Hamming-distance lookups.
+
+- find_near_duplicate_thumbnail(url): cheap check before downloading
+- find_near_duplicate_clip(path): keyframe check right after downloading
+- add_fingerprint(sha1, hashes): register an accepted clip
+
+Dependencies: imagehash, pillow, opencv-python-headless (all in the Dockerfile).
+"""
+
+import io
+import logging
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import cv2
+import imagehash
+from PIL import Image
+
+import clip_library
+import http_client
+
+HAMMING_THRESHOLD = int(os.getenv("PHASH_THRESHOLD", "8"))  # of 64 bits
+KEYFRAMES = 4
+FRAME_WIDTH = 160  # frames are downscaled before hashing; pHash only looks at 32x32 anyway
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    id    INTEGER PRIMARY KEY AUTOINCREMENT,
+    sha1  TEXT NOT NULL REFERENCES clips(sha1) ON DELETE CASCADE,
+    kind  TEXT NOT NULL,
+    phash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_sha1 ON fingerprints(sha1);
+"""
+
+
+# ----------------------- BK-tree -----------------------
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes; each node keeps the items sharing that hash."""
+
+    def __init__(self):
+        self.root = None  # [hash, items, {distance: child}]
+        self.size = 0
+
+    def add(self, h: int, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [h, [item], {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [item], {}]
+                return
+            node = child
+
+    def search(self, h: int, max_distance: int) -> List[Tuple[int, object]]:
+        """All (distance, item) within max_distance of h."""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= max_distance:
+                found.extend((d, item) for item in node[1])
+            for dist, child in node[2].items():
+                if d - max_distance <= dist <= d + max_distance:
+                    stack.append(child)
+        return found
+
+
+_tree = BKTree()
+_loaded_id = 0
+_lock = threading.Lock()
+
+
+def _connect():
+    conn = clip_library.connect()
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _refresh():
+    """Pull fingerprints added since the last load (possibly by other processes) into the tree."""
+    global _loaded_id
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT id, sha1, phash FROM fingerprints WHERE id > ? ORDER BY id", (_loaded_id,)
+        ).fetchall()
+    finally:
+        conn.close()
+    for row in rows:
+        _tree.add(int(row["phash"], 16), row["sha1"])
+        _loaded_id = row["id"]
+
+
+# ----------------------- hashing -----------------------
+
+def hash_image(img: Image.Image) -> int:
+    return int(str(imagehash.phash(img)), 16)
+
+
+def hash_thumbnail_url(url: str) -> Optional[int]:
+    if not url:
+        return None
+    try:
+        r = http_client.get(url)
+        if r.status_code != 200:
+            return None
+        img = Image.open(io.BytesIO(r.content)).convert("RGB")
+        img.thumbnail((FRAME_WIDTH, FRAME_WIDTH * 4))
+        return hash_image(img)
+    except Exception as e:
+        logging.warning(f"Thumbnail hash failed for {url}: {e}")
+        return None
+
+
+def keyframe_hashes(video_path: Path, n: int = KEYFRAMES) -> List[int]:
+    """pHash of `n` evenly spaced, downscaled frames (skipping the very start/end, which are often fades)."""
+    cap = cv2.VideoCapture(str(video_path))
+    hashes = []
+    try:
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        if total <= 0:
+            return hashes
+        for i in range(n):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(total * (i + 1) / (n + 1)))
+            ok, frame = cap.read()
+            if not ok:
+                continue
+            h, w = frame.shape[:2]
+            frame = cv2.resize(frame, (FRAME_WIDTH, max(1, int(h * FRAME_WIDTH / w))), interpolation=cv2.INTER_AREA)
+            hashes.append(hash_image(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))))
+    finally:
+        cap.release()
+    return hashes
+
+
+# ----------------------- lookups -----------------------
+
+def find_near_duplicate(hashes: Iterable[int], threshold: int = HAMMING_THRESHOLD,
+                        min_matches: int = None) -> Optional[str]:
+    """
+    Return the sha1 of a library clip that matches at least `min_matches` of `hashes`
+    (default: half of them, rounded up) within `threshold` bits, else None.
+    """
+    hashes = [h for h in hashes if h is not None]
+    if not hashes:
+        return None
+    min_matches = min_matches or math.ceil(len(hashes) / 2)
+    with _lock:
+        _refresh()
+        votes: Dict[str, int] = {}
+        for h in hashes:
+            for sha1 in {item for _, item in _tree.search(h, threshold)}:
+                votes[sha1] = votes.get(sha1, 0) + 1
+    best = max(votes.items(), key=lambda kv: kv[1], default=(None, 0))
+    return best[0] if best[1] >= min_matches else None
+
+
+def find_near_duplicate_thumbnail(thumbnail_url: str) -> Tuple[Optional[str], Optional[int]]:
+    """Pre-download check using the provider thumbnail. Returns (duplicate sha1 or None, thumbnail hash)."""
+    h = hash_thumbnail_url(thumbnail_url)
+    return find_near_duplicate([h], min_matches=1), h
+
+
+def find_near_duplicate_clip(video_path: Path) -> Tuple[Optional[str], List[int]]:
+    """Post-download check on keyframes. Returns (duplicate sha1 or None, keyframe hashes)."""
+    hashes = keyframe_hashes(video_path)
+    return find_near_duplicate(hashes), hashes
+
+
+def add_fingerprint(sha1: str, frame_hashes: Iterable[int] = (), thumbnail_hash: int = None):
+    rows = [(sha1, "frame", f"{h:016x}") for h in frame_hashes if h is not None]
+    if thumbnail_hash is not None:
+        rows.append((sha1, "thumb", f"{thumbnail_hash:016x}"))
+    if not rows:
+        return
+    conn = _connect()
+    try:
+        with conn:
+            conn.executemany("INSERT INTO fingerprints (sha1, kind, phash) VALUES (?, ?, ?)", rows)
+    finally:
+        conn.close()
+    with _lock:
+        _refresh()
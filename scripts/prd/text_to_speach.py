@@ -1,5 +1,8 @@
-import requests
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # scripts/ for tts_cache / tts_stream
+import tts_cache
+import tts_stream
 from dotenv import load_dotenv
 
 def generate_and_save_audio(
@@ -13,7 +16,6 @@ def generate_and_save_audio(
     similarity_boost=0.80,
     output_format="mp3"
 ):
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
     headers = {
         "Accept": f"audio/{output_format}",
         "Content-Type": "application/json",
@@ -29,18 +31,20 @@ def generate_and_save_audio(
         }
     }
 
-    response = requests.post(url, json=data, headers=headers)
+    def synthesize(path):
+        tts_stream.elevenlabs_stream(text, path, voice_id, elevenlabs_apikey, model_id, data["voice_settings"],
+                                     accept=headers["Accept"])
 
-    if response.status_code != 200:
-        print("Error:", response.status_code, response.text)
+    os.makedirs(foldername, exist_ok=True)
+    file_path = os.path.join(foldername, f"{filename}.{output_format}")
+    try:
+        tts_cache.cached_synthesis("elevenlabs", voice_id, model_id, text, data["voice_settings"],
+                                   file_path, synthesize, fmt=output_format)
+    except Exception as e:
+        print("Error:", e)
         return False
-    else:
-        os.makedirs(foldername, exist_ok=True)
-        file_path = os.path.join(foldername, f"{filename}.{output_format}")
-        with open(file_path, 'wb') as f:
-            f.write(response.content)
-        print(f"Audio saved to {file_path}")
-        return True
+    print(f"Audio saved to {file_path}")
+    return True
 
 if __name__ == "__main__":
     import argparse
@@ -0,0 +1,194 @@
+"""
+probe_cache.py
+
+Persistent ffprobe metadata cache for the clip library.
+
+Rows are keyed by path and only trusted while (size, mtime) still match, so edited or
+replaced files are re-probed automatically. refresh() brings a whole folder up to
+date incrementally: unchanged files cost one stat(), new/changed ones are probed in
+a parallel pool, and rows for deleted files are dropped.
+
+Stored per file: width, height, duration, fps, codec and keyframe interval (seconds).
+
+Usage:
+    meta = probe_cache.refresh(Path("/Videos"))          # {path: {...}}
+    info = probe_cache.get(Path("/Videos/clip.mp4"))
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import statistics
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+DB_PATH = Path(os.getenv("PROBE_CACHE_DB", "/Videos/probe_cache.sqlite3"))
+PROBE_WORKERS = int(os.getenv("PROBE_WORKERS", str(min(8, (os.cpu_count() or 2) * 2))))
+KEYFRAME_SCAN_SECONDS = 15  # only the first seconds are scanned to estimate the GOP length
+
+FIELDS = ("width", "height", "duration", "fps", "codec", "keyframe_interval")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    path              TEXT PRIMARY KEY,
+    size              INTEGER NOT NULL,
+    mtime             REAL NOT NULL,
+    width             INTEGER,
+    height            INTEGER,
+    duration          REAL,
+    fps               REAL,
+    codec             TEXT,
+    keyframe_interval REAL,
+    probed_at         REAL NOT NULL
+);
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(DB_PATH), timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _parse_rate(rate: str) -> Optional[float]:
+    try:
+        num, _, den = (rate or "").partition("/")
+        return float(num) / float(den or 1) if float(den or 1) else None
+    except ValueError:
+        return None
+
+
+def _keyframe_interval(packets: list) -> Optional[float]:
+    """Median spacing of keyframes among the probed packets (packet flags only, no decoding)."""
+    times = []
+    for packet in packets:
+        if "K" in packet.get("flags", ""):
+            try:
+                times.append(float(packet["pts_time"]))
+            except (KeyError, ValueError):
+                continue
+    times.sort()
+    gaps = [b - a for a, b in zip(times, times[1:]) if b > a]
+    return statistics.median(gaps) if gaps else None
+
+
+def probe_file(path: Path) -> dict:
+    """
+    Run ffprobe on one file and return the cached fields (None where unknown). One call
+    reads the stream header and the packet flags of the first KEYFRAME_SCAN_SECONDS.
+    """
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0", "-read_intervals", f"%+{KEYFRAME_SCAN_SECONDS}",
+         "-show_entries",
+         "stream=width,height,codec_name,avg_frame_rate,r_frame_rate,duration:format=duration:packet=pts_time,flags",
+         "-of", "json", str(path)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed for {path}: {result.stderr.strip()[:200]}")
+    info = json.loads(result.stdout or "{}")
+    stream = (info.get("streams") or [{}])[0]
+    duration = stream.get("duration") or info.get("format", {}).get("duration")
+    return {
+        "width": stream.get("width"),
+        "height": stream.get("height"),
+        "duration": float(duration) if duration else None,
+        "fps": _parse_rate(stream.get("avg_frame_rate")) or _parse_rate(stream.get("r_frame_rate")),
+        "codec": stream.get("codec_name"),
+        "keyframe_interval": _keyframe_interval(info.get("packets") or []),
+    }
+
+
+def _store(conn: sqlite3.Connection, rows: Iterable[tuple]):
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO probes (path, size, mtime, width, height, duration, fps, codec, keyframe_interval, probed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+def _row(path: str, st: os.stat_result, meta: dict) -> tuple:
+    return (path, st.st_size, st.st_mtime) + tuple(meta.get(k) for k in FIELDS) + (time.time(),)
+
+
+def _probe_paths(paths: list, workers: int) -> Dict[str, dict]:
+    def one(p):
+        try:
+            return p, probe_file(Path(p))
+        except Exception as e:
+            logging.warning(f"Probe failed for {p}: {e}")
+            return p, None
+
+    if not paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(paths)))) as pool:
+        return {p: meta for p, meta in pool.map(one, paths) if meta is not None}
+
+
+def get_many(paths: Iterable[Path], workers: int = PROBE_WORKERS) -> Dict[str, dict]:
+    """Metadata for the given files, probing (in parallel) only those missing or changed."""
+    stats = {}
+    for p in paths:
+        try:
+            stats[str(p)] = os.stat(p)
+        except OSError:
+            continue
+    conn = _connect()
+    try:
+        cached = {}
+        for chunk_start in range(0, len(stats), 500):
+            keys = list(stats)[chunk_start:chunk_start + 500]
+            q = f"SELECT * FROM probes WHERE path IN ({','.join('?' * len(keys))})"
+            for row in conn.execute(q, keys):
+                st = stats[row["path"]]
+                if row["size"] == st.st_size and row["mtime"] == st.st_mtime:
+                    cached[row["path"]] = {k: row[k] for k in FIELDS}
+        stale = [p for p in stats if p not in cached]
+        fresh = _probe_paths(stale, workers)
+        if fresh:
+            _store(conn, [_row(p, stats[p], meta) for p, meta in fresh.items()])
+        cached.update(fresh)
+        return cached
+    finally:
+        conn.close()
+
+
+def get(path: Path) -> Optional[dict]:
+    return get_many([path]).get(str(path))
+
+
+def refresh(folder: Path, pattern: str = "*.mp4", workers: int = PROBE_WORKERS) -> Dict[str, dict]:
+    """Bring the cache up to date for every file in `folder` matching `pattern`; returns {path: meta}."""
+    folder = Path(folder)
+    paths = [p for p in folder.glob(pattern) if p.is_file()]
+    meta = get_many(paths, workers)
+    conn = _connect()
+    try:
+        present = {str(p) for p in paths}
+        prefix = str(folder).rstrip("/") + "/"
+        gone = [
+            (row["path"],) for row in conn.execute("SELECT path FROM probes WHERE path LIKE ?", (prefix + "%",))
+            if row["path"] not in present and not os.path.exists(row["path"])
+        ]
+        if gone:
+            with conn:
+                conn.executemany("DELETE FROM probes WHERE path = ?", gone)
+    finally:
+        conn.close()
+    return meta
+
+
+if __name__ == "__main__":
+    import sys
+    folder = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("/Videos")
+    start = time.time()
+    result = refresh(folder)
+    print(f"{len(result)} clips indexed in {time.time() - start:.1f}s")
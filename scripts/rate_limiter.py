@@ -0,0 +1,157 @@
+"""
+rate_limiter.py
+
+Token-bucket rate limiter shared by every generator process on the host.
+
+Bucket state lives in a small SQLite ledger (RATE_LIMIT_DB), updated under
+BEGIN IMMEDIATE so concurrent processes see one bucket per provider. Every API call
+goes through http_client, which calls acquire() for hosts mapped to a provider,
+so throughput sits just under quota instead of bursting into 429s. A 429 drains
+the bucket for everyone (penalize) so all processes back off together.
+
+Rates are requests per minute with a burst size; override per provider with e.g.
+    RATE_LIMIT_PEXELS=3.3:20   (3.3 req/min, burst 20)
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+
+DB_PATH = Path(os.getenv("RATE_LIMIT_DB", "/tmp/rate_limits.sqlite3"))
+
+# provider -> (requests per minute, burst)
+DEFAULT_RATES = {
+    "pexels": (200 / 60, 20),       # 200 requests/hour on the free plan
+    "pixabay": (100, 20),           # 100 requests/minute
+    "elevenlabs": (60, 5),
+    "gemini": (10, 3),              # preview TTS models have low RPM
+}
+
+# API host -> provider. CDN hosts serving the actual media aren't limited.
+HOST_PROVIDERS = {
+    "api.pexels.com": "pexels",
+    "pixabay.com": "pixabay",
+    "api.elevenlabs.io": "elevenlabs",
+    "generativelanguage.googleapis.com": "gemini",
+}
+
+MAX_WAIT_SLICE = 5.0  # seconds; re-check the shared ledger at least this often
+
+_local_lock = threading.Lock()
+
+
+def _parse_rate(value: str, default):
+    try:
+        parts = value.split(":")
+        per_minute = float(parts[0])
+        burst = float(parts[1]) if len(parts) > 1 else default[1]
+        return per_minute, burst
+    except (ValueError, IndexError):
+        return default
+
+
+def get_rate(provider: str):
+    default = DEFAULT_RATES.get(provider, (60, 10))
+    override = os.getenv(f"RATE_LIMIT_{provider.upper()}")
+    return _parse_rate(override, default) if override else default
+
+
+def register_host(host: str, provider: str, per_minute: float = None, burst: float = None):
+    """Map another host to a provider (also used to point tests at a local stub server)."""
+    HOST_PROVIDERS[host] = provider
+    if per_minute is not None:
+        DEFAULT_RATES[provider] = (per_minute, burst or DEFAULT_RATES.get(provider, (0, 1))[1])
+
+
+def provider_for_url(url: str) -> Optional[str]:
+    parts = urlsplit(url)
+    return HOST_PROVIDERS.get(parts.netloc) or HOST_PROVIDERS.get(parts.hostname or "")
+
+
+def _connect() -> sqlite3.Connection:
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(DB_PATH), timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS buckets (provider TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    return conn
+
+
+def _take(conn: sqlite3.Connection, provider: str, tokens: float) -> float:
+    """Refill and try to take `tokens`. Returns 0 on success, else seconds until enough tokens exist."""
+    per_minute, burst = get_rate(provider)
+    rate = per_minute / 60.0
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE provider = ?", (provider,)).fetchone()
+        available = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+        if available >= tokens:
+            available -= tokens
+            wait = 0.0
+        else:
+            wait = (tokens - available) / rate if rate > 0 else MAX_WAIT_SLICE
+        conn.execute(
+            "INSERT INTO buckets (provider, tokens, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(provider) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+            (provider, available, now),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return wait
+
+
+def acquire(provider: str, tokens: float = 1, timeout: float = None) -> float:
+    """Block until `tokens` are available for `provider`. Returns seconds waited; raises TimeoutError."""
+    start = time.time()
+    conn = _connect()
+    try:
+        while True:
+            with _local_lock:
+                wait = _take(conn, provider, tokens)
+            if wait <= 0:
+                return time.time() - start
+            if timeout is not None and time.time() - start + wait > timeout:
+                raise TimeoutError(f"Rate limit for {provider}: no token within {timeout}s")
+            time.sleep(min(wait, MAX_WAIT_SLICE))
+    finally:
+        conn.close()
+
+
+def retry_after_seconds(value) -> Optional[float]:
+    """Retry-After as seconds: delta-seconds or an HTTP-date (RFC 9110); None if absent or unparseable."""
+    if value is None or value == "":
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(str(value)).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def penalize(provider: str, retry_after=None):
+    """Provider answered 429: empty the shared bucket (or push it into debt for Retry-After seconds)."""
+    per_minute, _ = get_rate(provider)
+    seconds = retry_after_seconds(retry_after)
+    debt = (seconds * per_minute / 60.0) if seconds else 0.0
+    conn = _connect()
+    try:
+        with _local_lock:
+            conn.execute(
+                "INSERT INTO buckets (provider, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(provider) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (provider, -debt, time.time()),
+            )
+    finally:
+        conn.close()
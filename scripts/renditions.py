@@ -0,0 +1,116 @@
+"""
+renditions.py
+
+Pick the cheapest Pexels rendition that is still good enough for a 1080x1920 short.
+
+A rendition "covers" the target when the centered 9:16 crop of it is at least
+1080x1920, i.e. nothing gets upscaled. Among covering mp4s the smallest one wins;
+if none covers, the largest available is used (best effort, as before).
+
+BandwidthBudget caps the bytes one job may download, using Content-Length from a
+HEAD request before each download.
+"""
+
+import logging
+import os
+import threading
+from typing import List, Optional
+
+import http_client
+
+TARGET_RES = (1080, 1920)
+JOB_BANDWIDTH_BUDGET_MB = float(os.getenv("JOB_BANDWIDTH_BUDGET_MB", "0"))  # 0 = unlimited
+
+
+def crop_coverage(width: int, height: int, target=TARGET_RES) -> float:
+    """Size of the centered target-aspect crop relative to the target (>= 1.0 means no upscaling)."""
+    if not width or not height:
+        return 0.0
+    tw, th = target
+    crop_w = min(width, height * tw / th)
+    return crop_w / tw
+
+
+def _area(f: dict) -> int:
+    # Pexels sends "width": null for some renditions
+    return (f.get("width") or 0) * (f.get("height") or 0)
+
+
+def rank_renditions(video_files: List[dict], target=TARGET_RES) -> List[dict]:
+    """mp4 renditions in preference order: covering ones smallest first, then the rest largest first."""
+    mp4s = [f for f in video_files if f.get("file_type") == "video/mp4" and f.get("link")]
+    covering = [f for f in mp4s if crop_coverage(f.get("width"), f.get("height"), target) >= 1.0]
+    rest = [f for f in mp4s if f not in covering]
+    covering.sort(key=lambda f: (_area(f), f.get("size") or 0))
+    rest.sort(key=_area, reverse=True)
+    return covering + rest
+
+
+def select_rendition(video_files: List[dict], target=TARGET_RES) -> Optional[dict]:
+    ranked = rank_renditions(video_files, target)
+    return ranked[0] if ranked else None
+
+
+def content_length(url: str) -> Optional[int]:
+    try:
+        r = http_client.head(url)
+        r.close()
+        if r.status_code >= 400:
+            return None
+        length = r.headers.get("Content-Length")
+        return int(length) if length is not None else None
+    except Exception as e:
+        logging.warning(f"HEAD {url} failed: {e}")
+        return None
+
+
+class BandwidthBudget:
+    """Thread-safe byte budget shared by all downloads of one job (max_bytes=None means unlimited)."""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "BandwidthBudget":
+        return cls(int(JOB_BANDWIDTH_BUDGET_MB * 1024 * 1024) if JOB_BANDWIDTH_BUDGET_MB > 0 else None)
+
+    @property
+    def remaining(self) -> Optional[int]:
+        return None if self.max_bytes is None else self.max_bytes - self.used
+
+    def try_reserve(self, nbytes: int) -> bool:
+        with self._lock:
+            if self.max_bytes is not None and self.used + nbytes > self.max_bytes:
+                return False
+            self.used += nbytes
+            return True
+
+    def release(self, nbytes: int):
+        """Give back a reservation whose download was skipped, failed or discarded."""
+        with self._lock:
+            self.used = max(0, self.used - nbytes)
+
+    def release_rendition(self, rendition: Optional[dict]):
+        if rendition:
+            self.release(rendition.get("reserved_bytes") or 0)
+
+
+def choose_rendition(video_files: List[dict], budget: BandwidthBudget = None, target=TARGET_RES) -> Optional[dict]:
+    """
+    Best rendition that fits the job's remaining budget (reserving its size), or None if
+    nothing fits. Without a limited budget no HEAD requests are made.
+    The returned copy carries `reserved_bytes`; hand it to budget.release_rendition()
+    if the file ends up not being kept.
+    """
+    ranked = rank_renditions(video_files, target)
+    if budget is None or budget.max_bytes is None:
+        return ranked[0] if ranked else None
+    for f in ranked:
+        size = f.get("size") or content_length(f["link"])
+        if size is None:
+            continue
+        if budget.try_reserve(size):
+            return dict(f, reserved_bytes=size)
+    return None
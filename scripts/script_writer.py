@@ -0,0 +1,240 @@
+"""
+script_writer.py
+
+Segment script generation with Ollama, shared by Short_Generator_video.py and
+batch_scripts.py.
+
+- script_prompt() puts the topic-independent instructions first and the short
+  topic/goal request last; with keep_alive the model stays loaded and Ollama's prompt
+  cache reuses the evaluated instructions, so each job only processes its own tail
+- generate_script() returns the segments plus latency and Ollama token counters;
+  generate_script_and_descriptions() keeps the old (image_prompts, texts) shape
+- generate_script_streaming() hands each segment to a callback as soon as it is written
+
+Usage:
+    image_prompts, texts = script_writer.generate_script_and_descriptions(topic, goal)
+"""
+
+import json
+import logging
+import os
+import time
+
+import http_client
+import llm_cache
+import llm_stream
+from utils import measure_execution_time
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://host.docker.internal:11434/api/generate")
+DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+VIDEO_LENGTH_SECONDS = 200  # approx
+
+# Ollama structured-output schema for the segment script
+SCRIPT_FORMAT_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "image_description": {"type": "string"},
+            "text": {"type": "string"}
+        },
+        "required": ["image_description", "text"]
+    }
+}
+# Optional: Ollama generation options
+SCRIPT_OPTIONS = {
+    # "temperature": 0.8,
+    # "top_k": 20,
+    # "top_p": 0.9,
+    # "repeat_penalty": 1.2,
+    # "presence_penalty": 1.5,
+    # "frequency_penalty": 1.0,
+    # "stop": ["\n", "user:"],
+    # "num_predict": 512
+}
+
+
+def script_prompt(topic, goal):
+    """
+    (instructions, request) for the segment script. The instructions don't depend on the
+    topic and always come first, so consecutive jobs share a prompt prefix Ollama has cached.
+    """
+    # prompt = (f"You are an expert short-form video script writer for Instagram Reels and YouTube Shorts. "
+    #           f"Create a script about '{topic}'. The total length is around {VIDEO_LENGTH_SECONDS} seconds, split into {num_segments} concise segments. "
+    #           f"Each segment should have a text part and a description of an image to use. "
+    #           f"Output a JSON array with each element having 'text' and 'image_description' keys. "
+    #           f"Example: [{{'text': '...', 'image_description': '...'}}, ...]")
+    prompt_prefix = f"""You are tasked with creating a script for a short-form video that is about {VIDEO_LENGTH_SECONDS} seconds.
+    Please follow these instructions to create an engaging and impactful video:
+    1. Begin by setting the scene and capturing the viewer's attention with a captivating visual.
+    2. Each scene cut should occur every 5-10 seconds, ensuring a smooth flow and transition throughout the video.
+    3. For each scene cut, provide a detailed description of the stock image being shown add action if possible, which will be used to search Pexels api for free video.
+    4. Along with each image description, include a corresponding text that complements and enhances the visual. The text should be concise and powerful.
+    5. Make sure the story makes sense and is easy to follow, with a clear beginning, middle, and end.
+    6. Ensure that the sequence of images and text builds excitement and encourages viewers to take action.
+    7. Strictly output your response in a JSON list format, adhering to the following sample structure:"""
+
+    sample_output = """
+    [
+        { "image_description": "Description of the first image here. be specific and concise. only 5 main words", "text": "Text accompanying the first scene cut." },
+        { "image_description": "Description of the second image here. be specific and concise. only 5 main words", "text": "Text accompanying the second scene cut." },
+        ...
+    ]"""
+
+    prompt_request = f"""
+    The video is about {topic}. Your goal is to {goal}.
+    By following these instructions, you will create an impactful {topic} short-form video.
+    Output:"""
+
+    return prompt_prefix + sample_output, prompt_request
+
+
+def script_cache_key(topic, goal, model=DEFAULT_MODEL):
+    instructions, request = script_prompt(topic, goal)
+    return llm_cache.make_key(model, instructions + request, SCRIPT_FORMAT_SCHEMA, SCRIPT_OPTIONS)
+
+
+def build_script_payload(topic, goal, model=DEFAULT_MODEL):
+    """Ollama /api/generate payload for the segment script (shared by the blocking and streaming paths)."""
+    instructions, request = script_prompt(topic, goal)
+    prompt = instructions + request
+    logging.info(f"Prompt:\n{prompt}")
+
+    # logging.info("Prompt:")
+    # logging.info(prompt)
+    headers = {
+        "Content-Type": "application/json"
+        # "Authorization": f"Bearer {OPENAI_API_KEY}"
+    }
+    # data = {
+    #     "model": "gpt-4o-mini",
+    #     "messages": [{"role":"system","content":You are a helpful assistant."},
+    #                  {"role":"user","content": prompt}],
+    #     "max_tokens": max_tokens,
+    #     "temperature": 0.7,
+    #     "n": 1
+    # }
+    # response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=data)
+    # response.raise_for_status()
+    # content = response.json()["choices"][0]["message"]["content"]
+
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": False,
+        "format": SCRIPT_FORMAT_SCHEMA,
+        "options": SCRIPT_OPTIONS,
+        "keep_alive": llm_cache.KEEP_ALIVE,
+    }
+    return payload
+
+
+@measure_execution_time
+def generate_script(topic, goal, model=DEFAULT_MODEL):
+    """
+    Generate (or load from llm_cache) the segment script for one topic.
+
+    Returns a dict with image_prompts, texts, cached, latency (seconds) and Ollama's
+    token counters (eval_count, eval_duration, prompt_eval_count, prompt_eval_duration,
+    in tokens / nanoseconds), so batch runs can report throughput. image_prompts and
+    texts are empty lists when generation or parsing failed.
+    """
+    started = time.time()
+    result = {"image_prompts": [], "texts": [], "cached": False, "error": None}
+    cache_key = script_cache_key(topic, goal, model)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        logging.info("Using cached script for this topic/goal/model.")
+        output = json.loads(cached)
+        result.update(image_prompts=[k['image_description'] for k in output], texts=[k['text'] for k in output],
+                      cached=True, latency=time.time() - started)
+        return result
+
+    payload = build_script_payload(topic, goal, model)
+    response = http_client.post(OLLAMA_URL, json=payload, timeout=http_client.LONG_TIMEOUT)
+    result["latency"] = time.time() - started
+
+    logging.info("Ollama response :")
+    logging.info(response)
+
+    if response.status_code != 200:
+        logging.info(f"Error: {response.status_code} {response.text}")
+        result["error"] = f"Ollama error {response.status_code}: {response.text[:300]}"
+        return result
+
+    response_json = response.json()
+    content = response_json.get("response", "").strip()
+    for k in ("eval_count", "eval_duration", "prompt_eval_count", "prompt_eval_duration"):
+        result[k] = response_json.get(k)
+
+    try:
+        output = json.loads(content)
+        result["image_prompts"] = [k['image_description'] for k in output]
+        result["texts"] = [k['text'] for k in output]
+    except Exception as e:
+        logging.info(f"Failed to parse JSON from Ollama response: {e}")
+        logging.info(f"Raw content: {content}")
+        result["error"] = f"Unparseable response: {e}"
+        return result
+    llm_cache.put(cache_key, model, content, response_json.get("eval_count"))
+    return result
+
+
+def generate_script_and_descriptions(topic, goal, model=DEFAULT_MODEL):
+    """(image_prompts, texts) for one topic; ([], []) on failure."""
+    result = generate_script(topic, goal, model)
+    return result["image_prompts"], result["texts"]
+
+
+@measure_execution_time
+def generate_script_streaming(topic, goal, model=DEFAULT_MODEL, on_segment=None):
+    """
+    Stream the script from Ollama and call on_segment(i, image_description, text) (1-based)
+    as soon as each array element is complete. Returns (image_prompts, texts) like
+    generate_script_and_descriptions. Cached scripts are replayed without calling Ollama.
+    """
+    image_prompts, texts = [], []
+    started = time.time()
+
+    def accept(item):
+        if not isinstance(item, dict) or "image_description" not in item or "text" not in item:
+            logging.info(f"Skipping malformed segment from Ollama: {item}")
+            return
+        image_prompts.append(item["image_description"])
+        texts.append(item["text"])
+        i = len(texts)
+        logging.info(f"Segment {i} received after {time.time() - started:.1f}s")
+        if on_segment:
+            on_segment(i, item["image_description"], item["text"])
+
+    cache_key = script_cache_key(topic, goal, model)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        logging.info("Using cached script for this topic/goal/model.")
+        for item in json.loads(cached):
+            accept(item)
+        return image_prompts, texts
+
+    stream = llm_stream.OllamaStream(OLLAMA_URL, build_script_payload(topic, goal, model))
+    try:
+        for item in stream.items():
+            accept(item)
+    except Exception as e:
+        logging.info(f"Ollama streaming failed after {len(texts)} segments: {e}")
+        return image_prompts, texts
+
+    if not texts and stream.text:
+        # not a bare JSON array: fall back to parsing the whole response
+        content = stream.text.strip()
+        try:
+            start = content.find("[")
+            end = content.rfind("]") + 1
+            for item in json.loads(content[start:end]):
+                accept(item)
+        except Exception as e:
+            logging.info(f"Failed to parse JSON from Ollama response: {e}")
+            logging.info(f"Raw content: {content}")
+    if texts:
+        segments = [{"image_description": d, "text": t} for d, t in zip(image_prompts, texts)]
+        llm_cache.put(cache_key, model, json.dumps(segments), (stream.final or {}).get("eval_count"))
+    return image_prompts, texts
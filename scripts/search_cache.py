@@ -0,0 +1,152 @@
+"""
+search_cache.py
+
+Persistent cache for Pexels search responses (SQLite, shared by all scripts/processes).
+
+- Key: endpoint + normalized query + the remaining search params (orientation, size,
+  duration/size bounds, per_page, page), so "Sunset  over Mountains." and
+  "sunset over mountains" hit the same entry
+- Entries expire after SEARCH_CACHE_TTL seconds
+- Size-bounded: least recently used entries are evicted past SEARCH_CACHE_MAX_ENTRIES
+- stats() exposes hit/miss/eviction counters for this process
+
+Usage:
+    data = search_cache.get(url, params)
+    if data is None:
+        data = <call the API>.json()
+        search_cache.put(url, params, data)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+CACHE_PATH = Path(os.getenv("SEARCH_CACHE_PATH", "/Videos/search_cache.sqlite3"))
+TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL", str(7 * 24 * 3600)))
+MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "20000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_cache (
+    key         TEXT PRIMARY KEY,
+    endpoint    TEXT NOT NULL,
+    query       TEXT NOT NULL,
+    params      TEXT NOT NULL,
+    response    TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_search_cache_accessed ON search_cache(accessed_at);
+"""
+
+_stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str, n: int = 1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def stats() -> dict:
+    """Hit/miss counters for this process, plus the hit rate."""
+    with _stats_lock:
+        out = dict(_stats)
+    lookups = out["hits"] + out["misses"]
+    out["hit_rate"] = out["hits"] / lookups if lookups else 0.0
+    return out
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", str(query).lower()).split())
+
+
+def make_key(endpoint: str, params: dict) -> tuple:
+    params = dict(params or {})
+    query = normalize_query(params.pop("query", params.pop("q", "")))
+    # drop unset bounds so max_duration=None and a missing max_duration share an entry
+    rest = json.dumps({k: params[k] for k in sorted(params) if params[k] is not None and k != "key"}, sort_keys=True)
+    key = hashlib.sha1(f"{endpoint}\n{query}\n{rest}".encode("utf-8")).hexdigest()
+    return key, query, rest
+
+
+def _connect() -> sqlite3.Connection:
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(CACHE_PATH), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def get(endpoint: str, params: dict) -> Optional[dict]:
+    """Return the cached JSON response, or None on miss/expiry."""
+    key, _, _ = make_key(endpoint, params)
+    now = time.time()
+    try:
+        conn = _connect()
+    except sqlite3.Error as e:
+        logging.warning(f"Search cache unavailable: {e}")
+        _count("misses")
+        return None
+    try:
+        row = conn.execute("SELECT response, created_at FROM search_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            _count("misses")
+            return None
+        if now - row[1] > TTL_SECONDS:
+            with conn:
+                conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+            _count("expired")
+            _count("misses")
+            return None
+        with conn:
+            conn.execute("UPDATE search_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        _count("hits")
+        return json.loads(row[0])
+    finally:
+        conn.close()
+
+
+def put(endpoint: str, params: dict, response: dict):
+    """Store a successful JSON response and evict least recently used entries past MAX_ENTRIES."""
+    key, query, rest = make_key(endpoint, params)
+    now = time.time()
+    try:
+        conn = _connect()
+    except sqlite3.Error as e:
+        logging.warning(f"Search cache unavailable: {e}")
+        return
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, endpoint, query, params, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, query, rest, json.dumps(response), now, now),
+            )
+            overflow = conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0] - MAX_ENTRIES
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM search_cache WHERE key IN "
+                    "(SELECT key FROM search_cache ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+                _count("evictions", overflow)
+    finally:
+        conn.close()
+
+
+def purge_expired() -> int:
+    conn = _connect()
+    try:
+        with conn:
+            cur = conn.execute("DELETE FROM search_cache WHERE created_at < ?", (time.time() - TTL_SECONDS,))
+        return cur.rowcount
+    finally:
+        conn.close()
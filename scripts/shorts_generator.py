@@ -4,22 +4,23 @@ from moviepy import (
     VideoFileClip, concatenate_videoclips, AudioFileClip,
     CompositeAudioClip, CompositeVideoClip, TextClip
 )
-import whisper
-import torch
 from gtts import gTTS
+import clip_library
+import tts_cache
+import transcribe_server
+import forced_align
 
 # -------------------------------
 # Config
 # -------------------------------
 clips_folder = Path("/data/videos")
 audio_file = Path("/data/generated_audio/story_audio.mp3")
+story_file = audio_file.with_suffix(".txt")
 output_file = Path("/data/generated_audio/final_video.mp4")
 vertical_resolution = (1080, 1920)
 fade_duration = 0.5
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
-
-model = whisper.load_model("base", download_root="/data/whisper_models", device=device)
+# Whisper runs in transcribe_server.py (started separately, or loaded in-process on first use)
 
 # -------------------------------
 # Step 1: Load or generate audio
@@ -44,7 +45,9 @@ if not audio_file.exists():
     "Now, I understand—karma may take its time, but it always returns. Betrayal hurt, but compassion healed. "
     "In the end, it’s not what was taken from me that defines my story, but what I chose to give."
 )
-    gTTS(story_text, lang="en").save(str(audio_file))
+    tts_cache.cached_synthesis("gtts", "en", None, story_text, {"slow": False}, audio_file,
+                               lambda path: gTTS(story_text, lang="en", slow=False).save(path))
+    story_file.write_text(story_text, encoding="utf-8")
 
 narration = AudioFileClip(str(audio_file))
 audio_duration = narration.duration
@@ -52,7 +55,7 @@ audio_duration = narration.duration
 # -------------------------------
 # Step 2: Select and resize clips
 # -------------------------------
-all_videos = [VideoFileClip(str(p)) for p in clips_folder.glob("*.mp4")]
+all_videos = list(clips_folder.glob("*.mp4"))
 if not all_videos:
     raise Exception("No video files found!")
 
@@ -62,11 +65,17 @@ selected = random.sample(all_videos, min(num_clips, len(all_videos)))
 target_each = audio_duration / len(selected)
 
 processed = []
-for clip in selected:
-    clip = clip.resize(height=vertical_resolution[1]).crop(
-        x_center=clip.w // 2, width=vertical_resolution[0],
-        y_center=clip.h // 2, height=vertical_resolution[1]
-    ).fadein(fade_duration).fadeout(fade_duration)
+for path in selected:
+    # Pre-transcoded 1080x1920 mezzanine (mezzanine_worker) needs no resize/crop
+    mezzanine = clip_library.mezzanine_for(path, size=vertical_resolution)
+    if mezzanine:
+        clip = VideoFileClip(mezzanine).fadein(fade_duration).fadeout(fade_duration)
+    else:
+        clip = VideoFileClip(str(path))
+        clip = clip.resize(height=vertical_resolution[1]).crop(
+            x_center=clip.w // 2, width=vertical_resolution[0],
+            y_center=clip.h // 2, height=vertical_resolution[1]
+        ).fadein(fade_duration).fadeout(fade_duration)
 
     if clip.duration > target_each:
         clip = clip.subclip(0, target_each)
@@ -85,11 +94,16 @@ video = video.set_duration(audio_duration).set_audio(narration)
 # -------------------------------
 # Step 4: Generate subtitles
 # -------------------------------
-result = model.transcribe(str(audio_file), word_timestamps=True)
 words = []
-for seg in result["segments"]:
-    for w in seg["words"]:
+if story_file.exists():
+    # the narration text is known: align it instead of transcribing
+    for w in forced_align.align_file(story_file.read_text(encoding="utf-8"), audio_file):
         words.append((w["start"], w["end"], w["word"]))
+else:
+    result = transcribe_server.transcribe(audio_file, word_timestamps=True)
+    for seg in result["segments"]:
+        for w in seg["words"]:
+            words.append((w["start"], w["end"], w["word"]))
 
 # -------------------------------
 # Step 5: Karaoke-style text overlay
@@ -0,0 +1,31 @@
+"""
+Shared fixtures: the scripts directory on sys.path (modules import each other by
+plain name) and a throwaway local HTTP server standing in for a provider API.
+"""
+
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def stub_server():
+    """Start a stub server for a BaseHTTPRequestHandler subclass; yields a factory returning its base URL."""
+    servers = []
+
+    def start(handler_cls) -> str:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler_cls)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,134 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import unquote
+
+import pytest
+
+import tts_cache
+
+try:
+    import chatterbox_api
+except (ImportError, OSError) as e:  # utils needs psutil and the container's /scripts log directory
+    pytest.skip(f"chatterbox_api unavailable: {e}", allow_module_level=True)
+
+
+@pytest.fixture(autouse=True)
+def stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(chatterbox_api, "UPLOADS_DB", tmp_path / "uploads.sqlite3")
+    monkeypatch.setattr(tts_cache, "CACHE_DIR", tmp_path / "tts_cache")
+    monkeypatch.setattr(tts_cache, "DB_PATH", tmp_path / "tts_cache" / "tts_cache.sqlite3")
+    GradioHandler.reset()
+
+
+class GradioHandler(BaseHTTPRequestHandler):
+    """Just enough of Gradio's upload / queue / file API for one generate_tts_audio endpoint."""
+
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+
+    @classmethod
+    def reset(cls):
+        cls.files = {}          # server path -> bytes
+        cls.events = {}         # event id -> submitted data
+        cls.uploads = 0
+        cls.heads = 0
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        GradioHandler.heads += 1
+        self._send(405)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path == "/gradio_api/upload":
+            with self.lock:
+                GradioHandler.uploads += 1
+                server_path = f"/tmp/gradio/upload{GradioHandler.uploads}/voice.mp3"
+                GradioHandler.files[server_path] = body
+            self._send(200, json.dumps([server_path]).encode())
+        elif self.path == "/gradio_api/call/generate_tts_audio":
+            with self.lock:
+                event_id = f"event{len(GradioHandler.events) + 1}"
+                GradioHandler.events[event_id] = json.loads(body)["data"]
+            self._send(200, json.dumps({"event_id": event_id}).encode())
+        else:
+            self._send(404)
+
+    def do_GET(self):
+        prefix = "/gradio_api/call/generate_tts_audio/"
+        if self.path.startswith(prefix):
+            data = GradioHandler.events[self.path[len(prefix):]]
+            out_path = f"/tmp/gradio/out/{self.path[len(prefix):]}.wav"
+            GradioHandler.files[out_path] = f"audio:{data[0]}".encode()
+            result = [{"path": out_path, "orig_name": "audio.wav"}]
+            stream = f"event: generating\ndata: null\n\nevent: complete\ndata: {json.dumps(result)}\n\n"
+            self._send(200, stream.encode(), "text/event-stream")
+        elif self.path.startswith("/gradio_api/file="):
+            content = GradioHandler.files.get(unquote(self.path[len("/gradio_api/file="):]))
+            if content is None:
+                self._send(404)
+            elif self.headers.get("Range") == "bytes=0-0":
+                self._send(206, content[:1], "audio/mpeg", {"Content-Range": f"bytes 0-0/{len(content)}"})
+            else:
+                self._send(200, content, "audio/mpeg")
+        else:
+            self._send(404)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def voice(tmp_path):
+    path = tmp_path / "narrator.mp3"
+    path.write_bytes(b"reference voice")
+    return path
+
+
+def test_reference_voice_uploaded_once(stub_server, voice):
+    client = chatterbox_api.ChatterboxClient(stub_server(GradioHandler))
+    first = client.reference_path(voice)
+    assert client.reference_path(voice) == first
+    # a new client finds the upload in SQLite and verifies it with a range GET, not HEAD
+    assert chatterbox_api.ChatterboxClient(client.base_url).reference_path(voice) == first
+    assert GradioHandler.uploads == 1
+    assert GradioHandler.heads == 0
+
+
+def test_reference_voice_reuploaded_when_server_lost_it(stub_server, voice):
+    url = stub_server(GradioHandler)
+    _, server_path = chatterbox_api.ChatterboxClient(url).reference_path(voice)
+    GradioHandler.files.clear()  # server restarted
+    _, new_path = chatterbox_api.ChatterboxClient(url).reference_path(voice)
+    assert new_path != server_path
+    assert GradioHandler.uploads == 2
+
+
+def test_synthesize_segments_queues_then_collects(stub_server, voice, tmp_path):
+    client = chatterbox_api.ChatterboxClient(stub_server(GradioHandler))
+    texts = ["First line.", "Second line.", "Third line."]
+    out_dir = tmp_path / "ws"
+    paths = client.synthesize_segments(texts, out_dir, voice, ext="wav")
+
+    assert paths == {i: str(out_dir / f"{i}.wav") for i in (1, 2, 3)}
+    for i, text in enumerate(texts, start=1):
+        assert (out_dir / f"{i}.wav").read_bytes() == f"audio:{text}".encode()
+    assert not list(out_dir.glob("*.part"))
+    submitted = list(GradioHandler.events.values())
+    assert [data[0] for data in submitted] == texts
+    assert all(data[2]["path"] == "/tmp/gradio/upload1/voice.mp3" for data in submitted)
+
+    # a second run is served from tts_cache without touching the queue
+    again = client.synthesize_segments(texts, tmp_path / "ws2", voice, ext="wav")
+    assert len(again) == 3
+    assert len(GradioHandler.events) == 3
+    assert GradioHandler.uploads == 1
@@ -0,0 +1,78 @@
+import json
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from llm_stream import ArrayItemParser, OllamaStream
+
+ITEMS = [
+    {"image_description": "city at night, {neon} signs", "text": "He said \"wait]\" and left."},
+    {"image_description": "a path \\ a road", "text": "Nested [1, 2] and {\"a\": 1} inside strings."},
+    {"image_description": "ocean", "text": "Unicode — “quotes” ✓", "tags": ["x", {"y": [1]}]},
+]
+RESPONSE = "Here is the script:\n" + json.dumps(ITEMS, indent=2, ensure_ascii=False) + "\nEnjoy."
+
+
+def feed_all(chunks):
+    parser = ArrayItemParser()
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(RESPONSE)])
+def test_parser_chunk_sizes(size):
+    chunks = [RESPONSE[i:i + size] for i in range(0, len(RESPONSE), size)]
+    assert feed_all(chunks) == ITEMS
+
+
+def test_parser_every_split_point():
+    for i in range(len(RESPONSE)):
+        assert feed_all([RESPONSE[:i], RESPONSE[i:]]) == ITEMS
+
+
+def test_parser_yields_items_as_they_close():
+    text = json.dumps(ITEMS)
+    first_end = text.index(json.dumps(ITEMS[0])) + len(json.dumps(ITEMS[0]))
+    parser = ArrayItemParser()
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.feed(text[first_end - 1:first_end]) == [ITEMS[0]]
+    assert parser.feed(text[first_end:]) == ITEMS[1:]
+
+
+def test_parser_trims_consumed_text():
+    parser = ArrayItemParser()
+    text = json.dumps(ITEMS * 50)
+    for i in range(0, len(text), 5):
+        parser.feed(text[i:i + 5])
+        assert len(parser.buffer) <= max(len(json.dumps(item)) for item in ITEMS) + 5
+
+
+class OllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        lines = [{"response": RESPONSE[i:i + 5], "done": False} for i in range(0, len(RESPONSE), 5)]
+        lines.append({"response": "", "done": True, "eval_count": len(lines)})
+        for msg in lines:
+            data = (json.dumps(msg) + "\n").encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_ollama_stream_items(stub_server):
+    url = stub_server(OllamaHandler)
+    stream = OllamaStream(f"{url}/api/generate", {"model": "llama3.1", "prompt": "x"})
+    assert list(stream.items()) == ITEMS
+    assert stream.text == RESPONSE
+    assert stream.final["done"] is True
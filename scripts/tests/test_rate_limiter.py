@@ -0,0 +1,92 @@
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+import http_client
+import rate_limiter
+
+
+@pytest.fixture(autouse=True)
+def ledger(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "DB_PATH", tmp_path / "rate_limits.sqlite3")
+    monkeypatch.setattr(rate_limiter, "HOST_PROVIDERS", dict(rate_limiter.HOST_PROVIDERS))
+    monkeypatch.setattr(rate_limiter, "DEFAULT_RATES", dict(rate_limiter.DEFAULT_RATES))
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    hits = []
+
+    def do_GET(self):
+        OkHandler.hits.append(time.time())
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_bucket_paces_concurrent_callers(stub_server):
+    base = stub_server(OkHandler)
+    OkHandler.hits = []
+    rate_limiter.register_host(base.split("//")[1], "stub", per_minute=600, burst=2)  # 10/s after a burst of 2
+
+    started = time.time()
+    threads = [threading.Thread(target=lambda: http_client.get(f"{base}/x")) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(OkHandler.hits) == 8
+    # 2 from the burst, the other 6 at 10/s
+    assert time.time() - started >= 0.5
+    assert sorted(OkHandler.hits)[1] - started < 0.3
+
+
+def test_acquire_shares_one_bucket_across_connections():
+    rate_limiter.register_host("stub.invalid", "shared", per_minute=60, burst=3)
+    waits = [rate_limiter.acquire("shared") for _ in range(3)]
+    assert all(w < 0.1 for w in waits)
+    with pytest.raises(TimeoutError):
+        rate_limiter.acquire("shared", timeout=0.2)
+
+
+def test_retry_after_accepts_http_dates():
+    assert rate_limiter.retry_after_seconds("12") == 12.0
+    assert 25 <= rate_limiter.retry_after_seconds(formatdate(time.time() + 30, usegmt=True)) <= 30
+    assert rate_limiter.retry_after_seconds("not a date") is None
+    assert rate_limiter.retry_after_seconds(None) is None
+
+
+class DateRetryAfterHandler(BaseHTTPRequestHandler):
+    calls = 0
+
+    def do_GET(self):
+        DateRetryAfterHandler.calls += 1
+        if DateRetryAfterHandler.calls == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", formatdate(time.time() - 5, usegmt=True))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_429_with_http_date_is_retried(stub_server):
+    base = stub_server(DateRetryAfterHandler)
+    DateRetryAfterHandler.calls = 0
+    rate_limiter.register_host(base.split("//")[1], "dated", per_minute=6000, burst=5)
+    r = http_client.get(f"{base}/x", max_retries=3)
+    assert r.status_code == 200
+    assert DateRetryAfterHandler.calls == 2
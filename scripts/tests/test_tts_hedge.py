@@ -0,0 +1,202 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+
+import pytest
+
+import http_client
+import rate_limiter
+import tts_hedge
+import tts_stage
+import word_timings
+
+ALIGNMENT = {"characters": ["h", "i"], "character_start_times_seconds": [0.0, 0.1],
+             "character_end_times_seconds": [0.1, 0.2]}
+
+
+@pytest.fixture(autouse=True)
+def history(tmp_path, monkeypatch):
+    monkeypatch.setattr(tts_hedge, "DB_PATH", tmp_path / "db" / "tts_latency.sqlite3")
+    monkeypatch.setattr(tts_hedge, "DEFAULT_HEDGE_SECONDS", 0.05)
+    monkeypatch.setattr(tts_stage, "_semaphores", {})
+    monkeypatch.setattr(tts_stage, "PROVIDER_CONCURRENCY", {"primary": 1, "secondary": 1})
+
+
+class FakeProvider:
+    """synth(text, path, cache_only) that writes `<name>:<text>` plus a timing sidecar once `release` is set."""
+
+    def __init__(self, name, release=None, fail=False, cached=False):
+        self.name = name
+        self.release = release or threading.Event()
+        if release is None:
+            self.release.set()
+        self.fail = fail
+        self.cached = cached
+        self.calls = 0
+        self.done = threading.Event()
+
+    def __call__(self, text, path, cache_only=False):
+        if cache_only:
+            if not self.cached:
+                return None
+            Path(path).write_text(f"cache:{text}")
+            return {"path": path, "cached": True}
+        self.calls += 1
+        try:
+            self.release.wait(5)
+            Path(path).write_text(f"{self.name}:{text}")
+            word_timings.save(path, ALIGNMENT, self.name)
+            if self.fail:
+                raise RuntimeError(f"{self.name} is down")
+            return {"path": path, "cached": False}
+        finally:
+            self.done.set()
+
+    def provider(self):
+        return (self.name, self, "mp3")
+
+
+def leftovers(audio_dir: Path):
+    hedge_dir = audio_dir / tts_hedge.TMP_DIR
+    return sorted(p.name for p in hedge_dir.rglob("*") if p.is_file()) if hedge_dir.exists() else []
+
+
+def test_hedge_winner_kept_and_loser_cleaned_up(tmp_path):
+    slow = FakeProvider("primary", release=threading.Event())
+    fast = FakeProvider("secondary")
+    out = tmp_path / "1.mp3"
+
+    result = tts_hedge.hedged_synthesis("hello", out, [slow.provider(), fast.provider()])
+    assert result["provider"] == "secondary" and result["hedged"] and not result["cached"]
+    assert out.read_text() == "secondary:hello"
+    assert word_timings.load(out)["source"] == "secondary"
+
+    slow.release.set()
+    assert slow.done.wait(5)
+    time.sleep(0.1)  # the loser cleans up right after its synth returns
+    assert out.read_text() == "secondary:hello"
+    assert leftovers(tmp_path) == []
+    assert sorted(p.name for p in tmp_path.iterdir() if p.is_file()) == ["1.mp3"]
+
+    stats = tts_hedge.stats()
+    assert stats["secondary"]["hedge_wins"] == 1 and stats["primary"]["hedge_wins"] == 0
+    assert stats["primary"]["samples"] == 1  # the loser's latency is still recorded
+
+
+def test_failed_primary_fails_over_and_leaves_nothing_behind(tmp_path):
+    broken = FakeProvider("primary", fail=True)
+    backup = FakeProvider("secondary")
+    out = tmp_path / "2.mp3"
+
+    result = tts_hedge.hedged_synthesis("hello", out, [broken.provider(), backup.provider()])
+    assert result["provider"] == "secondary"
+    assert out.read_text() == "secondary:hello"
+    assert leftovers(tmp_path) == []
+    assert tts_hedge.stats()["primary"]["failures"] == 1
+
+
+def test_cache_hit_skips_hedge_and_latency_history(tmp_path):
+    primary = FakeProvider("primary", cached=True)
+    secondary = FakeProvider("secondary")
+    out = tmp_path / "3.mp3"
+
+    result = tts_hedge.hedged_synthesis("hello", out, [primary.provider(), secondary.provider()])
+    assert result["cached"] and not result["hedged"]
+    assert out.read_text() == "cache:hello"
+    assert primary.calls == 0 and secondary.calls == 0
+    assert tts_hedge.stats() == {}
+    assert leftovers(tmp_path) == []
+
+
+def test_hedged_request_waits_for_its_provider_slot(tmp_path):
+    release = threading.Event()
+    primary = FakeProvider("primary", release=release)
+    secondary = FakeProvider("secondary")
+    out = tmp_path / "4.mp3"
+
+    with tts_stage.provider_slot("secondary"):  # the secondary's only slot is busy elsewhere
+        worker = threading.Thread(target=tts_hedge.hedged_synthesis,
+                                  args=("hello", out, [primary.provider(), secondary.provider()]))
+        worker.start()
+        time.sleep(0.3)  # well past the hedge delay
+        assert secondary.calls == 0
+        release.set()
+        worker.join(5)
+    assert out.read_text() == "primary:hello"
+
+
+class AudioHandler(BaseHTTPRequestHandler):
+    """POST /synthesize -> `<body>:<text>` after `delay` seconds."""
+
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    body = b""
+
+    def do_POST(self):
+        text = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["text"]
+        time.sleep(self.delay)
+        content = self.body + b":" + text.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class SlowHandler(AudioHandler):
+    delay = 0.5
+    body = b"slow"
+
+
+class FastHandler(AudioHandler):
+    body = b"fast"
+
+
+class HttpProvider:
+    """synth(text, path, cache_only) that downloads the audio from a stub server through http_client."""
+
+    def __init__(self, name, base_url):
+        self.name = name
+        self.url = base_url + "/synthesize"
+        self.done = threading.Event()
+        rate_limiter.register_host(base_url.split("//")[1], name, per_minute=600, burst=10)
+
+    def __call__(self, text, path, cache_only=False):
+        if cache_only:
+            return None
+        try:
+            r = http_client.post(self.url, json={"text": text}, max_retries=1)
+            r.raise_for_status()
+            Path(path).write_bytes(r.content)
+            return {"path": path, "cached": False}
+        finally:
+            self.done.set()
+
+    def provider(self):
+        return (self.name, self, "mp3")
+
+
+def test_slow_primary_server_loses_the_hedge(stub_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "DB_PATH", tmp_path / "rate_limits.sqlite3")
+    monkeypatch.setattr(rate_limiter, "HOST_PROVIDERS", dict(rate_limiter.HOST_PROVIDERS))
+    monkeypatch.setattr(rate_limiter, "DEFAULT_RATES", dict(rate_limiter.DEFAULT_RATES))
+    slow = HttpProvider("primary", stub_server(SlowHandler))
+    fast = HttpProvider("secondary", stub_server(FastHandler))
+    out = tmp_path / "5.mp3"
+
+    started = time.time()
+    result = tts_hedge.hedged_synthesis("hello", out, [slow.provider(), fast.provider()])
+    assert time.time() - started < SlowHandler.delay
+    assert result["provider"] == "secondary" and result["hedged"]
+    assert out.read_bytes() == b"fast:hello"
+
+    assert slow.done.wait(5)
+    time.sleep(0.1)  # the loser cleans up right after its synth returns
+    assert out.read_bytes() == b"fast:hello"
+    assert leftovers(tmp_path) == []
+    assert tts_hedge.stats()["secondary"]["hedge_wins"] == 1
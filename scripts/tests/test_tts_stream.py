@@ -0,0 +1,62 @@
+import base64
+import json
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+import tts_stream
+
+AUDIO = [b"ID3-first-chunk", b"second-chunk", b"third"]
+# chunk-relative times, as some responses send them
+PIECES = [
+    {"characters": list("Hi "), "character_start_times_seconds": [0.0, 0.1, 0.2],
+     "character_end_times_seconds": [0.1, 0.2, 0.3]},
+    {"characters": list("there"), "character_start_times_seconds": [0.0, 0.1, 0.2, 0.3, 0.4],
+     "character_end_times_seconds": [0.1, 0.2, 0.3, 0.4, 0.5]},
+    None,
+]
+
+
+class ElevenLabsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def do_POST(self):
+        ElevenLabsHandler.requests.append((self.path, json.loads(self.rfile.read(int(self.headers["Content-Length"])))))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for audio, alignment in zip(AUDIO, PIECES):
+            data = (json.dumps({"audio_base64": base64.b64encode(audio).decode(), "alignment": alignment,
+                                "normalized_alignment": alignment}) + "\n").encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_stream_with_timestamps_writes_audio_and_merged_alignment(stub_server, monkeypatch, tmp_path):
+    url = stub_server(ElevenLabsHandler)
+    monkeypatch.setattr(tts_stream, "ELEVENLABS_STREAM_TIMESTAMPS_URL",
+                        url + "/v1/text-to-speech/{voice_id}/stream/with-timestamps")
+    out = tmp_path / "1.mp3"
+
+    info = tts_stream.elevenlabs_stream_with_timestamps("Hi there", str(out), "voice", "key")
+    assert out.read_bytes() == b"".join(AUDIO)
+    assert not (tmp_path / "1.mp3.part").exists()
+    assert ElevenLabsHandler.requests[-1] == ("/v1/text-to-speech/voice/stream/with-timestamps",
+                                             {"text": "Hi there", "model_id": "eleven_multilingual_v2"})
+    alignment = info["alignment"]
+    assert "".join(alignment["characters"]) == "Hi there"
+    assert alignment["character_start_times_seconds"] == pytest.approx([0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7])
+    assert alignment["character_end_times_seconds"][-1] == pytest.approx(0.8)
+
+
+def test_merge_alignment_keeps_file_clock_chunks():
+    absolute = [PIECES[0], {"characters": ["x"], "character_start_times_seconds": [0.3],
+                            "character_end_times_seconds": [0.4]}]
+    merged = tts_stream.merge_alignment(absolute)
+    assert merged["character_start_times_seconds"] == pytest.approx([0.0, 0.1, 0.2, 0.3])
@@ -0,0 +1,293 @@
+"""
+transcribe_server.py
+
+Long-lived local transcription service, so pipeline scripts stop loading Whisper
+weights themselves.
+
+- The faster-whisper model is loaded once and kept warm
+- Requests are queued; WHISPER_WORKERS threads (default min(4, CPUs)) share the
+  model through CTranslate2's num_workers, so that many concurrent jobs are
+  transcribed at the same time, each with its share of the CPU threads
+- A request identical to one already queued or running (same file and options)
+  waits for that job instead of being transcribed again; a file that fails to
+  decode or transcribe fails only its own requests
+- Results are cached by audio content (transcript_cache), next to the workspace and
+  globally, so re-captioning a known narration skips the model
+- Localhost HTTP: POST /transcribe with {"path", "language", "word_timestamps"} (or the
+  raw audio as the body when the file isn't visible to the server), GET /health
+
+Results use the openai-whisper shape: {"language", "duration", "text", "segments":
+[{"start", "end", "text", "words": [{"word", "start", "end", "probability"}]}]}.
+
+Run:
+    python transcribe_server.py                 # serves on 127.0.0.1:8765
+Client:
+    words = transcribe_server.word_timestamps("/final_videos/<ws>/combined_video.mp3")
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import http_client
+import transcript_cache
+
+HOST = os.getenv("TRANSCRIBE_HOST", "127.0.0.1")
+PORT = int(os.getenv("TRANSCRIBE_PORT", "8765"))
+TRANSCRIBE_URL = os.getenv("TRANSCRIBE_URL", f"http://{HOST}:{PORT}")
+MODEL_SIZE = os.getenv("WHISPER_MODEL", "medium")
+DEVICE = os.getenv("WHISPER_DEVICE", "auto")
+COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "default")
+DEFAULT_LANGUAGE = os.getenv("WHISPER_LANGUAGE") or None
+WORKERS = int(os.getenv("WHISPER_WORKERS", str(min(4, os.cpu_count() or 1))))  # concurrent transcriptions
+LOCAL_FALLBACK = os.getenv("TRANSCRIBE_LOCAL_FALLBACK", "1") == "1"  # load the model in-process if no server
+
+SAMPLE_RATE = 16000
+
+
+class Job:
+    def __init__(self, path: str, language: Optional[str], word_timestamps: bool):
+        self.path = path
+        self.language = language
+        self.word_timestamps = word_timestamps
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.requests = 1  # identical requests sharing this job
+
+    @property
+    def key(self):
+        return (self.path, self.language, self.word_timestamps)
+
+
+class Transcriber:
+    """A warm faster-whisper model behind a job queue."""
+
+    def __init__(self, model_size: str = MODEL_SIZE, device: str = DEVICE, compute_type: str = COMPUTE_TYPE,
+                 workers: int = WORKERS):
+        from faster_whisper import WhisperModel
+        started = time.time()
+        workers = max(1, workers)
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
+        # split the CPU between the workers instead of giving each CTranslate2's default 4 threads
+        self.model = WhisperModel(model_size, device=device, compute_type=compute_type, num_workers=workers,
+                                  cpu_threads=max(1, (os.cpu_count() or 1) // workers))
+        logging.info(f"Whisper '{model_size}' loaded in {time.time() - started:.1f}s ({workers} workers)")
+        self.jobs = queue.Queue()
+        self._inflight = {}  # job key -> Job, queued or running
+        self._inflight_lock = threading.Lock()
+        self._stats = {"jobs": 0, "passes": 0, "failures": 0, "audio_seconds": 0.0, "busy_seconds": 0.0}
+        self._stats_lock = threading.Lock()
+        for i in range(workers):
+            threading.Thread(target=self._worker, daemon=True, name=f"whisper-{i}").start()
+
+    @property
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, **amounts):
+        with self._stats_lock:
+            for name, n in amounts.items():
+                self._stats[name] += n
+
+    def transcribe(self, path: str, language: Optional[str] = DEFAULT_LANGUAGE, word_timestamps: bool = True,
+                   workspace: bool = True) -> dict:
+        """Cached result for this audio content if there is one, otherwise queue it for the model."""
+        cached = transcript_cache.get(path, self.model_size, self.compute_type, language, word_timestamps, workspace)
+        if cached is not None:
+            return cached
+        new = Job(str(path), language, word_timestamps)
+        with self._inflight_lock:
+            job = self._inflight.setdefault(new.key, new)
+            if job is new:
+                self.jobs.put(job)
+            else:
+                job.requests += 1
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        if job is new:
+            transcript_cache.put(path, self.model_size, self.compute_type, language, job.result, word_timestamps,
+                                 workspace)
+        return job.result
+
+    def _worker(self):
+        while True:
+            self._run(self.jobs.get())
+
+    def _run(self, job: Job):
+        """Transcribe one file; an error fails this job (and the requests sharing it) only."""
+        from faster_whisper import decode_audio
+        started = time.time()
+        result, error, audio_seconds = None, None, 0.0
+        try:
+            audio = decode_audio(job.path, sampling_rate=SAMPLE_RATE)
+            audio_seconds = len(audio) / SAMPLE_RATE
+            result = self._transcribe_one(audio, job.language, job.word_timestamps)
+        except Exception as e:
+            logging.error(f"Transcription of {job.path} failed: {e}")
+            error = e
+        with self._inflight_lock:
+            del self._inflight[job.key]
+            job.result, job.error = result, error
+            requests = job.requests
+        self._count(jobs=requests, passes=1, failures=int(error is not None), audio_seconds=audio_seconds,
+                    busy_seconds=time.time() - started)
+        job.done.set()
+
+    def _transcribe_one(self, audio: np.ndarray, language, word_ts) -> dict:
+        segments, info = self.model.transcribe(audio, language=language, word_timestamps=word_ts)
+        segments = [_segment_dict(s) for s in segments]
+        return _result(segments, info.language, len(audio) / SAMPLE_RATE)
+
+
+def _segment_dict(seg) -> dict:
+    return {
+        "start": seg.start,
+        "end": seg.end,
+        "text": seg.text,
+        "words": [{"word": w.word, "start": w.start, "end": w.end, "probability": w.probability}
+                  for w in (seg.words or [])],
+    }
+
+
+def _result(segments: list, language: str, duration: float) -> dict:
+    return {"language": language, "duration": duration, "text": "".join(s["text"] for s in segments).strip(),
+            "segments": segments}
+
+
+# --- server ---
+
+class _Handler(BaseHTTPRequestHandler):
+    transcriber: Transcriber = None
+
+    def _send(self, code: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            return self._send(404, {"error": "not found"})
+        t = self.transcriber
+        self._send(200, {"model": t.model_size, "device": t.device, "compute_type": t.compute_type,
+                         "queued": t.jobs.qsize(), **t.stats})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/transcribe":
+            return self._send(404, {"error": "not found"})
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        tmp = None
+        try:
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                req = json.loads(body or b"{}")
+                path = req["path"]
+                if not os.path.exists(path):
+                    return self._send(404, {"error": f"file not visible to the server: {path}"})
+            else:
+                # raw audio upload
+                req = {k: v[0] for k, v in parse_qs(url.query).items()}
+                req["word_timestamps"] = req.get("word_timestamps", "1") not in ("0", "false")
+                fd, tmp = tempfile.mkstemp(suffix=req.get("suffix", ".audio"))
+                with os.fdopen(fd, "wb") as f:
+                    f.write(body)
+                path = tmp
+            result = self.transcriber.transcribe(path, req.get("language") or DEFAULT_LANGUAGE,
+                                                 bool(req.get("word_timestamps", True)), workspace=tmp is None)
+            self._send(200, result)
+        except Exception as e:
+            logging.error(f"Transcription failed: {e}", exc_info=True)
+            self._send(500, {"error": str(e)})
+        finally:
+            if tmp:
+                os.remove(tmp)
+
+    def log_message(self, fmt, *args):
+        logging.debug(fmt % args)
+
+
+def serve(host: str = HOST, port: int = PORT, transcriber: Optional[Transcriber] = None):
+    _Handler.transcriber = transcriber or Transcriber()
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    logging.info(f"Transcription server listening on http://{host}:{port}")
+    server.serve_forever()
+
+
+# --- client ---
+
+_local = None
+_local_lock = threading.Lock()
+
+
+def _local_transcriber() -> Transcriber:
+    global _local
+    with _local_lock:
+        if _local is None:
+            logging.warning(f"No transcription server at {TRANSCRIBE_URL}; loading Whisper in this process")
+            _local = Transcriber()
+    return _local
+
+
+def transcribe(path, language: Optional[str] = DEFAULT_LANGUAGE, word_timestamps: bool = True,
+               url: str = TRANSCRIBE_URL) -> dict:
+    """Transcribe through the local server (falls back to an in-process model when it isn't running)."""
+    path = os.path.abspath(str(path))
+    payload = {"path": path, "language": language, "word_timestamps": word_timestamps}
+    try:
+        r = http_client.post(f"{url}/transcribe", json=payload, max_retries=1, provider=False,
+                             timeout=http_client.LONG_TIMEOUT)
+        if r.status_code == 404:
+            # server runs in another container/host: send the audio itself
+            with open(path, "rb") as f:
+                params = {"language": language or "", "word_timestamps": int(word_timestamps),
+                          "suffix": os.path.splitext(path)[1]}
+                r = http_client.post(f"{url}/transcribe", data=f, params=params, max_retries=1, provider=False,
+                                     headers={"Content-Type": "application/octet-stream"},
+                                     timeout=http_client.LONG_TIMEOUT)
+    except http_client.requests.ConnectionError:
+        if not LOCAL_FALLBACK:
+            raise
+        # a cached narration doesn't need the model loaded at all
+        cached = transcript_cache.get(path, MODEL_SIZE, COMPUTE_TYPE, language, word_timestamps)
+        if cached is not None:
+            return cached
+        return _local_transcriber().transcribe(path, language, word_timestamps)
+    if r.status_code != 200:
+        raise Exception(f"Transcription error {r.status_code}: {r.text[:300]}")
+    return r.json()
+
+
+def word_timestamps(path, language: Optional[str] = DEFAULT_LANGUAGE) -> List[dict]:
+    """[{'word', 'start', 'end'}, ...] for the whole file."""
+    result = transcribe(path, language, word_timestamps=True)
+    return [{"word": w["word"], "start": w["start"], "end": w["end"]}
+            for seg in result["segments"] for w in seg["words"]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Whisper transcriptions on localhost.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--model", default=MODEL_SIZE)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    serve(args.host, args.port, Transcriber(args.model, workers=args.workers))
@@ -0,0 +1,169 @@
+"""
+transcript_cache.py
+
+Cache of Whisper results keyed by audio content, so re-captioning a narration we
+have already transcribed (reruns of a workspace, caption style changes, re-exports)
+is a lookup instead of a model pass.
+
+- Key: sha1 of the audio bytes + model + compute type + language (+ whether word
+  timestamps were asked for); renamed or copied files still hit
+- Workspace copy: <audio dir>/_transcripts/<key>.json, next to the audio it describes
+- Global store: zlib-compressed JSON in SQLite under TRANSCRIPT_CACHE_DIR, least
+  recently used entries evicted past TRANSCRIPT_CACHE_MAX_MB
+- A global hit is copied back into the workspace
+
+Usage:
+    result = transcript_cache.get(path, model, compute_type, language)
+    if result is None:
+        result = <transcribe>
+        transcript_cache.put(path, model, compute_type, language, result)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from clip_library import sha1_file
+
+CACHE_DIR = Path(os.getenv("TRANSCRIPT_CACHE_DIR", "/generated_audio/.transcript_cache"))
+DB_PATH = CACHE_DIR / "transcripts.sqlite3"
+MAX_BYTES = int(float(os.getenv("TRANSCRIPT_CACHE_MAX_MB", "256")) * 1024 * 1024)
+WORKSPACE_DIR = "_transcripts"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    key          TEXT PRIMARY KEY,
+    audio_sha1   TEXT NOT NULL,
+    model        TEXT NOT NULL,
+    compute_type TEXT NOT NULL,
+    language     TEXT NOT NULL,
+    result       BLOB NOT NULL,
+    size_bytes   INTEGER NOT NULL,
+    created_at   REAL NOT NULL,
+    accessed_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transcripts_accessed ON transcripts(accessed_at);
+"""
+
+_stats = {"workspace_hits": 0, "global_hits": 0, "misses": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def make_key(audio_sha1: str, model: str, compute_type: str, language: Optional[str],
+             word_timestamps: bool = True) -> str:
+    parts = [audio_sha1, model, compute_type, language or "auto", "words" if word_timestamps else "segments"]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _workspace_path(audio_path, key: str) -> Path:
+    return Path(audio_path).parent / WORKSPACE_DIR / f"{key}.json"
+
+
+def _write_workspace(audio_path, key: str, result: dict):
+    path = _workspace_path(audio_path, key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(result), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError as e:
+        logging.warning(f"Workspace transcript not written: {e}")
+
+
+def _connect() -> sqlite3.Connection:
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(DB_PATH), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def get(audio_path, model: str, compute_type: str, language: Optional[str], word_timestamps: bool = True,
+        workspace: bool = True) -> Optional[dict]:
+    """Cached result for this audio content and settings, or None."""
+    key = make_key(sha1_file(Path(audio_path)), model, compute_type, language, word_timestamps)
+    if workspace:
+        try:
+            result = json.loads(_workspace_path(audio_path, key).read_text(encoding="utf-8"))
+            _count("workspace_hits")
+            return result
+        except (OSError, ValueError):
+            pass
+    try:
+        conn = _connect()
+    except sqlite3.Error as e:
+        logging.warning(f"Transcript cache unavailable: {e}")
+        _count("misses")
+        return None
+    try:
+        row = conn.execute("SELECT result FROM transcripts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            _count("misses")
+            return None
+        with conn:
+            conn.execute("UPDATE transcripts SET accessed_at = ? WHERE key = ?", (time.time(), key))
+    finally:
+        conn.close()
+    result = json.loads(zlib.decompress(row[0]))
+    _count("global_hits")
+    if workspace:
+        _write_workspace(audio_path, key, result)
+    return result
+
+
+def put(audio_path, model: str, compute_type: str, language: Optional[str], result: dict,
+        word_timestamps: bool = True, workspace: bool = True):
+    """Store a fresh result in the workspace and the global store, evicting LRU entries past MAX_BYTES."""
+    sha1 = sha1_file(Path(audio_path))
+    key = make_key(sha1, model, compute_type, language, word_timestamps)
+    if workspace:
+        _write_workspace(audio_path, key, result)
+    blob = zlib.compress(json.dumps(result, separators=(",", ":")).encode("utf-8"), 6)
+    now = time.time()
+    try:
+        conn = _connect()
+    except sqlite3.Error as e:
+        logging.warning(f"Transcript cache unavailable: {e}")
+        return
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO transcripts (key, audio_sha1, model, compute_type, language, result, "
+                "size_bytes, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, sha1, model, compute_type, language or "auto", blob, len(blob), now, now),
+            )
+        _evict(conn)
+    finally:
+        conn.close()
+
+
+def _evict(conn: sqlite3.Connection):
+    total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM transcripts").fetchone()[0]
+    if total <= MAX_BYTES:
+        return
+    victims = []
+    for key, size in conn.execute("SELECT key, size_bytes FROM transcripts ORDER BY accessed_at"):
+        if total <= MAX_BYTES:
+            break
+        victims.append((key,))
+        total -= size
+    with conn:
+        conn.executemany("DELETE FROM transcripts WHERE key = ?", victims)
+    _count("evictions", len(victims))
@@ -0,0 +1,230 @@
+"""
+tts_cache.py
+
+Content-addressed cache for synthesized speech, shared by every TTS backend
+(ElevenLabs, Gemini, Chatterbox, gTTS).
+
+- Key: provider + voice + model + normalized text + voice settings + output format,
+  so reruns of a workspace and recurring lines (intros, CTAs) never hit the API twice
+- Encoded audio is stored once under TTS_CACHE_DIR/<key[:2]>/<key>.<ext> with its
+  duration and optional backend metadata (e.g. character alignment); hits are
+  copied to the requested output path
+- Size-bounded: least recently used entries are evicted past TTS_CACHE_MAX_MB
+- stats() exposes hit/miss/eviction counters and the API seconds saved for this process
+
+Usage:
+    tts_cache.cached_synthesis("elevenlabs", voice_id, model_id, text, settings, "1.mp3",
+                               lambda path: <call the API and write `path`>)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+import unicodedata
+import wave
+from pathlib import Path
+from typing import Callable, Optional
+
+CACHE_DIR = Path(os.getenv("TTS_CACHE_DIR", "/generated_audio/.tts_cache"))
+DB_PATH = CACHE_DIR / "tts_cache.sqlite3"
+MAX_BYTES = int(float(os.getenv("TTS_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tts_audio (
+    key         TEXT PRIMARY KEY,
+    provider    TEXT NOT NULL,
+    voice       TEXT,
+    model       TEXT,
+    text        TEXT NOT NULL,
+    format      TEXT NOT NULL,
+    path        TEXT NOT NULL,
+    size_bytes  INTEGER NOT NULL,
+    duration    REAL,
+    synth_seconds REAL,
+    meta        TEXT,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tts_audio_accessed ON tts_audio(accessed_at);
+"""
+
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "seconds_saved": 0.0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def stats() -> dict:
+    """Hit/miss counters for this process, plus the hit rate."""
+    with _stats_lock:
+        out = dict(_stats)
+    lookups = out["hits"] + out["misses"]
+    out["hit_rate"] = out["hits"] / lookups if lookups else 0.0
+    return out
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and collapse whitespace; case and punctuation are kept since they change delivery."""
+    text = unicodedata.normalize("NFC", str(text))
+    text = text.replace("’", "'").replace("‘", "'").replace("“", '"').replace("”", '"')
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_key(provider: str, voice, model, text: str, settings: Optional[dict] = None, fmt: str = "mp3") -> str:
+    settings = {k: v for k, v in (settings or {}).items() if v is not None}
+    parts = [provider, str(voice or ""), str(model or ""), normalize_text(text),
+             json.dumps(settings, sort_keys=True), fmt]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _connect() -> sqlite3.Connection:
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(DB_PATH), timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    if "meta" not in {r[1] for r in conn.execute("PRAGMA table_info(tts_audio)")}:
+        conn.execute("ALTER TABLE tts_audio ADD COLUMN meta TEXT")  # caches created before alignments were stored
+    return conn
+
+
+def audio_duration(path) -> Optional[float]:
+    """Duration in seconds: WAV headers are read directly, anything else goes through ffprobe."""
+    path = str(path)
+    if path.endswith(".wav"):
+        try:
+            with wave.open(path, "rb") as w:
+                return w.getnframes() / float(w.getframerate())
+        except (wave.Error, EOFError):
+            pass
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        )
+        return float(result.stdout.strip())
+    except (OSError, ValueError):
+        return None
+
+
+def get(key: str, out_path) -> Optional[dict]:
+    """Copy the cached audio to out_path and return its row, or None on miss."""
+    try:
+        conn = _connect()
+    except sqlite3.Error as e:
+        logging.warning(f"TTS cache unavailable: {e}")
+        _count("misses")
+        return None
+    try:
+        row = conn.execute("SELECT * FROM tts_audio WHERE key = ?", (key,)).fetchone()
+        if row is None or not os.path.exists(row["path"]):
+            if row is not None:
+                with conn:
+                    conn.execute("DELETE FROM tts_audio WHERE key = ?", (key,))
+            _count("misses")
+            return None
+        Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(row["path"], out_path)
+        with conn:
+            conn.execute("UPDATE tts_audio SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        _count("hits")
+        _count("seconds_saved", row["synth_seconds"] or 0.0)
+        return dict(row)
+    finally:
+        conn.close()
+
+
+def put(key: str, audio_path, provider: str, voice, model, text: str, fmt: str,
+        duration: Optional[float] = None, synth_seconds: Optional[float] = None,
+        meta: Optional[dict] = None) -> Optional[dict]:
+    """Store a copy of freshly synthesized audio and evict least recently used entries past MAX_BYTES."""
+    blob = CACHE_DIR / key[:2] / f"{key}.{fmt}"
+    try:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp = blob.with_name(blob.name + ".tmp")
+        shutil.copyfile(audio_path, tmp)
+        os.replace(tmp, blob)
+        conn = _connect()
+    except (OSError, sqlite3.Error) as e:
+        logging.warning(f"TTS cache unavailable: {e}")
+        return None
+    if duration is None:
+        duration = audio_duration(blob)
+    now = time.time()
+    row = {
+        "key": key, "provider": provider, "voice": voice, "model": model, "text": normalize_text(text),
+        "format": fmt, "path": str(blob), "size_bytes": blob.stat().st_size, "duration": duration,
+        "synth_seconds": synth_seconds, "meta": json.dumps(meta) if meta is not None else None,
+        "created_at": now, "accessed_at": now,
+    }
+    try:
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO tts_audio ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                tuple(row.values()),
+            )
+        _evict(conn)
+    finally:
+        conn.close()
+    return row
+
+
+def _evict(conn: sqlite3.Connection):
+    total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM tts_audio").fetchone()[0]
+    if total <= MAX_BYTES:
+        return
+    victims = []
+    for row in conn.execute("SELECT key, path, size_bytes FROM tts_audio ORDER BY accessed_at"):
+        if total <= MAX_BYTES:
+            break
+        victims.append(row)
+        total -= row["size_bytes"]
+    with conn:
+        conn.executemany("DELETE FROM tts_audio WHERE key = ?", [(v["key"],) for v in victims])
+    for v in victims:
+        Path(v["path"]).unlink(missing_ok=True)
+    _count("evictions", len(victims))
+
+
+def cached_synthesis(provider: str, voice, model, text: str, settings: Optional[dict], out_path,
+                     synthesize: Callable[[str], None], fmt: Optional[str] = None,
+                     cache_only: bool = False) -> Optional[dict]:
+    """
+    Write speech for `text` to out_path, from the cache when possible.
+
+    `synthesize(out_path)` is only called on a miss and must write the audio file (or
+    raise); it may return the duration in seconds when it already knows it, or a dict
+    {"duration", "meta"} where meta is any JSON-able data to keep with the audio.
+    Returns {"path", "duration", "cached", "meta"}; with cache_only a miss returns None
+    instead of synthesizing.
+    """
+    out_path = str(out_path)
+    fmt = fmt or Path(out_path).suffix.lstrip(".") or "mp3"
+    key = make_key(provider, voice, model, text, settings, fmt)
+    row = get(key, out_path)
+    if row is not None:
+        meta = json.loads(row["meta"]) if row.get("meta") else None
+        return {"path": out_path, "duration": row["duration"], "cached": True, "meta": meta}
+    if cache_only:
+        return None
+
+    started = time.time()
+    result = synthesize(out_path)
+    elapsed = time.time() - started
+    meta = None
+    if isinstance(result, dict):
+        duration, meta = result.get("duration"), result.get("meta")
+    else:
+        duration = result if isinstance(result, (int, float)) else None
+    row = put(key, out_path, provider, voice, model, text, fmt, duration=duration, synth_seconds=elapsed, meta=meta)
+    return {"path": out_path, "duration": row["duration"] if row else duration, "cached": False, "meta": meta}
@@ -0,0 +1,309 @@
+"""
+tts_hedge.py
+
+Hedged TTS dispatch with provider failover, to cut tail latency.
+
+The primary provider gets the request first. If it hasn't answered within its
+learned latency percentile (TTS_HEDGE_PERCENTILE of its recent history), the same
+line is sent to the next provider and whichever finishes first wins; a provider
+that fails outright hands over immediately. The slower request is left to finish in
+the background, its latency still recorded and its output discarded.
+
+- A line the primary already has in tts_cache is copied straight from the cache:
+  no hedge, and no latency sample (a cache copy says nothing about the provider)
+- Each request holds its provider's tts_stage slot, so hedged requests count
+  against the same per-provider caps as everything else
+- In-flight output goes to <audio dir>/_hedge/, out of sight of the {i}.<ext>
+  listings that assemble the video and captions
+
+Latency histograms are persisted per provider in SQLite (log-spaced buckets with
+exponential decay, so they follow drift), and shared by every process.
+
+Usage:
+    tts_hedge.hedged_synthesis(text, "1.mp3", [
+        ("elevenlabs", generate_audio_elevenlabs, "mp3"),
+        tts_hedge.PROVIDERS["gemini"],
+    ])
+
+A provider's synth(text, path, cache_only=False) writes `path` and returns the
+tts_cache.cached_synthesis result (or None when cache_only misses).
+"""
+
+import logging
+import math
+import os
+import queue
+import sqlite3
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import tts_cache
+import tts_stage
+import word_timings
+
+DB_PATH = Path(os.getenv("TTS_LATENCY_DB", str(tts_cache.CACHE_DIR / "tts_latency.sqlite3")))
+HEDGE_PERCENTILE = float(os.getenv("TTS_HEDGE_PERCENTILE", "0.9"))
+DEFAULT_HEDGE_SECONDS = float(os.getenv("TTS_HEDGE_DEFAULT_SECONDS", "8"))  # until a provider has history
+MIN_SAMPLES = 20
+TMP_DIR = "_hedge"
+DECAY = 0.995  # weight of the existing histogram per new observation (~200-sample memory)
+
+# bucket upper bounds: 0.25s .. ~150s, 25% apart
+BUCKETS = [round(0.25 * 1.25 ** i, 3) for i in range(29)]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS latency_histogram (
+    provider TEXT NOT NULL,
+    bucket   INTEGER NOT NULL,
+    weight   REAL NOT NULL,
+    PRIMARY KEY (provider, bucket)
+);
+CREATE TABLE IF NOT EXISTS latency_totals (
+    provider    TEXT PRIMARY KEY,
+    samples     INTEGER NOT NULL,
+    failures    INTEGER NOT NULL,
+    hedges      INTEGER NOT NULL,
+    hedge_wins  INTEGER NOT NULL
+);
+"""
+
+Provider = Tuple[str, Callable[..., Optional[dict]], str]  # (name, synth(text, path, cache_only), file extension)
+
+
+def _connect() -> sqlite3.Connection:
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(DB_PATH), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _bucket(seconds: float) -> int:
+    for i, upper in enumerate(BUCKETS):
+        if seconds <= upper:
+            return i
+    return len(BUCKETS) - 1
+
+
+def _bump(conn: sqlite3.Connection, provider: str, **counts):
+    conn.execute("INSERT OR IGNORE INTO latency_totals VALUES (?, 0, 0, 0, 0)", (provider,))
+    for column, n in counts.items():
+        conn.execute(f"UPDATE latency_totals SET {column} = {column} + ? WHERE provider = ?", (n, provider))
+
+
+def record(provider: str, seconds: Optional[float], ok: bool = True):
+    """Add one observation; failures only count towards the failure total."""
+    try:
+        conn = _connect()
+    except sqlite3.Error as e:
+        logging.warning(f"TTS latency history unavailable: {e}")
+        return
+    try:
+        with conn:
+            if ok:
+                conn.execute("UPDATE latency_histogram SET weight = weight * ? WHERE provider = ?", (DECAY, provider))
+                conn.execute(
+                    "INSERT INTO latency_histogram (provider, bucket, weight) VALUES (?, ?, 1.0) "
+                    "ON CONFLICT(provider, bucket) DO UPDATE SET weight = weight + 1.0",
+                    (provider, _bucket(seconds)),
+                )
+                _bump(conn, provider, samples=1)
+            else:
+                _bump(conn, provider, failures=1)
+    finally:
+        conn.close()
+
+
+def record_hedge(provider: str, won: bool):
+    try:
+        conn = _connect()
+        try:
+            with conn:
+                _bump(conn, provider, hedges=1, hedge_wins=int(won))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logging.warning(f"TTS latency history unavailable: {e}")
+
+
+def percentile(provider: str, q: float = HEDGE_PERCENTILE) -> Optional[float]:
+    """Latency (bucket upper bound) below which a fraction q of recent requests finished, or None without history."""
+    try:
+        conn = _connect()
+    except sqlite3.Error:
+        return None
+    try:
+        totals = conn.execute("SELECT samples FROM latency_totals WHERE provider = ?", (provider,)).fetchone()
+        if not totals or totals[0] < MIN_SAMPLES:
+            return None
+        rows = conn.execute("SELECT bucket, weight FROM latency_histogram WHERE provider = ? ORDER BY bucket",
+                            (provider,)).fetchall()
+    finally:
+        conn.close()
+    total = sum(w for _, w in rows)
+    running = 0.0
+    for bucket, weight in rows:
+        running += weight
+        if running >= q * total - 1e-9:
+            return BUCKETS[bucket]
+    return BUCKETS[rows[-1][0]] if rows else None
+
+
+def hedge_delay(provider: str, q: float = HEDGE_PERCENTILE) -> float:
+    learned = percentile(provider, q)
+    return learned if learned is not None else DEFAULT_HEDGE_SECONDS
+
+
+def stats() -> dict:
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT * FROM latency_totals").fetchall()
+    finally:
+        conn.close()
+    return {
+        r[0]: {"samples": r[1], "failures": r[2], "hedges": r[3], "hedge_wins": r[4],
+               "p50": percentile(r[0], 0.5), "p90": percentile(r[0], 0.9), "p99": percentile(r[0], 0.99)}
+        for r in rows
+    }
+
+
+def _convert(src: str, dest: str):
+    if Path(src).suffix == Path(dest).suffix:
+        os.replace(src, dest)
+        return
+    codec = ["-c:a", "libmp3lame", "-q:a", "2"] if dest.endswith(".mp3") else []
+    try:
+        subprocess.run(["ffmpeg", "-y", "-v", "error", "-i", src, *codec, dest], check=True)
+    finally:
+        Path(src).unlink(missing_ok=True)
+
+
+def _cached(result) -> bool:
+    return isinstance(result, dict) and bool(result.get("cached"))
+
+
+def hedged_synthesis(text: str, out_path, providers: List[Provider], q: float = HEDGE_PERCENTILE) -> dict:
+    """
+    Synthesize `text` to out_path with the first provider, hedging to the next ones
+    when it is slower than its q-th latency percentile or fails.
+
+    Returns {"path", "provider", "seconds", "hedged", "cached"}; raises if every provider failed.
+    """
+    out_path = str(out_path)
+    started = time.time()
+    tmp_dir = Path(out_path).parent / TMP_DIR
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def tmp_path(name, ext):
+        return str(tmp_dir / f"{Path(out_path).stem}.{name}.{threading.get_ident()}.{ext}")
+
+    name, synth, ext = providers[0]
+    tmp = tmp_path(name, ext)
+    if _cached(synth(text, tmp, cache_only=True)):
+        _convert(tmp, out_path)
+        word_timings.move(tmp, out_path)
+        logging.info(f"TTS {os.path.basename(out_path)} from the {name} cache")
+        return {"path": out_path, "provider": name, "seconds": time.time() - started, "hedged": False,
+                "cached": True}
+
+    results = queue.Queue()
+    state = {"winner": None}
+    lock = threading.Lock()
+
+    def run(name, synth, ext):
+        tmp = tmp_path(name, ext)
+        result, error = None, None
+        with tts_stage.provider_slot(name):
+            t0 = time.time()
+            try:
+                result = synth(text, tmp)
+            except Exception as e:
+                error = e
+            elapsed = time.time() - t0
+        if not _cached(result):
+            record(name, elapsed, ok=error is None)
+        with lock:
+            if state["winner"] is not None:
+                # lost the race: nobody will read this result
+                Path(tmp).unlink(missing_ok=True)
+                word_timings.discard(tmp)
+                return
+            results.put((name, tmp, error, elapsed))
+
+    pending = list(providers)
+    launched = []
+
+    def launch():
+        name, synth, ext = pending.pop(0)
+        launched.append(name)
+        threading.Thread(target=run, args=(name, synth, ext), daemon=True, name=f"tts-hedge-{name}").start()
+        return time.time() + hedge_delay(name, q)
+
+    hedge_at = launch()
+    errors = {}
+    while len(errors) < len(launched) or pending:
+        timeout = max(0.0, hedge_at - time.time()) if pending else None
+        try:
+            name, tmp, error, elapsed = results.get(timeout=timeout)
+        except queue.Empty:
+            logging.info(f"TTS {launched[-1]} slower than its p{int(q * 100)} for {os.path.basename(out_path)}; "
+                         f"hedging with {pending[0][0]}")
+            hedge_at = launch()
+            continue
+        if error is not None:
+            errors[name] = error
+            logging.info(f"TTS {name} failed for {os.path.basename(out_path)}: {error}")
+            Path(tmp).unlink(missing_ok=True)
+            word_timings.discard(tmp)
+            if pending and len(errors) == len(launched):
+                hedge_at = launch()  # nothing else in flight: fail over right away
+            continue
+
+        with lock:
+            state["winner"] = name
+            # drop results that finished in the meantime
+            while not results.empty():
+                loser = results.get()[1]
+                Path(loser).unlink(missing_ok=True)
+                word_timings.discard(loser)
+        _convert(tmp, out_path)
+        word_timings.move(tmp, out_path)
+        hedged = len(launched) > 1
+        if hedged:
+            for other in launched:
+                record_hedge(other, won=other == name)
+        logging.info(f"TTS {os.path.basename(out_path)} from {name} in {time.time() - started:.2f}s"
+                     + (f" (hedged across {', '.join(launched)})" if hedged else ""))
+        return {"path": out_path, "provider": name, "seconds": time.time() - started, "hedged": hedged,
+                "cached": False}
+
+    raise Exception(f"All TTS providers failed for {out_path}: "
+                    + "; ".join(f"{n}: {e}" for n, e in errors.items()))
+
+
+# --- secondary providers ---
+
+def gemini_synth(text: str, path: str, cache_only: bool = False) -> Optional[dict]:
+    import GoogleAiTTS
+    kwargs = {"text": text, "output_audio_path": os.path.dirname(path) or ".", "filename": Path(path).stem}
+    if GoogleAiTTS.generate_tts(cache_only=True, **kwargs):
+        return {"path": path, "cached": True}
+    if cache_only:
+        return None
+    GoogleAiTTS.generate_tts(**kwargs)
+    return {"path": path, "cached": False}
+
+
+def gtts_synth(text: str, path: str, cache_only: bool = False) -> Optional[dict]:
+    from gtts import gTTS
+    return tts_cache.cached_synthesis("gtts", "en", None, text, {"slow": False}, path,
+                                      lambda p: gTTS(text, lang="en", slow=False).save(p), cache_only=cache_only)
+
+
+PROVIDERS = {
+    "gemini": ("gemini", gemini_synth, "wav"),
+    "gtts": ("gtts", gtts_synth, "mp3"),
+}
@@ -0,0 +1,209 @@
+"""
+tts_script.py
+
+Whole-script TTS: the full narration is synthesized in one request and split back
+into per-segment {i}.mp3 files, so create_video_from_videos sees the same contract
+as with per-segment TTS.
+
+- One round trip instead of N, and the voice keeps its prosody across segment
+  boundaries
+- Cut points come from the provider's character alignment (ElevenLabs
+  /with-timestamps): the midpoint between the last character of a segment and the
+  first character of the next one
+- Without an alignment the cut points come from silence detection on the decoded
+  waveform: the pause closest to where each boundary is expected by character count
+- Splitting is one ffmpeg pass (segment muxer); MP3 sources are cut without re-encoding
+
+The full-script audio is kept in <out_dir>/_script/ so the numbered files stay the
+only .mp3 files in the segment folder.
+
+Usage:
+    paths = tts_script.synthesize_script_elevenlabs(texts, audio_folder, voice_id, api_key)
+"""
+
+import base64
+import json
+import logging
+import os
+import subprocess
+import wave
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import http_client
+import tts_cache
+import word_timings
+
+SEGMENT_JOINER = "\n\n"  # paragraph break between segments: a natural pause for the voice and the splitter
+ELEVENLABS_TIMESTAMPS_URL = "https://api.elevenlabs.io/v1/text-to-speech/{voice_id}/with-timestamps"
+
+ANALYSIS_RATE = 16000
+FRAME_SECONDS = 0.02
+MIN_SILENCE_SECONDS = 0.15
+
+
+def segment_spans(texts: List[str], joiner: str = SEGMENT_JOINER) -> List[tuple]:
+    """(start, end) character offsets of each segment inside joiner.join(texts)."""
+    spans, pos = [], 0
+    for text in texts:
+        spans.append((pos, pos + len(text)))
+        pos += len(text) + len(joiner)
+    return spans
+
+
+def cuts_from_alignment(alignment: dict, texts: List[str], joiner: str = SEGMENT_JOINER) -> List[float]:
+    """Boundary times (len(texts) - 1) from a character alignment of joiner.join(texts)."""
+    chars = alignment["characters"]
+    starts = alignment["character_start_times_seconds"]
+    ends = alignment["character_end_times_seconds"]
+    full = joiner.join(texts)
+    if "".join(chars) != full:
+        raise ValueError("alignment characters don't match the synthesized text")
+    cuts = []
+    spans = segment_spans(texts, joiner)
+    for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+        last = end - 1
+        while last > start and full[last].isspace():
+            last -= 1
+        first = next_start
+        while first < next_end - 1 and full[first].isspace():
+            first += 1
+        cuts.append((ends[last] + starts[first]) / 2)
+    return cuts
+
+
+def decode_mono(path, rate: int = ANALYSIS_RATE) -> tuple:
+    """(samples float32 in [-1, 1], sample_rate). 16-bit WAV is read directly, anything else via ffmpeg."""
+    path = str(path)
+    if path.endswith(".wav"):
+        with wave.open(path, "rb") as w:
+            if w.getsampwidth() == 2:
+                frames = np.frombuffer(w.readframes(w.getnframes()), dtype="<i2").astype(np.float32) / 32768
+                return frames.reshape(-1, w.getnchannels()).mean(axis=1), w.getframerate()
+    result = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", path, "-f", "s16le", "-ac", "1", "-ar", str(rate), "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True,
+    )
+    return np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 32768, rate
+
+
+def cuts_from_silence(samples: np.ndarray, rate: int, texts: List[str]) -> List[float]:
+    """
+    Boundary times (len(texts) - 1) at detected pauses. Each boundary takes the pause
+    nearest to its expected position (proportional to the characters spoken before it).
+    """
+    frame = max(1, int(rate * FRAME_SECONDS))
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        raise ValueError("audio too short to split")
+    rms = np.sqrt(np.mean(samples[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1))
+    threshold = max(np.percentile(rms, 10) * 2, rms.max() * 0.02)
+    silent = rms < threshold
+
+    # centers of silent runs long enough to be a pause between sentences
+    pauses = []
+    run_start = None
+    for i, s in enumerate(np.append(silent, False)):
+        if s and run_start is None:
+            run_start = i
+        elif not s and run_start is not None:
+            if (i - run_start) * FRAME_SECONDS >= MIN_SILENCE_SECONDS and run_start > 0 and i < n_frames:
+                pauses.append((run_start + i) / 2 * FRAME_SECONDS)
+            run_start = None
+
+    total = n_frames * FRAME_SECONDS
+    lengths = np.cumsum([max(1, len(t)) for t in texts])
+    cuts, previous = [], 0.0
+    for k in range(len(texts) - 1):
+        expected = total * lengths[k] / lengths[-1]
+        candidates = [p for p in pauses if p > previous]
+        cut = min(candidates, key=lambda p: abs(p - expected)) if candidates else expected
+        if candidates and abs(cut - expected) > total / len(texts):
+            cut = expected  # nearest pause is a whole segment away: trust the character estimate
+        cut = max(cut, previous + FRAME_SECONDS)
+        cuts.append(cut)
+        previous = cut
+    return cuts
+
+
+def split_audio(path, cuts: List[float], out_dir, ext: str = "mp3") -> Dict[int, str]:
+    """Split `path` at `cuts` into out_dir/{1..len(cuts)+1}.<ext> with one ffmpeg pass."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    codec = ["-c", "copy"] if Path(path).suffix.lstrip(".") == ext else ["-c:a", "libmp3lame", "-q:a", "2"]
+    cmd = ["ffmpeg", "-y", "-v", "error", "-i", str(path), "-map", "0:a", *codec, "-f", "segment",
+           "-segment_start_number", "1", "-reset_timestamps", "1"]
+    if cuts:
+        cmd += ["-segment_times", ",".join(f"{c:.3f}" for c in cuts)]
+    else:
+        cmd += ["-segment_time", "1000000"]
+    cmd.append(str(out_dir / f"%d.{ext}"))
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    paths = {i: str(out_dir / f"{i}.{ext}") for i in range(1, len(cuts) + 2)}
+    missing = [i for i, p in paths.items() if not os.path.exists(p)]
+    if missing:
+        raise RuntimeError(f"Splitting {path} produced no audio for segments {missing}")
+    return paths
+
+
+def elevenlabs_with_timestamps(text: str, path: str, voice_id: str, api_key: str,
+                               model_id: str = "eleven_multilingual_v2", voice_settings: Optional[dict] = None) -> dict:
+    """Synthesize `text` to path (MP3) and return ElevenLabs' character alignment."""
+    headers = {"Content-Type": "application/json", "xi-api-key": api_key}
+    payload = {"text": text, "model_id": model_id}
+    if voice_settings:
+        payload["voice_settings"] = voice_settings
+    response = http_client.post(ELEVENLABS_TIMESTAMPS_URL.format(voice_id=voice_id), headers=headers, json=payload,
+                                timeout=http_client.LONG_TIMEOUT)
+    if response.status_code != 200:
+        raise Exception(f"ElevenLabs TTS error {response.status_code}: {response.text}")
+    data = response.json()
+    with open(path, "wb") as f:
+        f.write(base64.b64decode(data["audio_base64"]))
+    return data.get("alignment") or {}
+
+
+def split_script_audio(script_path, texts: List[str], out_dir, alignment: Optional[dict] = None) -> Dict[int, str]:
+    """Split whole-script audio into out_dir/{i}.mp3, by alignment when usable, otherwise by silence."""
+    cuts = [] if len(texts) == 1 else None
+    if alignment and cuts is None:
+        try:
+            cuts = cuts_from_alignment(alignment, texts)
+            logging.info(f"Splitting script audio at alignment boundaries: {[round(c, 2) for c in cuts]}")
+        except (KeyError, IndexError, ValueError) as e:
+            logging.info(f"Alignment unusable ({e}); falling back to silence detection")
+    if cuts is None:
+        samples, rate = decode_mono(script_path)
+        cuts = cuts_from_silence(samples, rate, texts)
+        logging.info(f"Splitting script audio at detected pauses: {[round(c, 2) for c in cuts]}")
+        alignment = None
+    paths = split_audio(script_path, cuts, out_dir)
+    # per-segment alignments for captions, on each segment's own clock
+    for i, (start, end) in enumerate(segment_spans(texts), start=1):
+        if alignment:
+            offset = cuts[i - 2] if i > 1 else 0.0
+            word_timings.save(paths[i], word_timings.slice_alignment(alignment, start, end, offset), "elevenlabs")
+        else:
+            word_timings.discard(paths[i])
+    return paths
+
+
+def synthesize_script_elevenlabs(texts: List[str], out_dir, voice_id: str, api_key: str,
+                                 model_id: str = "eleven_multilingual_v2",
+                                 voice_settings: Optional[dict] = None) -> Dict[int, str]:
+    """One ElevenLabs request for the whole script, split into out_dir/{i}.mp3. Returns {i: path}."""
+    full_text = SEGMENT_JOINER.join(texts)
+    script_path = Path(out_dir) / "_script" / "script.mp3"
+    script_path.parent.mkdir(parents=True, exist_ok=True)
+
+    def synthesize(path):
+        return {"meta": {"alignment": elevenlabs_with_timestamps(full_text, path, voice_id, api_key, model_id,
+                                                                 voice_settings)}}
+
+    settings = dict(voice_settings or {}, with_timestamps=True)
+    result = tts_cache.cached_synthesis("elevenlabs", voice_id, model_id, full_text, settings, script_path, synthesize)
+    logging.info(f"Whole-script TTS {'cache hit' if result['cached'] else 'synthesized'}: {script_path}")
+    alignment = (result.get("meta") or {}).get("alignment")
+    return split_script_audio(script_path, texts, out_dir, alignment)
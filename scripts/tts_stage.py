@@ -0,0 +1,114 @@
+"""
+tts_stage.py
+
+Concurrent TTS for all segments of a short, capped per provider.
+
+- Every segment request is in flight at once, up to the provider's allowed
+  parallelism (ElevenLabs plans cap concurrent requests, Gemini TTS has tight
+  quotas, local Chatterbox runs one generation at a time on the GPU)
+- The caps are process-wide semaphores, so overlapping stages (e.g. the streaming
+  pipeline and a re-render) share them. A synth that spreads one line over several
+  providers (tts_hedge) takes each provider's slot itself: pass provider=None here
+- Output stays numbered {i}.<ext> in segment order; a failing segment is retried on
+  its own with backoff while the others carry on
+
+Usage:
+    paths = tts_stage.synthesize_segments(texts, audio_folder, generate_audio_elevenlabs, "elevenlabs")
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional
+
+import http_client
+
+PROVIDER_CONCURRENCY = {
+    "elevenlabs": int(os.getenv("TTS_CONCURRENCY_ELEVENLABS", "3")),
+    "gemini": int(os.getenv("TTS_CONCURRENCY_GEMINI", "2")),
+    "chatterbox": int(os.getenv("TTS_CONCURRENCY_CHATTERBOX", "1")),
+}
+DEFAULT_CONCURRENCY = 2
+MAX_ATTEMPTS = int(os.getenv("TTS_MAX_ATTEMPTS", "3"))
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+class TTSStageError(Exception):
+    """Some segments still failed after their retries; `failures` maps segment number -> exception."""
+
+    def __init__(self, failures: Dict[int, Exception], paths: Dict[int, str]):
+        self.failures = failures
+        self.paths = paths
+        super().__init__(f"TTS failed for segments {sorted(failures)}: "
+                         + "; ".join(f"{i}: {e}" for i, e in sorted(failures.items())))
+
+
+def concurrency(provider: str) -> int:
+    return max(1, PROVIDER_CONCURRENCY.get(provider, DEFAULT_CONCURRENCY))
+
+
+def _semaphore(provider: str) -> threading.BoundedSemaphore:
+    with _semaphores_lock:
+        if provider not in _semaphores:
+            _semaphores[provider] = threading.BoundedSemaphore(concurrency(provider))
+        return _semaphores[provider]
+
+
+def provider_slot(provider: Optional[str]):
+    """Context manager holding one of the provider's concurrent-request slots (no cap for None)."""
+    return _semaphore(provider) if provider is not None else nullcontext()
+
+
+def synthesize_one(synth: Callable[[str, str], None], text: str, path: str, provider: Optional[str],
+                   max_attempts: int = MAX_ATTEMPTS):
+    """Run synth(text, path) inside the provider's concurrency cap, retrying this segment alone on failure."""
+    for attempt in range(max_attempts):
+        try:
+            with provider_slot(provider):
+                return synth(text, path)
+        except Exception as e:
+            if attempt == max_attempts - 1:
+                raise
+            delay = http_client.backoff_delay(attempt)
+            logging.info(f"TTS for {os.path.basename(path)} failed ({e}). Retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+def synthesize_segments(texts: List[str], out_dir, synth: Callable[[str, str], None], provider: Optional[str],
+                        ext: str = "mp3", max_attempts: int = MAX_ATTEMPTS,
+                        workers: Optional[int] = None) -> Dict[int, str]:
+    """
+    Synthesize texts[i-1] into out_dir/{i}.<ext> for every segment concurrently.
+    `workers` defaults to the provider's cap.
+
+    Returns {i: path}. Raises TTSStageError once every segment has finished if any of
+    them still failed after max_attempts.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths, failures = {}, {}
+    started = time.time()
+    workers = workers or concurrency(provider)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"tts-{provider or 'mixed'}") as pool:
+        futures = {}
+        for i, text in enumerate(texts, start=1):
+            path = os.path.join(out_dir, f"{i}.{ext}")
+            futures[pool.submit(synthesize_one, synth, text, path, provider, max_attempts)] = (i, path)
+        for future in as_completed(futures):
+            i, path = futures[future]
+            try:
+                future.result()
+                paths[i] = path
+                logging.info(f"Audio {i} generated.")
+            except Exception as e:
+                failures[i] = e
+                logging.info(f"Failed to generate audio for segment {i}: {e}")
+    logging.info(f"TTS for {len(texts)} segments took {time.time() - started:.1f}s "
+                 f"({workers} concurrent {provider or 'TTS'} requests)")
+    if failures:
+        raise TTSStageError(failures, paths)
+    return dict(sorted(paths.items()))
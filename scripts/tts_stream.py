@@ -0,0 +1,193 @@
+"""
+tts_stream.py
+
+Streaming TTS: audio is written to disk as the provider sends it instead of
+buffering the whole response (or one large base64 blob) in memory.
+
+- ElevenLabs: POST /v1/text-to-speech/{voice_id}/stream, chunked MP3, or
+  /stream/with-timestamps, newline-delimited JSON chunks of base64 MP3 plus the
+  character alignment of that chunk; the alignment pieces are joined into one
+  whole-file alignment (word_timings' shape) while the audio goes to disk
+- Gemini: :streamGenerateContent?alt=sse, one base64 PCM chunk per event, decoded
+  and appended as it arrives, wrapped in a WAV container in-process (wave module,
+  no ffmpeg) unless raw PCM is asked for
+- Files are written to <path>.part and renamed when complete, so a crash never
+  leaves a truncated file under the final name
+- Time-to-first-byte is measured and logged per request; on_chunk(bytes) lets a
+  downstream stage (duration probing, ASR) consume audio before the request ends
+
+Memory stays flat regardless of narration length.
+
+Usage:
+    info = tts_stream.elevenlabs_stream(text, "1.mp3", voice_id, api_key)
+    info["ttfb"], info["seconds"], info["bytes"]
+    info = tts_stream.elevenlabs_stream_with_timestamps(text, "1.mp3", voice_id, api_key)
+    info["alignment"]             # {"characters", "character_start_times_seconds", ...}
+"""
+
+import base64
+import json
+import logging
+import os
+import time
+import wave
+from typing import Callable, Iterable, Optional
+
+import http_client
+
+CHUNK_SIZE = 16 * 1024
+GEMINI_PCM = {"rate": 24000, "channels": 1, "sampwidth": 2}  # s16le, 24 kHz mono
+ELEVENLABS_STREAM_URL = "https://api.elevenlabs.io/v1/text-to-speech/{voice_id}/stream"
+ELEVENLABS_STREAM_TIMESTAMPS_URL = "https://api.elevenlabs.io/v1/text-to-speech/{voice_id}/stream/with-timestamps"
+ALIGNMENT_KEYS = ("characters", "character_start_times_seconds", "character_end_times_seconds")
+GEMINI_STREAM_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent"
+
+
+def write_stream(chunks: Iterable[bytes], path: str, started: float,
+                 on_chunk: Optional[Callable[[bytes], None]] = None, wav_params: Optional[dict] = None) -> dict:
+    """
+    Write chunks to path (via path.part) as they arrive; returns {"path", "bytes", "ttfb", "seconds"}.
+    With wav_params ({"rate", "channels", "sampwidth"}) the chunks are PCM frames and go into a WAV container.
+    """
+    part = f"{path}.part"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    ttfb = None
+    size = 0
+    try:
+        with open(part, "wb") as f:
+            out = f
+            if wav_params:
+                out = wave.open(f, "wb")
+                out.setnchannels(wav_params["channels"])
+                out.setsampwidth(wav_params["sampwidth"])
+                out.setframerate(wav_params["rate"])
+            write = out.writeframes if wav_params else out.write
+            try:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if ttfb is None:
+                        ttfb = time.time() - started
+                    write(chunk)
+                    size += len(chunk)
+                    if on_chunk:
+                        f.flush()
+                        on_chunk(chunk)
+            finally:
+                if wav_params:
+                    out.close()  # patches the header sizes; leaves f open
+        if size == 0:
+            raise Exception(f"TTS stream for {path} returned no audio")
+        os.replace(part, path)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    info = {"path": path, "bytes": size, "ttfb": ttfb, "seconds": time.time() - started}
+    logging.info(f"TTS stream {os.path.basename(path)}: first byte after {ttfb:.2f}s, "
+                 f"{size / 1024:.0f} KB in {info['seconds']:.2f}s")
+    return info
+
+
+def elevenlabs_stream(text: str, path: str, voice_id: str, api_key: str, model_id: str = "eleven_multilingual_v2",
+                      voice_settings: Optional[dict] = None, accept: str = "audio/mpeg",
+                      on_chunk: Optional[Callable[[bytes], None]] = None) -> dict:
+    headers = {"Accept": accept, "Content-Type": "application/json", "xi-api-key": api_key}
+    payload = {"text": text, "model_id": model_id}
+    if voice_settings:
+        payload["voice_settings"] = voice_settings
+    started = time.time()
+    response = http_client.post(ELEVENLABS_STREAM_URL.format(voice_id=voice_id), headers=headers, json=payload,
+                                stream=True, timeout=http_client.LONG_TIMEOUT)
+    with response:
+        if response.status_code != 200:
+            raise Exception(f"ElevenLabs TTS error {response.status_code}: {response.text}")
+        return write_stream(response.iter_content(chunk_size=CHUNK_SIZE), path, started, on_chunk)
+
+
+def merge_alignment(pieces: Iterable[dict]) -> dict:
+    """
+    Join per-chunk character alignments into one for the whole file. Chunks whose times
+    restart near zero (chunk-relative) are shifted to follow the previous chunk; chunks
+    already on the file's clock are kept as they are.
+    """
+    merged = {k: [] for k in ALIGNMENT_KEYS}
+    offset = 0.0
+    for piece in pieces:
+        starts = piece.get("character_start_times_seconds") or []
+        if not starts:
+            continue
+        last_end = merged["character_end_times_seconds"][-1] if merged["characters"] else 0.0
+        if merged["characters"] and starts[0] + offset < last_end - 0.05:
+            offset = last_end
+        merged["characters"].extend(piece["characters"])
+        merged["character_start_times_seconds"].extend(t + offset for t in starts)
+        merged["character_end_times_seconds"].extend(t + offset for t in piece["character_end_times_seconds"])
+    return merged
+
+
+def _elevenlabs_timestamp_chunks(response, pieces: list) -> Iterable[bytes]:
+    for line in response.iter_lines():
+        if not line.strip():
+            continue
+        chunk = json.loads(line)
+        if chunk.get("alignment"):
+            pieces.append(chunk["alignment"])
+        if chunk.get("audio_base64"):
+            yield base64.b64decode(chunk["audio_base64"])
+
+
+def elevenlabs_stream_with_timestamps(text: str, path: str, voice_id: str, api_key: str,
+                                      model_id: str = "eleven_multilingual_v2", voice_settings: Optional[dict] = None,
+                                      on_chunk: Optional[Callable[[bytes], None]] = None) -> dict:
+    """Like elevenlabs_stream, plus "alignment": ElevenLabs' character alignment for the whole file."""
+    headers = {"Content-Type": "application/json", "xi-api-key": api_key}
+    payload = {"text": text, "model_id": model_id}
+    if voice_settings:
+        payload["voice_settings"] = voice_settings
+    started = time.time()
+    response = http_client.post(ELEVENLABS_STREAM_TIMESTAMPS_URL.format(voice_id=voice_id), headers=headers,
+                                json=payload, stream=True, timeout=http_client.LONG_TIMEOUT)
+    pieces = []
+    with response:
+        if response.status_code != 200:
+            raise Exception(f"ElevenLabs TTS error {response.status_code}: {response.text}")
+        info = write_stream(_elevenlabs_timestamp_chunks(response, pieces), path, started, on_chunk)
+    info["alignment"] = merge_alignment(pieces)
+    return info
+
+
+def _gemini_pcm_chunks(response) -> Iterable[bytes]:
+    for line in response.iter_lines():
+        if not line.startswith(b"data:"):
+            continue
+        event = json.loads(line[len(b"data:"):])
+        if event.get("error"):
+            raise Exception(f"Gemini TTS error: {event['error']}")
+        for candidate in event.get("candidates", []):
+            for part in candidate.get("content", {}).get("parts", []):
+                data = part.get("inlineData", {}).get("data")
+                if data:
+                    yield base64.b64decode(data)
+
+
+def gemini_stream(text: str, path: str, api_key: str, model: str = "gemini-2.5-flash-preview-tts",
+                  voice_name: str = "Orus", on_chunk: Optional[Callable[[bytes], None]] = None,
+                  wav: bool = True) -> dict:
+    """Stream speech to path as WAV, or as raw PCM (s16le, 24 kHz mono) with wav=False. `bytes` counts PCM bytes."""
+    headers = {"x-goog-api-key": api_key, "Content-Type": "application/json"}
+    payload = {
+        "contents": [{"parts": [{"text": text}]}],
+        "generationConfig": {
+            "responseModalities": ["AUDIO"],
+            "speechConfig": {"voiceConfig": {"prebuiltVoiceConfig": {"voiceName": voice_name}}},
+        },
+    }
+    started = time.time()
+    response = http_client.post(GEMINI_STREAM_URL.format(model=model), params={"alt": "sse"}, headers=headers,
+                                json=payload, stream=True, timeout=http_client.LONG_TIMEOUT)
+    with response:
+        if response.status_code != 200:
+            raise Exception(f"Request failed ({response.status_code}): {response.text}")
+        return write_stream(_gemini_pcm_chunks(response), path, started, on_chunk,
+                            wav_params=GEMINI_PCM if wav else None)
@@ -32,6 +32,15 @@ import json
 from pathlib import Path
 from typing import List, Tuple, Optional
 import requests
+import http_client
+import clip_library
+import mezzanine_worker
+import search_cache
+import downloader
+import perceptual_index
+import renditions
+import probe_cache
+from clip_library import sha1_file
 from PIL import Image, ImageDraw, ImageFont
 from moviepy  import (
     VideoFileClip,
@@ -59,22 +68,8 @@ VIDEOS.mkdir(parents=True, exist_ok=True)
 
 # ----------------------- utilities -----------------------
 
-def sha1_file(path: Path) -> str:
-    h = hashlib.sha1()
-    with path.open("rb") as f:
-        while True:
-            chunk = f.read(8192)
-            if not chunk:
-                break
-            h.update(chunk)
-    return h.hexdigest()
-
-
-# def already_have(hashval: str) -> Optional[dict]:
-#     for item in DB.get("clips", []):
-#         if item.get("sha1") == hashval:
-#             return item
-#     return None
+def already_have(hashval: str) -> Optional[dict]:
+    return clip_library.find_by_sha1(hashval)
 
 
 # ----------------------- API downloaders -----------------------
@@ -85,10 +80,14 @@ def search_pexels(query: str, per_page=15):
     url = "https://api.pexels.com/videos/search"
     headers = {"Authorization": PEXELS_API_KEY}
     params = {"query": query, "per_page": per_page}
-    r = requests.get(url, headers=headers, params=params, timeout=30)
-    if r.status_code != 200:
-        return []
-    return r.json().get("videos", [])
+    data = search_cache.get(url, params)
+    if data is None:
+        r = http_client.get(url, headers=headers, params=params)
+        if r.status_code != 200:
+            return []
+        data = r.json()
+        search_cache.put(url, params, data)
+    return data.get("videos", [])
 
 
 def search_pixabay(query: str, per_page=15):
@@ -96,31 +95,28 @@ def search_pixabay(query: str, per_page=15):
         return []
     url = "https://pixabay.com/api/videos/"
     params = {"key": PIXABAY_API_KEY, "q": query, "per_page": per_page}
-    r = requests.get(url, params=params, timeout=30)
+    r = http_client.get(url, params=params)
     if r.status_code != 200:
         return []
     return r.json().get("hits", [])
 
 
-def download_url(url: str, out_path: Path) -> bool:
+def download_url(url: str, out_path: Path) -> Optional[dict]:
+    """Resumable download; returns {"path", "sha1", "size"} (sha1 computed while streaming) or None."""
     try:
-        r = requests.get(url, stream=True, timeout=60)
-        r.raise_for_status()
-        with out_path.open("wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-        return True
+        return downloader.download_file(url, out_path)
     except Exception as e:
         print("Download failed", e)
-        return False
+        return None
 
 
 # ----------------------- main fetch function -----------------------
 
-def fetch_clips_for_topic(topic: str, limit: int = 5, prefer_vertical: bool = True) -> List[Path]:
+def fetch_clips_for_topic(topic: str, limit: int = 5, prefer_vertical: bool = True,
+                          budget: renditions.BandwidthBudget = None) -> List[Path]:
     """Search multiple APIs and download up to `limit` unique clips. Returns list of local file paths."""
     downloaded = []
+    budget = budget or renditions.BandwidthBudget.from_env()
     # try Pexels first
     vids = search_pexels(topic, per_page=limit * 2)
     for v in vids:
@@ -129,31 +125,40 @@ def fetch_clips_for_topic(topic: str, limit: int = 5, prefer_vertical: bool = Tr
         files = v.get("video_files", [])
         if not files:
             continue
-        # prefer vertical or highest res
-        candidate = None
-        if prefer_vertical:
-            for f in files:
-                # some Pexels files include width/height
-                if f.get("width") and f.get("height") and f["height"] > f["width"]:
-                    candidate = f
-                    break
+        if clip_library.find_by_provider("pexels", v.get("id")):
+            continue
+        # skip near-duplicates (same footage under another id/rendition) before reserving, and after downloading
+        dup, thumb_hash = perceptual_index.find_near_duplicate_thumbnail(v.get("image"))
+        if dup:
+            clip_library.add_alias("pexels", v.get("id"), dup, url=v.get("url"), tags=[topic])
+            continue
+        # cheapest mp4 that still covers the 9:16 1080x1920 crop (vertical sources win naturally)
+        candidate = renditions.choose_rendition(files, budget=budget)
         if not candidate:
-            candidate = sorted(files, key=lambda x: x.get("height", 0), reverse=True)[0]
+            continue
         url = candidate.get("link")
-        name = f"pexels_{v.get('id')}_{candidate.get('id')}.mp4"
-        target = VIDEOS / name
-        if target.exists():
+        target = VIDEOS / f".pexels_{v.get('id')}_{candidate.get('id')}.mp4"
+        result = download_url(url, target)
+        if not result:
+            budget.release_rendition(candidate)
+            continue
+        dup, frame_hashes = perceptual_index.find_near_duplicate_clip(target)
+        if dup:
+            target.unlink(missing_ok=True)
+            budget.release_rendition(candidate)
+            clip_library.add_alias("pexels", v.get("id"), dup, file_id=candidate.get("id"), url=v.get("url"), tags=[topic])
             continue
-        ok = download_url(url, target)
-        if not ok:
+        clip = clip_library.add_clip(
+            target, source="pexels", provider_id=v.get("id"), file_id=candidate.get("id"), url=v.get("url"),
+            width=candidate.get("width"), height=candidate.get("height"), duration=v.get("duration"),
+            license="Pexels", tags=[topic], sha1=result["sha1"],
+        )
+        if not clip["is_new"]:
+            budget.release_rendition(candidate)
             continue
-        h = sha1_file(target)
-        # dup = already_have(h)
-        # if dup:
-        #     target.unlink(missing_ok=True)
-        #     continue
-        # record in DB
-        downloaded.append(target)
+        perceptual_index.add_fingerprint(clip["sha1"], frame_hashes, thumb_hash)
+        mezzanine_worker.enqueue(clip)
+        downloaded.append(Path(clip["path"]))
 
     # # fallback to Pixabay
     # if len(downloaded) < limit:
@@ -184,11 +189,13 @@ def fetch_clips_for_topic(topic: str, limit: int = 5, prefer_vertical: bool = Tr
 
     # Final filter: ensure vertical or mark for cropping
     final = []
+    meta = probe_cache.get_many(downloaded)
     for p in downloaded:
         try:
-            clip = VideoFileClip(str(p))
-            w, h = clip.size
-            clip.close()
+            info = meta.get(str(p))
+            if not info or not info["width"]:
+                raise ValueError("no video stream")
+            w, h = info["width"], info["height"]
             if prefer_vertical and h < w:
                 # will need cropping later, but still return
                 final.append(p)
@@ -0,0 +1,127 @@
+"""
+word_timings.py
+
+Caption word timings taken from the TTS provider instead of re-derived from the mixdown.
+
+- Backends that return a character alignment (ElevenLabs /with-timestamps, the
+  whole-script split) save it next to the segment audio in <audio_folder>/_timings/{i}.json
+- caption_words() turns each segment's alignment into [{'word', 'start', 'end'}] and
+  shifts it by the segment's position on the concatenated timeline (the durations of
+  the segments before it, as create_video / create_video_from_videos concatenate them)
+- Segments without provider timing fall back to forced alignment of their known text,
+  and only segments with no text at all go through Whisper (transcribe_server)
+
+Usage:
+    wordlevel_info = word_timings.caption_words(texts, audio_folder)
+    add_captions_to_video(combined_video_path, wordlevel_info)
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import tts_cache
+
+TIMINGS_DIR = "_timings"
+
+
+def sidecar_path(audio_path) -> Path:
+    audio_path = Path(audio_path)
+    return audio_path.parent / TIMINGS_DIR / f"{audio_path.stem}.json"
+
+
+def save(audio_path, alignment: dict, source: str):
+    path = sidecar_path(audio_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps({"source": source, "alignment": alignment}), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def load(audio_path) -> Optional[dict]:
+    try:
+        return json.loads(sidecar_path(audio_path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def move(src_audio, dest_audio):
+    """Follow a rename of the audio (hedged TTS writes to a temporary name first)."""
+    src, dest = sidecar_path(src_audio), sidecar_path(dest_audio)
+    if src.exists():
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(src, dest)
+    else:
+        dest.unlink(missing_ok=True)  # the new audio came from a backend without timing
+
+
+def discard(audio_path):
+    sidecar_path(audio_path).unlink(missing_ok=True)
+
+
+def slice_alignment(alignment: dict, start: int, end: int, offset: float = 0.0) -> dict:
+    """Characters [start, end) of an alignment, with times moved back by `offset` seconds."""
+    return {
+        "characters": alignment["characters"][start:end],
+        "character_start_times_seconds": [max(0.0, t - offset) for t in
+                                          alignment["character_start_times_seconds"][start:end]],
+        "character_end_times_seconds": [max(0.0, t - offset) for t in
+                                        alignment["character_end_times_seconds"][start:end]],
+    }
+
+
+def words_from_alignment(alignment: dict, offset: float = 0.0) -> List[dict]:
+    """Group a character alignment into whitespace-separated words."""
+    words = []
+    current, start, end = "", None, None
+    chars = alignment["characters"]
+    starts = alignment["character_start_times_seconds"]
+    ends = alignment["character_end_times_seconds"]
+    for ch, s, e in zip(chars, starts, ends):
+        if ch.isspace():
+            if current:
+                words.append({"word": current, "start": start + offset, "end": end + offset})
+            current, start = "", None
+            continue
+        if start is None:
+            start = s
+        current += ch
+        end = e
+    if current:
+        words.append({"word": current, "start": start + offset, "end": end + offset})
+    return words
+
+
+def caption_words(texts: Optional[List[str]], audio_folder, ext: str = "mp3") -> List[dict]:
+    """Word timings for the whole concatenated narration of {1..n}.<ext> in audio_folder."""
+    import forced_align  # imports tts_script, which imports this module
+
+    audio_files = sorted((f for f in os.listdir(audio_folder) if f.endswith(f".{ext}")),
+                         key=lambda x: int(x.split('.')[0]))
+    words, offset = [], 0.0
+    sources = {}
+    for name in audio_files:
+        path = os.path.join(audio_folder, name)
+        n = int(name.split('.')[0]) - 1  # {i}.<ext> is texts[i - 1], even when an earlier segment is missing
+        text = texts[n] if texts and 0 <= n < len(texts) else None
+        if texts and text is None:
+            logging.warning(f"No script text for {name} ({len(texts)} segments); transcribing it instead")
+        timing = load(path)
+        if timing and timing.get("alignment", {}).get("characters"):
+            segment = words_from_alignment(timing["alignment"])
+            source = timing.get("source", "provider")
+        elif text:
+            segment = forced_align.align_file(text, path)
+            source = "forced-align"
+        else:
+            import transcribe_server
+            segment = transcribe_server.word_timestamps(path)
+            source = "whisper"
+        sources[source] = sources.get(source, 0) + 1
+        words.extend({"word": w["word"], "start": w["start"] + offset, "end": w["end"] + offset} for w in segment)
+        offset += tts_cache.audio_duration(path) or (segment[-1]["end"] if segment else 0.0)
+    logging.info(f"Caption timings for {len(audio_files)} segments: "
+                 + ", ".join(f"{k} {v}" for k, v in sorted(sources.items())))
+    return words